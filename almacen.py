@@ -0,0 +1,358 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import cuantiles
+import cubo
+import ingesta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ---------------------------------------------------
+# Almacén columnar incremental
+# ---------------------------------------------------
+# Cada libro de data/ se convierte una sola vez en archivos Arrow IPC,
+# partidos por país y año (PARTICIONES_ALMACEN; la fuente ya es una por
+# libro): de cada partición, sus filas preparadas, su cubo de agregados y
+# sus resúmenes de cuantiles (cuantiles.py). El manifiesto registra qué
+# libros se ingirieron (por contenido) y sus particiones; al aparecer o
+# cambiar un libro solo ese se vuelve a parsear y agregar. La carga lee
+# (con memory mapping) solo las particiones de los países / años pedidos.
+# El país de una partición es el de la columna PAIS de las filas (el nombre
+# del archivo solo la completa, ver ingesta.pais_archivo): los libros no se
+# filtran por nombre, un libro ya ingerido solo cuesta un stat.
+CACHE_DIR = ingesta.DATA_DIR / ".cache"
+
+# Subir este número cada vez que cambie la forma de preparar los datos o el
+# cubo: invalida todo lo escrito por versiones anteriores.
+CACHE_VERSION = 11
+
+PARTICIONES_ALMACEN = ["PAIS", "ANHO"]
+
+log = logging.getLogger(__name__)
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for bloque in iter(lambda: fh.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _huella(path):
+    stat = path.stat()
+    return {"tamano": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _rutas(cache_dir):
+    return cache_dir / "manifiesto.json", cache_dir / "partes"
+
+
+def _clave_parte(entrada, pais, ano):
+    libro = f"{entrada['sha256'][:16]}_{entrada['fuente']}"
+    return f"{libro}_{ingesta.slug(pais)}_{ingesta.slug(ano)}"
+
+
+def _claves(entrada, paises=None, anos=None):
+    return [
+        _clave_parte(entrada, pais, ano)
+        for pais, ano in entrada["particiones"]
+        if (paises is None or pais in paises) and (anos is None or ano in anos)
+    ]
+
+
+# ---------------------------------------------------
+# Lectura / escritura de archivos Arrow y del manifiesto
+# ---------------------------------------------------
+def escribir_atomico(path, escribir):
+    # Otro proceso nunca ve un archivo a medias; el temporal lleva proceso e
+    # hilo para que dos escritores no compartan el mismo
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    escribir(tmp)
+    os.replace(tmp, path)
+
+
+def write_arrow(df_local, path):
+    table = pa.Table.from_pandas(df_local, preserve_index=False)
+
+    def escribir(tmp):
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    escribir_atomico(path, escribir)
+
+
+def read_arrow(path):
+    # split_blocks: una columna por bloque, sin consolidar; las columnas
+    # numéricas y las categóricas quedan apoyadas en el memory map
+    with pa.memory_map(str(path), "r") as source:
+        table = ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _leer_manifiesto(manifiesto_path):
+    try:
+        manifiesto = json.loads(manifiesto_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        manifiesto = None
+    if manifiesto is None or manifiesto.get("version") != CACHE_VERSION:
+        return {"version": CACHE_VERSION, "archivos": {}}
+    return manifiesto
+
+
+def _escribir_manifiesto(manifiesto, manifiesto_path):
+    texto = json.dumps(manifiesto, indent=1, ensure_ascii=False, sort_keys=True)
+    escribir_atomico(manifiesto_path, lambda tmp: tmp.write_text(texto, encoding="utf-8"))
+
+
+# ---------------------------------------------------
+# Bloqueo de la sincronización
+# ---------------------------------------------------
+# Pueden sincronizar a la vez dos países del tablero (hilos del mismo
+# proceso), otros workers y precarga.py. Cada uno escribiría el manifiesto
+# con lo que leyó al empezar y al limpiar borraría las partes nuevas del
+# otro, así que se sincroniza de a uno: un lock del proceso más un lock de
+# archivo sobre la carpeta del caché. Se espera a lo sumo BLOQUEO_TIMEOUT
+# segundos (una sincronización que ingiere libros grandes tarda minutos);
+# pasado ese tiempo se falla con TimeoutError en lugar de colgar el worker.
+_SYNC_LOCK = threading.Lock()
+
+BLOQUEO_TIMEOUT = 600.0
+BLOQUEO_ESPERA = 0.1
+
+
+def _intentar_bloqueo(fh):
+    # True si se tomó el lock de archivo sin esperar
+    try:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _bloquear_archivo(fh, limite):
+    while not _intentar_bloqueo(fh):
+        if time.monotonic() >= limite:
+            raise TimeoutError(
+                f"No se pudo bloquear {fh.name} en {BLOQUEO_TIMEOUT:g} s: "
+                "otro proceso está sincronizando el almacén"
+            )
+        time.sleep(BLOQUEO_ESPERA)
+
+
+def _liberar_archivo(fh):
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+    else:
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def bloqueo_almacen(cache_dir=CACHE_DIR):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    limite = time.monotonic() + BLOQUEO_TIMEOUT
+    if not _SYNC_LOCK.acquire(timeout=BLOQUEO_TIMEOUT):
+        raise TimeoutError(
+            f"No se pudo bloquear el almacén en {BLOQUEO_TIMEOUT:g} s: otro hilo está sincronizando"
+        )
+    try:
+        with open(cache_dir / "almacen.lock", "a+b") as fh:
+            fh.seek(0)
+            _bloquear_archivo(fh, limite)
+            try:
+                yield
+            finally:
+                _liberar_archivo(fh)
+    finally:
+        _SYNC_LOCK.release()
+
+
+# ---------------------------------------------------
+# Sincronización: ingerir solo lo nuevo o modificado
+# ---------------------------------------------------
+TIPOS_PARTE = ["filas", "cubo", "cuantiles"]
+
+
+def _parte_vigente(previa, fuente, partes_dir):
+    return (
+        previa is not None
+        and previa["fuente"] == fuente
+        and all(
+            (partes_dir / f"{clave}.{tipo}.arrow").exists()
+            for clave in _claves(previa)
+            for tipo in TIPOS_PARTE
+        )
+    )
+
+
+def write_parte(df_archivo, partes_dir, clave):
+    write_arrow(df_archivo, partes_dir / f"{clave}.filas.arrow")
+    write_arrow(cubo.build_cubo(df_archivo), partes_dir / f"{clave}.cubo.arrow")
+    write_arrow(cuantiles.build_cuantiles(df_archivo), partes_dir / f"{clave}.cuantiles.arrow")
+
+
+def _valor_particion(valor):
+    return None if pd.isna(valor) else str(valor)
+
+
+def write_particiones(df_archivo, partes_dir, entrada):
+    # Una parte por (país, año) presente en el libro; devuelve sus claves
+    # [país, año] para el manifiesto
+    particiones = []
+    grupos = df_archivo.groupby(PARTICIONES_ALMACEN, observed=True, dropna=False, sort=True)
+    for (pais, ano), df_particion in grupos:
+        pais, ano = _valor_particion(pais), _valor_particion(ano)
+        write_parte(df_particion.reset_index(drop=True), partes_dir, _clave_parte(entrada, pais, ano))
+        particiones.append([pais, ano])
+    return particiones
+
+
+def sync_almacen(data_dir=ingesta.DATA_DIR, cache_dir=CACHE_DIR):
+    # El manifiesto se lee, se actualiza y se limpia con el bloqueo tomado:
+    # se parte de lo que dejó el último sincronizador, no de una copia vieja
+    with bloqueo_almacen(cache_dir):
+        return _sync_almacen(data_dir, cache_dir)
+
+
+def _sync_almacen(data_dir, cache_dir):
+    manifiesto_path, partes_dir = _rutas(cache_dir)
+    manifiesto = _leer_manifiesto(manifiesto_path)
+    anteriores = manifiesto["archivos"]
+
+    actuales = {}
+    ingeridos = []
+    for path, fuente in ingesta.discover_archivos(data_dir):
+        pais = ingesta.pais_archivo(path)
+        previa = anteriores.get(path.name)
+        huella = _huella(path)
+        if _parte_vigente(previa, fuente, partes_dir):
+            if previa["tamano"] == huella["tamano"] and previa["mtime_ns"] == huella["mtime_ns"]:
+                actuales[path.name] = previa
+                continue
+            # Si solo cambió el mtime (copia, checkout) se compara el contenido
+            sha = _sha256(path)
+            if sha == previa["sha256"]:
+                actuales[path.name] = {**previa, **huella}
+                continue
+        else:
+            sha = _sha256(path)
+
+        # Libro nuevo o modificado: es lo único que se parsea y agrega
+        df_archivo = ingesta.prepare_resultados(ingesta.read_archivo(path), fuente, pais)
+        entrada = {"fuente": fuente, "sha256": sha, "filas": len(df_archivo), **huella}
+        entrada["particiones"] = write_particiones(df_archivo, partes_dir, entrada)
+        actuales[path.name] = entrada
+        ingeridos.append(path.name)
+
+    if actuales != anteriores:
+        manifiesto = {"version": CACHE_VERSION, "archivos": actuales}
+        _escribir_manifiesto(manifiesto, manifiesto_path)
+
+    # Partes de libros que ya no están (o de versiones anteriores)
+    claves = {clave for entrada in actuales.values() for clave in _claves(entrada)}
+    if partes_dir.exists():
+        for parte in partes_dir.glob("*.arrow"):
+            if parte.name.split(".")[0] not in claves:
+                parte.unlink(missing_ok=True)
+
+    if ingeridos:
+        log.info("Libros ingeridos: %s", ", ".join(ingeridos))
+    return manifiesto
+
+
+# ---------------------------------------------------
+# Carga
+# ---------------------------------------------------
+def firma_datos(data_dir=ingesta.DATA_DIR):
+    # Barata (solo stat): cambia al agregar, quitar o modificar un libro
+    return tuple(
+        (path.name, *_huella(path).values())
+        for path, _ in ingesta.discover_archivos(data_dir)
+    )
+
+
+def paises_disponibles(data_dir=ingesta.DATA_DIR, cache_dir=CACHE_DIR):
+    # Países de las particiones del almacén (la columna PAIS de los libros,
+    # la misma clave con la que carga load_almacen); sincroniza antes, así
+    # que un libro nuevo se ingiere aquí
+    manifiesto = sync_almacen(data_dir, cache_dir)
+    paises = {
+        pais for entrada in manifiesto["archivos"].values() for pais, _ in entrada["particiones"]
+    }
+    return sorted(paises - {None})
+
+
+def data_version(claves):
+    # Identificador de los datos cargados (las claves llevan el hash de cada
+    # libro y la partición): clave de los cachés de agregados
+    contenido = json.dumps([CACHE_VERSION, sorted(claves)])
+    return hashlib.sha256(contenido.encode()).hexdigest()[:16]
+
+
+def load_partes(partes_dir, claves):
+    df_local = ingesta.concat_resultados(
+        read_arrow(partes_dir / f"{clave}.filas.arrow") for clave in claves
+    )
+    celdas = cubo.merge_cubos(
+        [read_arrow(partes_dir / f"{clave}.cubo.arrow") for clave in claves]
+    )
+    tabla_cuantiles = cuantiles.merge_cuantiles(
+        [read_arrow(partes_dir / f"{clave}.cuantiles.arrow") for clave in claves]
+    )
+    return df_local, celdas, tabla_cuantiles
+
+
+def load_almacen(data_dir=ingesta.DATA_DIR, cache_dir=CACHE_DIR, paises=None, anos=None):
+    # `paises` / `anos`: solo esas particiones (None = todas). Las partes se
+    # abren antes de soltar el bloqueo: otro sincronizador no las borra en
+    # el medio.
+    with bloqueo_almacen(cache_dir):
+        manifiesto = _sync_almacen(data_dir, cache_dir)
+        claves = [
+            clave
+            for _, entrada in sorted(manifiesto["archivos"].items())
+            for clave in _claves(entrada, paises, anos)
+        ]
+        if not claves:
+            raise FileNotFoundError(
+                f"No hay resultados en {data_dir} (países: {paises or 'todos'}, años: {anos or 'todos'})"
+            )
+
+        _, partes_dir = _rutas(cache_dir)
+        df_local, celdas, tabla_cuantiles = load_partes(partes_dir, claves)
+
+    _, total = ingesta.memory_report(df_local)
+    log.info(
+        "Resultados en memoria: %d filas (%d particiones), %.2f MB",
+        len(df_local), len(claves), total / 1e6,
+    )
+    return df_local, celdas, tabla_cuantiles, data_version(claves)
+
+
+if __name__ == "__main__":
+    df_cache, celdas_cache, _, version = load_almacen()
+    por_columna, total = ingesta.memory_report(df_cache)
+    print(f"Almacén sincronizado en {CACHE_DIR} (versión {version})")
+    print(f"Países: {', '.join(paises_disponibles())}")
+    print(f"{len(df_cache)} filas, {len(celdas_cache)} celdas en el cubo")
+    print(f"Memoria en uso: {total / 1e6:.2f} MB")
+    print(por_columna.to_string())
@@ -0,0 +1,258 @@
+# ---------------------------------------------------
+# API HTTP local con los agregados del tablero
+# ---------------------------------------------------
+# Mismos números que el tablero (consultas.py sobre el cubo) para cualquier
+# combinación de filtros, en JSON o en Arrow IPC (stream). Los datos se
+# cargan una vez al arrancar desde el almacén (almacen.py), todos los
+# países o solo los de --pais; para ver libros nuevos de data/ se reinicia
+# el servidor.
+#
+#   python api.py                         # http://127.0.0.1:8502
+#   python api.py --pais Colombia
+#   curl "http://127.0.0.1:8502/agregados?fuente=HSE&area=Conciencia%20Social"
+#   curl -H "Accept: application/vnd.apache.arrow.stream" \
+#        "http://127.0.0.1:8502/tablas/niveles_grado?fuente=Cognitivas&sede=Niza"
+#
+# Rutas:
+#   GET /version                  versión de los datos cargados
+#   GET /opciones?fuente=&pais=   valores de país, año, sede, área y grado
+#   GET /agregados?fuente=&pais=&ano=&sede=&area=&grado=
+#                                 KPIs y todas las tablas (JSON)
+#   GET /tablas/{tabla}?...       una tabla (kpis, sexo, niveles,
+#                                 niveles_grado, brecha_sexo, distribucion,
+#                                 cortes_nivel) en JSON o Arrow
+#
+# Las respuestas se guardan ya serializadas (LRU por ruta, filtros y
+# formato) y llevan un ETag con la versión de los datos: con If-None-Match
+# vigente se responde 304 sin cuerpo.
+import argparse
+import contextlib
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import pandas as pd
+import pyarrow as pa
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import almacen
+import consultas
+import cubo
+import ingesta
+
+MIME_JSON = "application/json"
+MIME_ARROW = "application/vnd.apache.arrow.stream"
+
+RESPUESTAS_MAX_ENTRADAS = 4096
+TABLAS = [
+    "kpis", "sexo", "niveles", "niveles_grado", "brecha_sexo", "distribucion", "cortes_nivel",
+]
+FILTROS = ["ano", "sede", "area", "grado", "pais"]
+
+log = logging.getLogger(__name__)
+
+
+class ErrorConsulta(ValueError):
+    pass
+
+
+# ---------------------------------------------------
+# Serialización
+# ---------------------------------------------------
+def _nativo(valor):
+    # numpy -> Python; NaN -> null
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+def _registros(df_tabla):
+    return [
+        {col: _nativo(v) for col, v in fila.items()}
+        for fila in df_tabla.astype(object).to_dict("records")
+    ]
+
+
+def _json(contenido):
+    return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _arrow(df_tabla):
+    table = pa.Table.from_pandas(df_tabla, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _tabla(consulta, nombre):
+    if nombre == "kpis":
+        return pd.DataFrame([consulta.kpis])
+    tabla = getattr(consulta, nombre)
+    # HSE no tiene tabla por grado
+    return pd.DataFrame() if tabla is None else tabla
+
+
+# ---------------------------------------------------
+# Agregados en memoria (datos cargados una vez) con caché de respuestas
+# ---------------------------------------------------
+class Agregados:
+    def __init__(self, celdas, tabla_cuantiles, version):
+        self.celdas = celdas
+        self.tabla_cuantiles = tabla_cuantiles
+        self.version = version
+        # La misma consulta sirve a todas sus tablas y formatos
+        self.consulta = lru_cache(maxsize=RESPUESTAS_MAX_ENTRADAS)(self._consulta)
+        self._respuestas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _consulta(self, fuente, ano, sede, area, grado, pais):
+        return consultas.query(
+            self.celdas, fuente, ano, sede, area, grado,
+            tabla_cuantiles=self.tabla_cuantiles, pais=pais,
+        )
+
+    def opciones(self, fuente, pais=None):
+        sel = cubo.select_celdas(self.celdas, fuente, pais=pais)
+        return {
+            col: sel[col].dropna().unique().sort_values().tolist()
+            for col in ("PAIS", "ANHO", "SEDE", "COD_AREA", "GRADO_LABEL")
+        }
+
+    def cuerpo(self, ruta, filtros, formato):
+        # Bytes listos para enviar; `filtros` = (fuente, ano, sede, area, grado, pais)
+        if ruta == "opciones":
+            return _json(self.opciones(filtros[0], filtros[-1]))
+
+        consulta = self.consulta(*filtros)
+        if ruta == "agregados":
+            return _json({
+                "version": self.version,
+                "kpis": {k: _nativo(v) for k, v in consulta.kpis.items()},
+                "sexo": _registros(consulta.sexo),
+                "niveles": _registros(consulta.niveles),
+                "niveles_order": consulta.niveles_order,
+                "niveles_grado": (
+                    None if consulta.niveles_grado is None else _registros(consulta.niveles_grado)
+                ),
+                "brecha_sexo": _registros(consulta.brecha_sexo),
+                "distribucion": _registros(consulta.distribucion),
+                "cortes_nivel": _registros(consulta.cortes_nivel),
+            })
+
+        tabla = _tabla(consulta, ruta)
+        return _arrow(tabla) if formato == MIME_ARROW else _json(_registros(tabla))
+
+    # LRU de respuestas serializadas
+    def cacheada(self, clave):
+        with self._lock:
+            cuerpo = self._respuestas.get(clave)
+            if cuerpo is not None:
+                self._respuestas.move_to_end(clave)
+            return cuerpo
+
+    def guardar(self, clave, cuerpo):
+        with self._lock:
+            self._respuestas[clave] = cuerpo
+            if len(self._respuestas) > RESPUESTAS_MAX_ENTRADAS:
+                self._respuestas.popitem(last=False)
+
+
+# ---------------------------------------------------
+# Rutas
+# ---------------------------------------------------
+def _filtros(request):
+    params = request.query_params
+    fuente = params.get("fuente")
+    if fuente not in ingesta.FUENTES.values():
+        opciones_fuente = ", ".join(ingesta.FUENTES.values())
+        raise ErrorConsulta(f"'fuente' es obligatorio: {opciones_fuente}")
+    # Vacío o ausente = sin filtrar
+    return (fuente, *(params.get(nombre) or None for nombre in FILTROS))
+
+
+def _formato(request):
+    return MIME_ARROW if MIME_ARROW in request.headers.get("accept", "") else MIME_JSON
+
+
+async def _responder(request, ruta, formato=MIME_JSON):
+    try:
+        filtros = _filtros(request)
+    except ErrorConsulta as exc:
+        return JSONResponse({"error": str(exc)}, status_code=400)
+    if ruta == "opciones":
+        filtros = (filtros[0], None, None, None, None, filtros[-1])
+
+    agregados = request.app.state.agregados
+    etag = f'"{agregados.version}-{"arrow" if formato == MIME_ARROW else "json"}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    clave = (ruta, filtros, formato)
+    cuerpo = agregados.cacheada(clave)
+    if cuerpo is None:
+        # El cálculo (pandas) no bloquea el event loop
+        cuerpo = await run_in_threadpool(agregados.cuerpo, *clave)
+        agregados.guardar(clave, cuerpo)
+    return Response(cuerpo, media_type=formato, headers=headers)
+
+
+async def version(request):
+    return JSONResponse({"version": request.app.state.agregados.version})
+
+
+async def opciones(request):
+    return await _responder(request, "opciones")
+
+
+async def agregados_todos(request):
+    return await _responder(request, "agregados")
+
+
+async def tabla(request):
+    nombre = request.path_params["tabla"]
+    if nombre not in TABLAS:
+        return JSONResponse({"error": f"Tabla desconocida: {nombre}"}, status_code=404)
+    return await _responder(request, nombre, _formato(request))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    _, celdas, tabla_cuantiles, version_datos = await run_in_threadpool(
+        almacen.load_almacen, paises=getattr(app.state, "paises", None)
+    )
+    app.state.agregados = Agregados(celdas, tabla_cuantiles, version_datos)
+    log.info("Datos cargados (versión %s): %d celdas", version_datos, len(celdas))
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/version", version),
+        Route("/opciones", opciones),
+        Route("/agregados", agregados_todos),
+        Route("/tablas/{tabla}", tabla),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API HTTP con los agregados del tablero")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--pais", nargs="+", help="cargar solo estos países; por defecto, todos")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    app.state.paises = args.pais
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,8 +1,18 @@
+import io
+import math
+
 import streamlit as st
-import pandas as pd
 import numpy as np
-import altair as alt
-import unicodedata
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import almacen
+import cohortes
+import consultas
+import filtros
+import graficos
+import instantanea
+import perfil
 
 # ---------------------------------------------------
 # Configuración de página y estilos (fondo negro, texto blanco)
@@ -43,424 +53,479 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Colores Innova
-INNOVA_BLUE = "#00539B"
-INNOVA_GREEN = "#7AB800"
-INNOVA_ORANGE = "#FF9300"
-INNOVA_PALETTE = [INNOVA_BLUE, INNOVA_GREEN, INNOVA_ORANGE]
+# ---------------------------------------------------
+# Perfil de tiempos por etapa (opcional, ver perfil.py)
+# ---------------------------------------------------
+# Apagado no mide nada: cada etapa es un contexto nulo.
+PERFIL = perfil.Perfil(perfil.activado(st.query_params.get("perfil")))
+
+
+def mostrar_tabla(df_tabla, etapa):
+    with PERFIL.etapa(f"st.dataframe {etapa}", filas=len(df_tabla), datos=df_tabla):
+        st.dataframe(df_tabla)
+
+
+def mostrar_grafico(datos, spec, etapa):
+    with PERFIL.etapa(f"st.vega_lite_chart {etapa}", filas=datos.num_rows, datos=datos, spec=spec):
+        st.vega_lite_chart(datos, spec, width="stretch")
 
 # ---------------------------------------------------
 # Carga de datos
 # ---------------------------------------------------
-@st.cache_data
-def load_data():
-    cog = pd.read_excel("data/Colombia_Latam-Cognitivas (2).xlsx")
-    hse = pd.read_excel("data/Colombia_Latam_HSE (1).xlsx")
-
-    cog["FUENTE"] = "Cognitivas"
-    hse["FUENTE"] = "HSE"
-
-    df_local = pd.concat([cog, hse], ignore_index=True)
-
-    df_local["MEDIDA_500"] = pd.to_numeric(df_local["MEDIDA_500"], errors="coerce")
-    df_local["SEXO"] = df_local["SEXO"].replace(".", np.nan)
-
-    # Grados -> etiquetas ordenadas
-    grado_map = {
-        "3": "Tercero", 3: "Tercero",
-        "4": "Cuarto", 4: "Cuarto",
-        "5": "Quinto", 5: "Quinto",
-        "6": "Sexto", 6: "Sexto",
-        "7": "Séptimo", 7: "Séptimo",
-        "8": "Octavo", 8: "Octavo",
-        "9": "Noveno", 9: "Noveno",
-    }
-    df_local["GRADO_LABEL"] = df_local["GRADO"].map(grado_map)
-    df_local["GRADO_LABEL"] = df_local["GRADO_LABEL"].fillna(df_local["GRADO"].astype(str))
-
-    grado_order = ["Tercero", "Cuarto", "Quinto", "Sexto", "Séptimo", "Octavo", "Noveno"]
-    all_grados = sorted(df_local["GRADO_LABEL"].dropna().unique().tolist())
-    others = [g for g in all_grados if g not in grado_order]
-    grado_categories = grado_order + others
-
-    df_local["GRADO_LABEL"] = pd.Categorical(
-        df_local["GRADO_LABEL"],
-        categories=grado_categories,
-        ordered=True
+# cache_resource: el frame y el cubo se comparten entre sesiones sin
+# des-serializarse en cada rerun (no se modifican después de la carga).
+# `firma` cambia cuando se agrega o modifica un libro en data/: entonces se
+# recarga, pero solo se parsean los libros nuevos (ver almacen.py).
+# Se carga un país a la vez (solo sus particiones); a lo sumo
+# PAISES_EN_MEMORIA quedan residentes.
+PAISES_EN_MEMORIA = 2
+
+
+@st.cache_data(show_spinner=False)
+def load_paises(firma):
+    # Países de las particiones del almacén; se vuelve a mirar solo cuando
+    # cambia data/
+    return almacen.paises_disponibles()
+
+
+@st.cache_resource(max_entries=PAISES_EN_MEMORIA)
+def load_data(firma, pais):
+    # Con una instantánea lista (precarga.py) todo se adjunta por memory
+    # mapping, compartido con los demás workers del nodo
+    adjunta = instantanea.adjuntar(pais, firma)
+    if adjunta is not None:
+        df_local, celdas, tabla_cuantiles, indice, indice_transitos, version = adjunta
+    else:
+        df_local, celdas, tabla_cuantiles, version = almacen.load_almacen(
+            paises=None if pais is None else [pais]
+        )
+        indice = filtros.IndiceFiltros(df_local)
+        # Tránsitos de cada estudiante entre periodos, indexados como las filas
+        indice_transitos = filtros.IndiceFiltros(cohortes.build_transitos(df_local))
+    grado_categories = df_local["GRADO_LABEL"].cat.categories.tolist()
+    # Opciones de los filtros por combinación (búsquedas en un diccionario)
+    mapa_opciones = filtros.MapaOpciones(celdas)
+    return (
+        df_local, grado_categories, celdas, tabla_cuantiles, indice, mapa_opciones,
+        indice_transitos, version,
     )
 
-    return df_local, grado_categories
-
-df, GRADO_CATEGORIES = load_data()
-
 # ---------------------------------------------------
 # MEDIDA_500 por sexo y grado (F = Femenino, M = Masculino)
 # ---------------------------------------------------
-def plot_medida_por_sexo(df_f, grado_categories):
+def plot_medida_por_sexo(resumen, brecha, grado_categories):
     st.subheader("MEDIDA_500 por sexo y grado")
 
-    df_sexo = df_f[df_f["SEXO"].isin(["F", "M"])].copy()
-    if df_sexo.empty:
+    if resumen.empty:
         st.info("No hay datos con sexo definido (F/M) para los filtros actuales.")
         return
 
-    # Media por grado y sexo
-    resumen = (
-        df_sexo.groupby(["GRADO_LABEL", "SEXO"])["MEDIDA_500"]
-        .mean()
-        .reset_index(name="MEDIDA_500_MEDIA")
-    )
-    resumen["Sexo"] = resumen["SEXO"].map({"F": "Femenino", "M": "Masculino"})
-
     st.write("**Media de MEDIDA_500 por grado y sexo (F = Femenino, M = Masculino)**")
 
     # 1 parte tabla, 3 partes gráfica
     col_tab, col_chart = st.columns([1, 3])
 
     with col_tab:
-        st.dataframe(resumen[["GRADO_LABEL", "Sexo", "MEDIDA_500_MEDIA"]])
-
-    # Base del gráfico: barras agrupadas por sexo dentro de cada grado
-    base = alt.Chart(resumen).properties(height=380)
-
-    bar = base.mark_bar().encode(
-        x=alt.X("GRADO_LABEL:N", sort=grado_categories, title="Grado"),
-        # barras agrupadas: una por sexo dentro de cada grado
-        xOffset=alt.XOffset("Sexo:N"),
-        y=alt.Y("MEDIDA_500_MEDIA:Q", title="Media MEDIDA_500"),
-        color=alt.Color(
-            "Sexo:N",
-            scale=alt.Scale(
-                domain=["Femenino", "Masculino"],
-                range=[INNOVA_ORANGE, INNOVA_BLUE],
-            ),
-            title="Sexo",
-        ),
-        tooltip=[
-            "GRADO_LABEL:N",
-            "Sexo:N",
-            alt.Tooltip("MEDIDA_500_MEDIA:Q", format=".1f"),
-        ],
+        mostrar_tabla(resumen[["GRADO_LABEL", "Sexo", "MEDIDA_500_MEDIA"]], "medida_por_sexo")
+
+    with col_chart:
+        mostrar_grafico(
+            graficos.datos_medida_por_sexo(resumen),
+            graficos.spec_medida_por_sexo(tuple(grado_categories)),
+            "medida_por_sexo",
+        )
+
+    # Brecha F − M con IC 95 % (Welch); si el IC no cruza 0 la diferencia
+    # no se explica solo por el tamaño de los grupos
+    st.write("**Brecha de la media (Femenino − Masculino) con IC 95 %**")
+    mostrar_tabla(
+        brecha[["GRADO_LABEL", "n_F", "n_M", "brecha", "ic_inf", "ic_sup"]].round(1), "brecha_sexo"
     )
 
-    # Etiquetas con la media sobre cada barra
-    text = base.mark_text(dy=-10, color="white").encode(
-        x=alt.X("GRADO_LABEL:N", sort=grado_categories),
-        xOffset=alt.XOffset("Sexo:N"),
-        y="MEDIDA_500_MEDIA:Q",
-        text=alt.Text("MEDIDA_500_MEDIA:Q", format=".1f"),
+# ---------------------------------------------------
+# Distribución de MEDIDA_500 (histogramas del cubo, sin puntajes crudos)
+# ---------------------------------------------------
+VISTAS_DISTRIBUCION = {"Histograma": "conteo", "Densidad": "densidad"}
+
+
+def plot_distribucion(distribucion, cortes_nivel, grado_categories, key_prefix):
+    st.subheader("Distribución de MEDIDA_500 por sexo y grado")
+
+    if distribucion.empty:
+        st.info("No hay puntajes con sexo definido (F/M) para los filtros actuales.")
+        return
+
+    vista = st.radio(
+        "Ver como",
+        options=list(VISTAS_DISTRIBUCION),
+        horizontal=True,
+        key=f"{key_prefix}_dist_vista",
     )
+    ancho = distribucion["hasta"].iloc[0] - distribucion["desde"].iloc[0]
+    if vista == "Densidad":
+        texto = "la densidad es la proporción de estudiantes del grado y sexo por punto"
+    else:
+        texto = "cada barra es el número de estudiantes del grado y sexo"
 
-    chart = alt.layer(bar, text)
+    # Los cortes de nivel son de cada área: con varias áreas no se dibujan
+    if cortes_nivel["COD_AREA"].nunique() > 1:
+        cortes_nivel = cortes_nivel.iloc[:0]
+        cortes = "Elija un área para ver los puntos de corte de los niveles de logro."
+    else:
+        cortes = "Las líneas marcan el puntaje mínimo de cada nivel de logro."
 
-    with col_chart:
-        st.altair_chart(chart, use_container_width=True)
+    st.caption(f"Tramos de {ancho:g} puntos; {texto}. {cortes}")
+    mostrar_grafico(
+        graficos.datos_distribucion(distribucion, cortes_nivel),
+        graficos.spec_distribucion(tuple(grado_categories), VISTAS_DISTRIBUCION[vista]),
+        "distribucion",
+    )
 
 # ---------------------------------------------------
 # Cognitivas: niveles (dona + proporciones por grado)
 # ---------------------------------------------------
-def plot_niveles_cognitivos(df_f, grado_categories):
+def plot_niveles_cognitivos(niveles, tabla_ng, grado_categories):
     st.subheader("NIVEL_LOGRO_4 – Prueba Cognitiva")
 
-    # Orden fijo de niveles
-    niveles_order = ["Inicial", "Básico", "Satisfactorio", "Avanzado"]
-
-    # ------------------ DONA GLOBAL ------------------
-    counts = df_f["NIVEL_LOGRO_4"].value_counts().reindex(niveles_order, fill_value=0)
-    total = counts.sum()
-
-    niveles = pd.DataFrame({"NIVEL_LOGRO_4": niveles_order, "conteo": counts.values})
-    if total > 0:
-        niveles["proporcion"] = niveles["conteo"] / total
-    else:
-        niveles["proporcion"] = 0.0
-    niveles["porcentaje"] = niveles["proporcion"] * 100
-
     col_t1, col_t2 = st.columns([1, 2])
 
     with col_t1:
         st.write("**Proporción de estudiantes por nivel de logro**")
         tabla = niveles.copy()
         tabla["porcentaje"] = tabla["porcentaje"].round(1).astype(str) + "%"
-        st.dataframe(tabla[["NIVEL_LOGRO_4", "conteo", "porcentaje"]])
-
-    # paleta incremental de azules (Inicial → Avanzado)
-    palette_cog = ["#BBDEFB", "#64B5F6", "#1E88E5", "#0D47A1"]
+        mostrar_tabla(tabla[["NIVEL_LOGRO_4", "conteo", "porcentaje"]], "niveles")
 
     with col_t2:
-        chart = (
-            alt.Chart(niveles)
-            .mark_arc(innerRadius=60)
-            .encode(
-                theta=alt.Theta("proporcion:Q"),
-                color=alt.Color(
-                    "NIVEL_LOGRO_4:N",
-                    scale=alt.Scale(domain=niveles_order, range=palette_cog),
-                    title="Nivel de logro",
-                ),
-                tooltip=[
-                    "NIVEL_LOGRO_4:N",
-                    alt.Tooltip("proporcion:Q", format=".1%"),
-                    "conteo:Q",
-                ],
-            )
-            .properties(height=300)
+        mostrar_grafico(
+            graficos.datos_niveles(niveles),
+            graficos.spec_niveles_cognitivos(),
+            "niveles",
         )
-        st.altair_chart(chart, use_container_width=True)
 
     # ------------------ BARRAS POR GRADO ------------------
     st.markdown("### NIVEL_LOGRO_4 por grado (proporción en cada grado)")
 
-    # Conteo por grado y nivel
-    tabla_ng = (
-        df_f.groupby(["GRADO_LABEL", "NIVEL_LOGRO_4"])
-        .size()
-        .reset_index(name="conteo")
-    )
-
     if tabla_ng.empty:
         st.info("No hay datos para mostrar NIVEL_LOGRO_4 por grado.")
         return
 
-    # Asegurarnos de tener TODAS las combinaciones grado x nivel
-    grados_presentes = (
-        df_f["GRADO_LABEL"]
-        .dropna()
-        .astype(str)
-        .unique()
-        .tolist()
-    )
-    grados_presentes = [g for g in grado_categories if g in grados_presentes]
-
-    grid = pd.MultiIndex.from_product(
-        [grados_presentes, niveles_order],
-        names=["GRADO_LABEL", "NIVEL_LOGRO_4"]
-    ).to_frame(index=False)
-
-    tabla_ng = grid.merge(tabla_ng, on=["GRADO_LABEL", "NIVEL_LOGRO_4"], how="left")
-    tabla_ng["conteo"] = tabla_ng["conteo"].fillna(0)
-
-    # Totales por grado
-    totales_grado = (
-        df_f.groupby("GRADO_LABEL")
-        .size()
-        .reset_index(name="n_grado")
-    )
-    tabla_ng = tabla_ng.merge(totales_grado, on="GRADO_LABEL", how="left")
-
-    # Proporción y porcentaje
-    tabla_ng["proporcion"] = np.where(
-        tabla_ng["n_grado"] > 0,
-        tabla_ng["conteo"] / tabla_ng["n_grado"],
-        0.0,
-    )
-    tabla_ng["porcentaje"] = tabla_ng["proporcion"] * 100
-
     st.write("**Proporción por grado y nivel (en %)**")
     tabla_mostrar = tabla_ng.copy()
     tabla_mostrar["porcentaje"] = tabla_mostrar["porcentaje"].round(1).astype(str) + "%"
-    st.dataframe(
-        tabla_mostrar[["GRADO_LABEL", "NIVEL_LOGRO_4", "conteo", "porcentaje"]]
+    mostrar_tabla(
+        tabla_mostrar[["GRADO_LABEL", "NIVEL_LOGRO_4", "conteo", "porcentaje"]], "niveles_grado"
     )
 
-    # Base del gráfico (barras DESAGREGADAS, no apiladas)
-    base = alt.Chart(tabla_ng).properties(height=320)
-
-    chart_ng = (
-        base.mark_bar()
-        .encode(
-            x=alt.X(
-                "GRADO_LABEL:N",
-                sort=grado_categories,
-                title="Grado",
-            ),
-            # barras desagregadas por nivel dentro de cada grado (en ORDEN fijo)
-            xOffset=alt.XOffset(
-                "NIVEL_LOGRO_4:N",
-                scale=alt.Scale(domain=niveles_order),
-            ),
-            y=alt.Y(
-                "proporcion:Q",
-                title="Proporción de estudiantes",
-                axis=alt.Axis(format="%", tickCount=6),
-                scale=alt.Scale(domain=[0, 1])  # SIEMPRE 0% a 100%
-            ),
-            color=alt.Color(
-                "NIVEL_LOGRO_4:N",
-                scale=alt.Scale(domain=niveles_order, range=palette_cog),
-                title="Nivel de logro",
-            ),
-            tooltip=[
-                "GRADO_LABEL:N",
-                "NIVEL_LOGRO_4:N",
-                alt.Tooltip("proporcion:Q", format=".1%"),
-                "conteo:Q",
-            ],
-        )
+    mostrar_grafico(
+        graficos.datos_niveles_grado(tabla_ng),
+        graficos.spec_niveles_grado(tuple(grado_categories)),
+        "niveles_grado",
     )
 
-    # Etiquetas con % sobre cada barra
-    text_ng = (
-        base.mark_text(dy=-5, color="white")
-        .encode(
-            x=alt.X(
-                "GRADO_LABEL:N",
-                sort=grado_categories,
-            ),
-            xOffset=alt.XOffset(
-                "NIVEL_LOGRO_4:N",
-                scale=alt.Scale(domain=niveles_order),
-            ),
-            y="proporcion:Q",
-            text=alt.Text("proporcion:Q", format=".0%"),
-            detail="NIVEL_LOGRO_4:N",
-        )
-    )
-
-    st.altair_chart(chart_ng + text_ng, use_container_width=True)
-
 # ---------------------------------------------------
 # HSE: niveles por prueba (proporciones)
 # ---------------------------------------------------
-def plot_niveles_hse(df_f, area_sel):
+def plot_niveles_hse(niveles, niveles_order, palette):
     st.subheader("NIVEL_LOGRO_4 – Prueba HSE")
 
-    # --- Normalización básica para evitar problemas de tildes/mayúsculas/espacios ---
-    def norm(s):
-        if pd.isna(s):
-            return None
-        s = str(s).strip()
-        s = unicodedata.normalize("NFKD", s)
-        s = "".join(c for c in s if not unicodedata.combining(c))
-        return s.lower()
-
-    df_hse = df_f.copy()
-    df_hse["nivel_norm"] = df_hse["NIVEL_LOGRO_4"].apply(norm)
-    area_norm = norm(area_sel)
-
-    # Orden y mapa por prueba, tal como definiste
-    if area_norm == "conciencia social":
-        niveles_order = [
-            "Egocéntricos",
-            "Normativos",
-            "Empáticos",
-            "Empáticos Compasivos",
-        ]
-        # mapeo desde forma normalizada a etiqueta bonita
-        map_norm_to_label = {
-            "egocentricos": "Egocéntricos",
-            "normativos": "Normativos",
-            "empaticos": "Empáticos",
-            "empaticos compasivos": "Empáticos Compasivos",
-            "empaticos_compasivos": "Empáticos Compasivos",
-        }
-        palette = ["#FFF3E0", "#FFE0B2", "#FFB74D", "#FB8C00"]
-    elif area_norm == "relaciones interpersonales":
-        niveles_order = [
-            "Disruptivo",
-            "Condicionado",
-            "Funcional",
-            "Constructivo",
-            "Transformador",
-        ]
-        map_norm_to_label = {
-            "disruptivo": "Disruptivo",
-            "condicionado": "Condicionado",
-            "funcional": "Funcional",
-            "constructivo": "Constructivo",
-            "transformador": "Transformador",
-        }
-        palette = ["#E3F2FD", "#BBDEFB", "#90CAF9", "#42A5F5", "#0D47A1"]
-    else:
-        # fallback si llegara otra prueba
-        niveles_order = sorted(df_hse["NIVEL_LOGRO_4"].dropna().unique().tolist())
-        map_norm_to_label = {}
-        palette = ["#E0F2F1", "#80CBC4", "#26A69A", "#00897B", "#004D40"][: len(niveles_order)]
-
-    # Canonizar las etiquetas usando el mapa; si no está en el mapa, se deja como viene
-    df_hse["NIVEL_CANON"] = df_hse["nivel_norm"].map(map_norm_to_label)
-    df_hse["NIVEL_CANON"] = df_hse["NIVEL_CANON"].fillna(df_hse["NIVEL_LOGRO_4"])
-
-    # Conteo por nivel respetando el orden deseado
-    counts = df_hse["NIVEL_CANON"].value_counts().reindex(niveles_order, fill_value=0)
-    total = counts.sum()
-
-    niveles = pd.DataFrame({"NIVEL_LOGRO_4": niveles_order, "conteo": counts.values})
-    if total > 0:
-        niveles["proporcion"] = niveles["conteo"] / total
-    else:
-        niveles["proporcion"] = 0.0
-    niveles["porcentaje"] = niveles["proporcion"] * 100
-
     st.write("**Proporción de estudiantes por nivel (HSE)**")
     tabla = niveles.copy()
     tabla["porcentaje"] = tabla["porcentaje"].round(1).astype(str) + "%"
-    st.dataframe(tabla[["NIVEL_LOGRO_4", "conteo", "porcentaje"]])
-
-    base = alt.Chart(niveles).properties(height=320)
-
-    # Barras en orden fijo, Y de 0 a 100%
-    chart = (
-        base.mark_bar()
-        .encode(
-            x=alt.X(
-                "NIVEL_LOGRO_4:N",
-                sort=niveles_order,
-                title="Nivel",
-            ),
-            y=alt.Y(
-                "proporcion:Q",
-                title="Proporción de estudiantes",
-                axis=alt.Axis(format="%", tickCount=6),
-                scale=alt.Scale(domain=[0, 1]),  # 0% a 100%
-            ),
-            color=alt.Color(
-                "NIVEL_LOGRO_4:N",
-                scale=alt.Scale(domain=niveles_order, range=palette),
-                title="Nivel",
-            ),
-            tooltip=[
-                "NIVEL_LOGRO_4:N",
-                alt.Tooltip("proporcion:Q", format=".1%"),
-                "conteo:Q",
-            ],
+    mostrar_tabla(tabla[["NIVEL_LOGRO_4", "conteo", "porcentaje"]], "niveles")
+
+    mostrar_grafico(
+        graficos.datos_niveles(niveles),
+        graficos.spec_niveles_hse(tuple(niveles_order), tuple(palette)),
+        "niveles",
+    )
+
+# ---------------------------------------------------
+# Trayectorias: mismos estudiantes entre periodos
+# ---------------------------------------------------
+def plot_trayectorias(cohorte):
+    st.subheader("Trayectorias de los mismos estudiantes")
+
+    if cohorte.kpis["transitos"] == 0:
+        st.info(
+            "No hay estudiantes con una evaluación anterior en la misma área "
+            "para los filtros actuales."
         )
+        return
+
+    st.write(
+        "**Estudiantes evaluados en el periodo seleccionado que tienen una "
+        "evaluación anterior en la misma área**"
     )
+    colt1, colt2, colt3, colt4 = st.columns(4)
+    with colt1:
+        st.metric("Estudiantes con historial", cohorte.kpis["estudiantes"])
+    with colt2:
+        st.metric("Suben de nivel", cohorte.kpis["suben"])
+    with colt3:
+        st.metric("Mantienen nivel", cohorte.kpis["se_mantienen"])
+    with colt4:
+        st.metric("Bajan de nivel", cohorte.kpis["bajan"])
+
+    col_chart, col_tab = st.columns([2, 1])
+    with col_chart:
+        mostrar_grafico(
+            graficos.datos_transiciones(cohorte.matriz),
+            graficos.spec_transiciones(tuple(cohorte.niveles_order)),
+            "transiciones",
+        )
+    with col_tab:
+        st.write("**Cambio de MEDIDA_500 (actual − anterior) con IC 95 %**")
+        mostrar_tabla(
+            cohorte.crecimiento[
+                ["ANHO_ORIGEN", "ANHO", "GRADO_ORIGEN", "GRADO_LABEL", "n", "crecimiento",
+                 "ic_inf", "ic_sup"]
+            ].round(1),
+            "crecimiento",
+        )
+
+# ---------------------------------------------------
+# Comparación entre sedes (ranking y niveles por sede)
+# ---------------------------------------------------
+# Paneles del gráfico de niveles: con muchas sedes solo las primeras del
+# ranking (la tabla las trae todas)
+SEDES_POR_GRAFICO = 48
+
+
+def plot_comparacion_sedes(comparacion, palette):
+    st.subheader("Comparación entre sedes")
+
+    if comparacion.ranking.empty:
+        st.info("No hay sedes con datos para los filtros actuales.")
+        return
 
-    # Etiquetas en %
-    text = (
-        base.mark_text(dy=-10, color="white")
-        .encode(
-            x=alt.X("NIVEL_LOGRO_4:N", sort=niveles_order),
-            y="proporcion:Q",
-            text=alt.Text("proporcion:Q", format=".0%"),
+    st.write(
+        "**Sedes ordenadas por media de MEDIDA_500, con la brecha "
+        "Femenino − Masculino e IC 95 %**"
+    )
+    mostrar_tabla(comparacion.ranking.round(1), "ranking_sedes")
+
+    st.write("**Distribución de niveles por sede (en el orden del ranking)**")
+    niveles = comparacion.niveles
+    if len(comparacion.ranking) > SEDES_POR_GRAFICO:
+        st.caption(f"Se muestran las {SEDES_POR_GRAFICO} primeras sedes del ranking.")
+        niveles = niveles[niveles["posicion"].to_numpy() <= SEDES_POR_GRAFICO]
+    mostrar_grafico(
+        graficos.datos_niveles_sede(niveles),
+        graficos.spec_niveles_sede(tuple(comparacion.niveles_order), tuple(palette)),
+        "niveles_sede",
+    )
+
+# ---------------------------------------------------
+# Tabla de detalle paginada y descargas por bloques
+# ---------------------------------------------------
+COLUMNAS_DETALLE = [
+    "FUENTE",
+    "ANHO",
+    "SEDE",
+    "GRADO_LABEL",
+    "COD_AREA",
+    "SEXO",
+    "MEDIDA_500",
+    "NIVEL_LOGRO_4",
+]
+COLUMNAS_BUSQUEDA = ["SEDE", "GRADO_LABEL", "SEXO"]
+COLUMNAS_ORDEN = ["SEDE", "GRADO_LABEL", "SEXO", "MEDIDA_500"]
+TAMANOS_PAGINA = [25, 50, 100, 250]
+EXPORT_BLOQUE = 50_000
+# Streamlit guarda cada descarga completa en memoria (en su gestor de
+# archivos de la sesión), así que las exportaciones tienen un tope de filas
+EXPORT_MAX_FILAS = 200_000
+
+
+def exportar_filas(df_global, filas, formato):
+    # Se toman de a EXPORT_BLOQUE filas (solo COLUMNAS_DETALLE): no hay una
+    # copia de todas las columnas de la selección, pero el archivo
+    # resultante sí queda entero en memoria.
+    with io.BytesIO() as fh:
+        writer = None
+        for inicio in range(0, max(len(filas), 1), EXPORT_BLOQUE):
+            bloque = df_global.take(filas[inicio:inicio + EXPORT_BLOQUE])[COLUMNAS_DETALLE]
+            if formato == "csv":
+                fh.write(bloque.to_csv(index=False, header=inicio == 0).encode("utf-8"))
+            else:
+                tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(fh, tabla.schema)
+                writer.write_table(tabla)
+        if writer is not None:
+            writer.close()
+        return fh.getvalue()
+
+
+def show_detalle(indice, filas_f, key_prefix):
+    col_b, col_r = st.columns([2, 2])
+    with col_b:
+        texto = st.text_input(
+            "Buscar (sede, grado, sexo)",
+            key=f"{key_prefix}_det_buscar",
+        )
+    with col_r:
+        minimo, maximo = indice.extremos("MEDIDA_500")
+        rango = st.slider(
+            "Rango MEDIDA_500",
+            min_value=math.floor(minimo),
+            max_value=math.ceil(maximo),
+            value=(math.floor(minimo), math.ceil(maximo)),
+            key=f"{key_prefix}_det_rango",
+        )
+
+    col_o, col_d, col_t, col_p = st.columns(4)
+    with col_o:
+        orden_col = st.selectbox(
+            "Ordenar por",
+            options=["(sin orden)"] + COLUMNAS_ORDEN,
+            key=f"{key_prefix}_det_orden",
+        )
+    with col_d:
+        descendente = st.toggle("Descendente", key=f"{key_prefix}_det_desc")
+    with col_t:
+        tam_pagina = st.selectbox(
+            "Filas por página",
+            options=TAMANOS_PAGINA,
+            index=1,
+            key=f"{key_prefix}_det_tam",
+        )
+
+    # Búsqueda y orden sobre posiciones de fila; solo la página se materializa
+    with PERFIL.etapa("detalle buscar/ordenar", filas=len(filas_f)):
+        filas = indice.buscar(filas_f, texto, COLUMNAS_BUSQUEDA)
+        # con el rango completo no se filtra (así no se pierden filas sin medida)
+        if rango != (math.floor(minimo), math.ceil(maximo)):
+            filas = indice.rango(filas, "MEDIDA_500", *rango)
+        if orden_col != "(sin orden)":
+            filas = indice.ordenar(filas, orden_col, descendente)
+
+    n_paginas = max(1, math.ceil(len(filas) / tam_pagina))
+    with col_p:
+        pagina = st.number_input(
+            "Página",
+            min_value=1,
+            max_value=n_paginas,
+            value=1,
+            step=1,
+            key=f"{key_prefix}_det_pagina",
+        )
+    pagina = min(int(pagina), n_paginas)
+
+    st.caption(f"{len(filas)} registros · página {pagina} de {n_paginas}")
+    inicio = (pagina - 1) * tam_pagina
+    mostrar_tabla(indice.df.take(filas[inicio:inicio + tam_pagina])[COLUMNAS_DETALLE], "detalle")
+
+    # Descargas diferidas: el archivo se genera solo al hacer clic
+    demasiadas = len(filas) > EXPORT_MAX_FILAS
+    if demasiadas:
+        st.caption(
+            f"Para descargar, acote la selección a {EXPORT_MAX_FILAS:,} registros o menos "
+            "(filtros, búsqueda o rango)."
+        )
+    col_csv, col_parquet = st.columns(2)
+    with col_csv:
+        st.download_button(
+            "Descargar CSV",
+            data=lambda: exportar_filas(indice.df, filas, "csv"),
+            file_name=f"detalle_{key_prefix}.csv",
+            mime="text/csv",
+            on_click="ignore",
+            disabled=demasiadas,
+            key=f"{key_prefix}_det_csv",
+        )
+    with col_parquet:
+        st.download_button(
+            "Descargar Parquet",
+            data=lambda: exportar_filas(indice.df, filas, "parquet"),
+            file_name=f"detalle_{key_prefix}.parquet",
+            mime="application/vnd.apache.parquet",
+            on_click="ignore",
+            disabled=demasiadas,
+            key=f"{key_prefix}_det_parquet",
         )
+
+# ---------------------------------------------------
+# Agregados memoizados por combinación de filtros
+# ---------------------------------------------------
+# Compartidos entre sesiones: la misma combinación se calcula una sola vez
+# mientras esté en el caché. Cada entrada son tablas pequeñas; el caché
+# queda acotado por número de entradas y por antigüedad. `version` cambia
+# cuando cambian los datos (o el país cargado), para no servir agregados
+# viejos.
+AGREGADOS_MAX_ENTRADAS = 1024
+AGREGADOS_TTL = "12h"
+
+
+@st.cache_data(max_entries=AGREGADOS_MAX_ENTRADAS, ttl=AGREGADOS_TTL, show_spinner=False)
+def compute_agregados(fuente, ano, sede, area, grado, version):
+    return consultas.query(
+        CUBO, fuente, ano=ano, sede=sede, area=area, grado=grado, tabla_cuantiles=CUANTILES
     )
 
-    st.altair_chart(chart + text, use_container_width=True)
+
+@st.cache_data(max_entries=AGREGADOS_MAX_ENTRADAS, ttl=AGREGADOS_TTL, show_spinner=False)
+def compute_cohorte(fuente, ano, sede, area, grado, version):
+    return consultas.cohorte(TRANSITOS, fuente, ano=ano, sede=sede, area=area, grado=grado)
+
+
+@st.cache_data(max_entries=AGREGADOS_MAX_ENTRADAS, ttl=AGREGADOS_TTL, show_spinner=False)
+def compute_comparacion(fuente, ano, area, grado, version):
+    return consultas.comparar_sedes(CUBO, fuente, ano=ano, area=area, grado=grado)
+
+
+def medido(etapa, compute):
+    # compute_* con los datos cargados, como los pide consultas.vista
+    def calcular(*filtros):
+        with PERFIL.etapa(etapa):
+            return compute(*filtros, VERSION_DATOS)
+    return calcular
 
 # ---------------------------------------------------
 # Lógica de cada pestaña
 # ---------------------------------------------------
-def show_tab_for_fuente(df_global, fuente, grado_categories, key_prefix):
-    df_src = df_global[df_global["FUENTE"] == fuente].copy()
+def radio_persistente(label, options, key, index=0, **kwargs):
+    # Streamlit borra el estado de los widgets que no se dibujan en un rerun;
+    # la última selección se guarda aparte para restaurarla al volver a la vista.
+    guardado = st.session_state.get(f"_{key}")
+    if guardado in options:
+        index = options.index(guardado)
+    valor = st.radio(label, options=options, index=index, key=key, **kwargs)
+    st.session_state[f"_{key}"] = valor
+    return valor
+
+
+def toggle_persistente(label, key, **kwargs):
+    # Igual que radio_persistente, para un st.toggle
+    valor = st.toggle(label, value=st.session_state.get(f"_{key}", False), key=key, **kwargs)
+    st.session_state[f"_{key}"] = valor
+    return valor
+
+
+def show_tab_for_fuente(indice, mapa_opciones, fuente, grado_categories, key_prefix):
+    with PERFIL.etapa("consultas.opciones"):
+        opciones = consultas.opciones(mapa_opciones, fuente)
     is_hse = fuente == "HSE"
 
-    if df_src.empty:
+    if not opciones["COD_AREA"]:
         st.warning(f"No hay datos para la fuente: {fuente}")
         return
 
     st.markdown("### Prueba HSE (Habilidades socioemocionales)" if is_hse else "### Prueba Cognitiva")
     st.markdown("#### Filtros")
+    comparar = toggle_persistente(
+        "Comparar sedes",
+        key=f"{key_prefix}_comparar",
+        help="Todas las sedes con el año, área y grado elegidos",
+    )
 
     col1, col2, col3 = st.columns(3)
 
     # Año
     with col1:
-        anos = sorted(df_src["ANHO"].dropna().unique().tolist())
-        opciones_ano = ["Todos"] + anos
+        opciones_ano = ["Todos"] + opciones["ANHO"]
         index_ano = len(opciones_ano) - 1 if len(opciones_ano) > 1 else 0
-        ano_sel = st.radio(
+        ano_sel = radio_persistente(
             "Año / periodo",
             options=opciones_ano,
             index=index_ano,
@@ -470,18 +535,18 @@ def show_tab_for_fuente(df_global, fuente, grado_categories, key_prefix):
 
     # Sede
     with col2:
-        sedes = sorted(df_src["SEDE"].dropna().unique().tolist())
-        opciones_sede = ["Todas"] + sedes
-        sede_sel = st.radio(
+        opciones_sede = ["Todas"] + opciones["SEDE"]
+        sede_sel = radio_persistente(
             "Sede",
             options=opciones_sede,
             key=f"{key_prefix}_sede",
             horizontal=True,
+            disabled=comparar,
         )
 
     # Área / Prueba
     with col3:
-        areas = sorted(df_src["COD_AREA"].dropna().unique().tolist())
+        areas = opciones["COD_AREA"]
         if is_hse:
             label_area = "Prueba"
             opciones_area = areas      # sin "Todas"
@@ -490,7 +555,7 @@ def show_tab_for_fuente(df_global, fuente, grado_categories, key_prefix):
             label_area = "Área"
             opciones_area = ["Todas"] + areas
             index_area = 0
-        area_sel = st.radio(
+        area_sel = radio_persistente(
             label_area,
             options=opciones_area,
             index=index_area,
@@ -498,106 +563,161 @@ def show_tab_for_fuente(df_global, fuente, grado_categories, key_prefix):
             horizontal=True,
         )
 
-    # Grados condicionados por filtros
-    df_for_grado = df_src.copy()
-    if ano_sel != "Todos":
-        df_for_grado = df_for_grado[df_for_grado["ANHO"] == ano_sel]
-    if sede_sel != "Todas":
-        df_for_grado = df_for_grado[df_for_grado["SEDE"] == sede_sel]
-    if is_hse:
-        df_for_grado = df_for_grado[df_for_grado["COD_AREA"] == area_sel]
-    else:
-        if area_sel != "Todas":
-            df_for_grado = df_for_grado[df_for_grado["COD_AREA"] == area_sel]
+    # "Todos" / "Todas" -> sin filtro
+    ano = None if ano_sel == "Todos" else ano_sel
+    sede = None if sede_sel == "Todas" or comparar else sede_sel
+    area = None if area_sel == "Todas" else area_sel
 
-    grados_presentes = [
-        g for g in grado_categories
-        if g in df_for_grado["GRADO_LABEL"].astype(str).unique()
-    ]
+    # Grados condicionados por filtros (mapa armado al cargar)
+    with PERFIL.etapa("consultas.grados"):
+        grados_presentes = consultas.grados(mapa_opciones, fuente, ano, sede, area)
     grado_opts = ["Todos"] + grados_presentes if grados_presentes else ["Todos"]
 
-    grado_sel = st.radio(
+    grado_sel = radio_persistente(
         "Grado",
         options=grado_opts,
         key=f"{key_prefix}_grado",
         horizontal=True,
     )
+    grado = None if grado_sel == "Todos" else grado_sel
+
+    PERFIL.anotar(fuente=fuente, ano=ano, sede=sede, area=area, grado=grado, comparar=comparar)
+
+    # Filas y agregados de la combinación (memoizados entre reruns y
+    # sesiones); bench/bench_concurrencia.py mide esta misma consulta
+    with PERFIL.etapa("consultas.vista", filas=indice.n_filas) as medicion:
+        vista_f = consultas.vista(
+            indice, fuente, ano, sede, area, grado, comparar,
+            agregados=medido("compute_agregados", compute_agregados),
+            comparacion=medido("compute_comparacion", compute_comparacion),
+            trayectorias=medido("compute_cohorte", compute_cohorte),
+        )
+        medicion.anotar(filas_resultado=len(vista_f.filas))
+    filas_f = vista_f.filas
 
-    # Filtros finales
-    df_f = df_src.copy()
-    if ano_sel != "Todos":
-        df_f = df_f[df_f["ANHO"] == ano_sel]
-    if sede_sel != "Todas":
-        df_f = df_f[df_f["SEDE"] == sede_sel]
-    if is_hse:
-        df_f = df_f[df_f["COD_AREA"] == area_sel]
-    else:
-        if area_sel != "Todas":
-            df_f = df_f[df_f["COD_AREA"] == area_sel]
-    if grado_sel != "Todos":
-        df_f = df_f[df_f["GRADO_LABEL"].astype(str) == grado_sel]
-
-    st.markdown(f"**Registros filtrados:** {len(df_f)}")
+    st.markdown(f"**Registros filtrados:** {len(filas_f)}")
 
-    if df_f.empty:
+    if len(filas_f) == 0:
         st.warning("No hay datos para la combinación de filtros seleccionada.")
         return
 
+    resultado = vista_f.resultado
+    resumen_kpis = resultado.kpis
+
     # KPIs
     colk1, colk2, colk3, colk4 = st.columns(4)
     with colk1:
-        n_est = df_f["CORREO"].nunique() if "CORREO" in df_f.columns else len(df_f)
-        st.metric("Estudiantes únicos", n_est)
+        st.metric("Estudiantes únicos", resumen_kpis["estudiantes"])
     with colk2:
-        st.metric("Sedes", df_f["SEDE"].nunique())
+        st.metric("Sedes", resumen_kpis["sedes"])
     with colk3:
-        st.metric("Media MEDIDA_500", f"{df_f['MEDIDA_500'].mean():,.1f}")
+        st.metric("Media MEDIDA_500", f"{resumen_kpis['media']:,.1f}")
     with colk4:
-        desv_medida = df_f["MEDIDA_500"].std()
+        desv_medida = resumen_kpis["desviacion"]
         st.metric("Desviación MEDIDA_500", f"{desv_medida:,.1f}" if not np.isnan(desv_medida) else "N/A")
 
-    st.markdown("---")
-
-    # Comparación por sexo (incluyendo grados)
-    plot_medida_por_sexo(df_f, grado_categories)
+    # Mediana y percentiles (resúmenes de cuantiles por partición)
+    for col_p, (nombre, etiqueta) in zip(
+        st.columns(5),
+        [("p10", "P10"), ("p25", "P25"), ("mediana", "Mediana"), ("p75", "P75"), ("p90", "P90")],
+    ):
+        valor = resumen_kpis[nombre]
+        with col_p:
+            st.metric(f"{etiqueta} MEDIDA_500", f"{valor:,.1f}" if not np.isnan(valor) else "N/A")
 
     st.markdown("---")
 
-    # Niveles
-    if is_hse:
-        plot_niveles_hse(df_f, area_sel)
+    if comparar:
+        # Todas las sedes en un solo pase sobre el cubo
+        comparacion = vista_f.comparacion
+        with PERFIL.etapa("plot_comparacion_sedes", filas=len(comparacion.ranking)):
+            palette = (
+                graficos.paleta_hse(area_sel, len(comparacion.niveles_order))
+                if is_hse else graficos.PALETA_COGNITIVA
+            )
+            plot_comparacion_sedes(comparacion, palette)
+        st.markdown("---")
     else:
-        plot_niveles_cognitivos(df_f, grado_categories)
+        # Comparación por sexo (incluyendo grados)
+        with PERFIL.etapa("plot_medida_por_sexo", filas=len(resultado.sexo)):
+            plot_medida_por_sexo(resultado.sexo, resultado.brecha_sexo, grado_categories)
+
+        st.markdown("---")
+
+        # Distribución completa (no solo la media)
+        with PERFIL.etapa("plot_distribucion", filas=len(resultado.distribucion)):
+            plot_distribucion(
+                resultado.distribucion, resultado.cortes_nivel, grado_categories, key_prefix
+            )
+
+        st.markdown("---")
+
+        # Niveles
+        if is_hse:
+            with PERFIL.etapa("plot_niveles_hse", filas=len(resultado.niveles)):
+                plot_niveles_hse(
+                    resultado.niveles,
+                    resultado.niveles_order,
+                    graficos.paleta_hse(area_sel, len(resultado.niveles_order)),
+                )
+        else:
+            with PERFIL.etapa("plot_niveles_cognitivos", filas=len(resultado.niveles_grado)):
+                plot_niveles_cognitivos(resultado.niveles, resultado.niveles_grado, grado_categories)
+
+        st.markdown("---")
+
+        # Mismos estudiantes entre periodos (filtros = periodo / sede / grado actuales)
+        cohorte = vista_f.cohorte
+        with PERFIL.etapa("plot_trayectorias", filas=cohorte.kpis["transitos"]):
+            plot_trayectorias(cohorte)
 
-    # Tabla detalle
+    # Tabla detalle (única parte que necesita las filas)
     with st.expander("Ver tabla de detalle"):
-        st.dataframe(
-            df_f[
-                [
-                    "FUENTE",
-                    "ANHO",
-                    "SEDE",
-                    "GRADO_LABEL",
-                    "COD_AREA",
-                    "SEXO",
-                    "MEDIDA_500",
-                    "NIVEL_LOGRO_4",
-                ]
-            ]
-        )
+        with PERFIL.etapa("show_detalle", filas=len(filas_f)):
+            show_detalle(indice, filas_f, key_prefix)
 
 # ---------------------------------------------------
-# Tabs principales
+# Vistas principales
 # ---------------------------------------------------
-tab_cog, tab_hse = st.tabs(
-    ["Prueba Cognitiva", "Prueba HSE (Habilidades socioemocionales)"]
+# A diferencia de st.tabs (que ejecuta todas las pestañas en cada rerun),
+# solo se filtra, agrega y grafica la vista activa. La otra conserva sus
+# filtros (radio_persistente) y sus agregados (compute_agregados).
+VISTAS = {
+    "Prueba Cognitiva": ("Cognitivas", "cog"),
+    "Prueba HSE (Habilidades socioemocionales)": ("HSE", "hse"),
+}
+
+# País: solo se muestra el selector si data/ trae más de uno
+FIRMA = almacen.firma_datos()
+PAISES = load_paises(FIRMA)
+if len(PAISES) > 1:
+    pais_sel = radio_persistente("País", options=PAISES, key="pais", horizontal=True)
+else:
+    pais_sel = PAISES[0] if PAISES else None
+
+with PERFIL.etapa("load_data") as medicion:
+    (
+        df, GRADO_CATEGORIES, CUBO, CUANTILES, INDICE, MAPA_OPCIONES, TRANSITOS, VERSION_DATOS,
+    ) = load_data(FIRMA, pais_sel)
+    medicion.anotar(filas=len(df))
+PERFIL.anotar(pais=pais_sel, version=VERSION_DATOS)
+
+vista_sel = st.radio(
+    "Vista",
+    options=list(VISTAS),
+    key="vista",
+    horizontal=True,
+    label_visibility="collapsed",
 )
-
-with tab_cog:
-    show_tab_for_fuente(df, "Cognitivas", GRADO_CATEGORIES, key_prefix="cog")
-
-with tab_hse:
-    show_tab_for_fuente(df, "HSE", GRADO_CATEGORIES, key_prefix="hse")
+fuente_sel, prefijo_sel = VISTAS[vista_sel]
+show_tab_for_fuente(INDICE, MAPA_OPCIONES, fuente_sel, GRADO_CATEGORIES, key_prefix=prefijo_sel)
+
+# Panel de depuración: solo con el perfil activo
+if PERFIL.activo:
+    PERFIL.volcar()
+    with st.expander("Perfil del rerun"):
+        st.caption(f"{PERFIL.total_ms():,.1f} ms en total · registro en {perfil.PERFIL_LOG}")
+        st.dataframe(PERFIL.tabla())
 
 
 
@@ -0,0 +1,383 @@
+# ---------------------------------------------------
+# Prueba de carga: muchas sesiones del tablero a la vez
+# ---------------------------------------------------
+# Reproduce el inicio de periodo, cuando muchos docentes abren el tablero al
+# mismo tiempo, sin navegador ni servicios externos. Cada sesión simulada
+# es un hilo (como las sesiones de Streamlit en un mismo servidor) que:
+#   - arranca con los filtros por defecto de la vista, todas a la vez;
+#   - cambia un filtro por rerun (año, sede, área, grado, vista, comparar
+#     sedes), como quien hace clic en los radios;
+#   - en cada rerun hace la consulta de show_tab_for_fuente: opciones de
+#     filtro y consultas.vista (filas, agregados / comparación /
+#     trayectorias) con cálculos memoizados en st.cache_data como en
+#     app.py, la página de detalle y la serialización Arrow de cada tabla.
+# Por cada número de sesiones informa reruns por segundo, latencia por
+# rerun (p50 / p95 / p99 / máx.) y la memoria del proceso (RSS al inicio,
+# pico y crecimiento). El caché empieza vacío en cada nivel.
+#
+#   python bench/bench_concurrencia.py                               # 1, 8 y 32 sesiones, 1 M filas
+#   python bench/bench_concurrencia.py --sesiones 64 --duracion 30 --pausa 0.5
+#   python bench/bench_concurrencia.py --almacen --json concurrencia.json
+import argparse
+import gc
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit import dataframe_util
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import almacen  # noqa: E402
+import cohortes  # noqa: E402
+import consultas  # noqa: E402
+import filtros  # noqa: E402
+import ingesta  # noqa: E402
+from bench_datos import percentiles_ms  # noqa: E402
+from sinteticos import generate_libros  # noqa: E402
+
+SESIONES = [1, 8, 32]
+FILAS = 1_000_000
+DURACION = 10.0
+TAM_PAGINA = 50
+# Como app.AGREGADOS_MAX_ENTRADAS
+CACHE_MAX_ENTRADAS = 1024
+MUESTREO_MEMORIA = 0.05
+
+# Qué cambia el usuario en cada rerun (pesos relativos)
+ACCIONES = {
+    "ano": 0.20, "sede": 0.30, "area": 0.20, "grado": 0.15, "vista": 0.05,
+    "comparar": 0.05, "detalle": 0.05,
+}
+
+
+# ---------------------------------------------------
+# Datos, como los deja load_data
+# ---------------------------------------------------
+class Datos:
+    def __init__(self, df, celdas, tabla_cuantiles, version):
+        self.df = df
+        self.celdas = celdas
+        self.tabla_cuantiles = tabla_cuantiles
+        self.version = version
+        self.grado_categories = df["GRADO_LABEL"].cat.categories.tolist()
+        self.indice = filtros.IndiceFiltros(df)
+        self.mapa = filtros.MapaOpciones(celdas)
+        self.transitos = filtros.IndiceFiltros(cohortes.build_transitos(df))
+
+
+def datos_sinteticos(n_filas, semilla):
+    with tempfile.TemporaryDirectory() as tmp:
+        claves = []
+        for i, (fuente, raw) in enumerate(generate_libros(n_filas, semilla)):
+            clave = f"{i:02d}_{fuente}"
+            almacen.write_parte(ingesta.prepare_resultados(raw, fuente), Path(tmp), clave)
+            claves.append(clave)
+        df, celdas, tabla_cuantiles = almacen.load_partes(Path(tmp), claves)
+    return Datos(df, celdas, tabla_cuantiles, f"sinteticos-{n_filas}-{semilla}")
+
+
+# ---------------------------------------------------
+# Cálculos memoizados entre sesiones (como compute_* en app.py)
+# ---------------------------------------------------
+# Fuera de `streamlit run`, st.cache_data guarda en la memoria del proceso
+# igual que en el servidor: un solo cálculo por clave aunque varias sesiones
+# la pidan a la vez, y cada lectura des-serializa su propia copia.
+_contadores = {"llamadas": 0, "calculos": 0}
+_lock_contadores = threading.Lock()
+
+
+def _contar(clave):
+    with _lock_contadores:
+        _contadores[clave] += 1
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def compute_agregados(_datos, fuente, ano, sede, area, grado, version):
+    _contar("calculos")
+    return consultas.query(
+        _datos.celdas, fuente, ano=ano, sede=sede, area=area, grado=grado,
+        tabla_cuantiles=_datos.tabla_cuantiles,
+    )
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def compute_cohorte(_datos, fuente, ano, sede, area, grado, version):
+    _contar("calculos")
+    return consultas.cohorte(_datos.transitos, fuente, ano=ano, sede=sede, area=area, grado=grado)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def compute_comparacion(_datos, fuente, ano, area, grado, version):
+    _contar("calculos")
+    return consultas.comparar_sedes(_datos.celdas, fuente, ano=ano, area=area, grado=grado)
+
+
+COMPUTE = [compute_agregados, compute_cohorte, compute_comparacion]
+
+
+def memoizado(datos, compute):
+    # compute_* con los datos cargados, como los pide consultas.vista
+    def calcular(*filtros):
+        _contar("llamadas")
+        return compute(datos, *filtros, datos.version)
+    return calcular
+
+
+def vaciar_cache():
+    for compute in COMPUTE:
+        compute.clear()
+    with _lock_contadores:
+        _contadores.update(llamadas=0, calculos=0)
+
+
+# ---------------------------------------------------
+# Un rerun de la vista (show_tab_for_fuente)
+# ---------------------------------------------------
+def _bytes_tabla(tabla):
+    # st.dataframe / datos de st.vega_lite_chart
+    return len(dataframe_util.convert_anything_to_arrow_bytes(tabla))
+
+
+def _bytes_vista(resultado):
+    # Tablas de la vista en Arrow; el recorte de columnas y las specs de
+    # cada gráfico se miden aparte en bench_graficos.py
+    partes = (resultado.resultado, resultado.comparacion, resultado.cohorte)
+    return sum(
+        _bytes_tabla(valor)
+        for parte in partes if parte is not None
+        for valor in vars(parte).values() if isinstance(valor, pd.DataFrame) and not valor.empty
+    )
+
+
+def rerun(datos, estado):
+    # Lo mismo que show_tab_for_fuente: opciones de los filtros y
+    # consultas.vista con los compute_* memoizados
+    fuente, ano, area, grado = estado["fuente"], estado["ano"], estado["area"], estado["grado"]
+    comparar = estado["comparar"]
+    sede = None if comparar else estado["sede"]
+    consultas.opciones(datos.mapa, fuente)
+    consultas.grados(datos.mapa, fuente, ano, sede, area)
+    resultado = consultas.vista(
+        datos.indice, fuente, ano, sede, area, grado, comparar,
+        agregados=memoizado(datos, compute_agregados),
+        comparacion=memoizado(datos, compute_comparacion),
+        trayectorias=memoizado(datos, compute_cohorte),
+    )
+    if len(resultado.filas) == 0:
+        return 0
+
+    # Página de la tabla de detalle (ordenada si el usuario la ordenó)
+    filas_f = resultado.filas
+    if estado["orden"]:
+        filas_f = datos.indice.ordenar(filas_f, "MEDIDA_500", descendente=True)
+    return _bytes_vista(resultado) + _bytes_tabla(datos.indice.vista(filas_f[:TAM_PAGINA]))
+
+
+# ---------------------------------------------------
+# Sesiones simuladas
+# ---------------------------------------------------
+def _elegir(rng, opciones):
+    return opciones[rng.integers(len(opciones))]
+
+
+def estado_inicial(datos, fuente):
+    # Valores por defecto de los radios de la vista
+    opciones = consultas.opciones(datos.mapa, fuente)
+    return {
+        "fuente": fuente,
+        "ano": opciones["ANHO"][-1] if opciones["ANHO"] else None,
+        "sede": None,
+        "area": opciones["COD_AREA"][0] if fuente == "HSE" else None,
+        "grado": None,
+        "comparar": False,
+        "orden": False,
+    }
+
+
+def siguiente(datos, estado, rng):
+    # Un clic: cambia un filtro; el grado vuelve a "Todos" si deja de existir
+    pesos = np.array(list(ACCIONES.values()))
+    accion = list(ACCIONES)[rng.choice(len(pesos), p=pesos / pesos.sum())]
+    opciones = consultas.opciones(datos.mapa, estado["fuente"])
+    if accion == "vista":
+        estado = estado_inicial(datos, "HSE" if estado["fuente"] == "Cognitivas" else "Cognitivas")
+    elif accion == "comparar":
+        estado["comparar"] = not estado["comparar"]
+    elif accion == "detalle":
+        estado["orden"] = not estado["orden"]
+    elif accion == "ano":
+        estado["ano"] = _elegir(rng, [None] + opciones["ANHO"])
+    elif accion == "sede":
+        estado["sede"] = _elegir(rng, [None] + opciones["SEDE"])
+    elif accion == "area":
+        areas = opciones["COD_AREA"]
+        estado["area"] = _elegir(rng, areas if estado["fuente"] == "HSE" else [None] + areas)
+    elif accion == "grado":
+        sede = None if estado["comparar"] else estado["sede"]
+        estado["grado"] = _elegir(
+            rng, [None] + consultas.grados(datos.mapa, estado["fuente"], estado["ano"], sede, estado["area"])
+        )
+    sede = None if estado["comparar"] else estado["sede"]
+    grados = consultas.grados(datos.mapa, estado["fuente"], estado["ano"], sede, estado["area"])
+    if estado["grado"] not in grados:
+        estado["grado"] = None
+    return estado
+
+
+def sesion(datos, semilla, inicio, fin, pausa, tiempos, bytes_enviados, errores):
+    rng = np.random.default_rng(semilla)
+    estado = estado_inicial(datos, _elegir(rng, ["Cognitivas", "Cognitivas", "HSE"]))
+    inicio.wait()
+    while time.perf_counter() < fin[0]:
+        t0 = time.perf_counter()
+        try:
+            bytes_enviados.append(rerun(datos, estado))
+            tiempos.append(time.perf_counter() - t0)
+        except Exception as e:  # se informa, no se detiene la prueba
+            errores.append(repr(e))
+        estado = siguiente(datos, estado, rng)
+        if pausa:
+            time.sleep(rng.exponential(pausa))
+
+
+# ---------------------------------------------------
+# Memoria del proceso
+# ---------------------------------------------------
+def rss_mb():
+    # /proc/self/statm: páginas residentes en la segunda columna (Linux)
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * 4096 / 1e6
+
+
+class MonitorMemoria(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.pico = rss_mb()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(MUESTREO_MEMORIA):
+            self.pico = max(self.pico, rss_mb())
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+# ---------------------------------------------------
+# Un nivel de concurrencia
+# ---------------------------------------------------
+def medir(datos, n_sesiones, duracion, pausa, semilla):
+    vaciar_cache()
+    tiempos, bytes_enviados, errores = [], [], []
+    inicio = threading.Barrier(n_sesiones + 1)
+    fin = [float("inf")]
+    hilos = [
+        threading.Thread(
+            target=sesion,
+            args=(datos, semilla + i, inicio, fin, pausa, tiempos, bytes_enviados, errores),
+            daemon=True,
+        )
+        for i in range(n_sesiones)
+    ]
+    for hilo in hilos:
+        hilo.start()
+
+    gc.collect()  # lo que quedó del nivel anterior no cuenta como crecimiento
+    rss_inicio = rss_mb()
+    monitor = MonitorMemoria()
+    monitor.start()
+    t0 = time.perf_counter()
+    fin[0] = t0 + duracion
+    inicio.wait()  # todas las sesiones abren a la vez
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - t0
+    monitor.parar()
+    rss_fin = rss_mb()
+
+    resultado = {
+        "sesiones": n_sesiones,
+        "reruns": len(tiempos),
+        "errores": len(errores),
+        "reruns_s": len(tiempos) / transcurrido,
+        "kb_rerun": np.mean(bytes_enviados) / 1e3 if bytes_enviados else 0.0,
+        "aciertos_cache": 1 - _contadores["calculos"] / max(_contadores["llamadas"], 1),
+        "rss_inicio_mb": rss_inicio,
+        "rss_pico_mb": monitor.pico,
+        "crecimiento_mb": rss_fin - rss_inicio,
+    }
+    if tiempos:
+        resultado.update(percentiles_ms(tiempos))
+    if errores:
+        resultado["primer_error"] = errores[0]
+    return resultado
+
+
+def imprimir_tabla(resultados):
+    columnas = [
+        ("sesiones", "{:>8,}"), ("reruns", "{:>8,}"), ("reruns_s", "{:>9.1f}"),
+        ("p50_ms", "{:>8.1f}"), ("p95_ms", "{:>8.1f}"), ("p99_ms", "{:>8.1f}"), ("max_ms", "{:>8.1f}"),
+        ("kb_rerun", "{:>8.1f}"), ("aciertos_cache", "{:>7.0%}"),
+        ("rss_pico_mb", "{:>8.1f}"), ("crecimiento_mb", "{:>8.1f}"), ("errores", "{:>7,}"),
+    ]
+    encabezado = ["sesiones", "reruns", "reruns/s", "p50 ms", "p95 ms", "p99 ms", "máx ms",
+                  "KB/rerun", "caché", "pico MB", "+MB", "errores"]
+    anchos = [max(len(fmt.format(0)), len(t)) for (_, fmt), t in zip(columnas, encabezado)]
+    print("  ".join(t.rjust(a) for t, a in zip(encabezado, anchos)))
+    for r in resultados:
+        print("  ".join(
+            fmt.format(r.get(col, float("nan"))).rjust(a) for (col, fmt), a in zip(columnas, anchos)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones simultáneas del tablero")
+    parser.add_argument("--sesiones", type=int, nargs="+", default=SESIONES)
+    parser.add_argument("--duracion", type=float, default=DURACION, help="segundos por nivel")
+    parser.add_argument("--pausa", type=float, default=0.0,
+                        help="pausa media entre clics de una sesión, en segundos (0 = sin pausa)")
+    parser.add_argument("--filas", type=int, default=FILAS, help="filas sintéticas")
+    parser.add_argument("--almacen", action="store_true", help="usar los libros de data/ en lugar de sintéticos")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+    # Sin `streamlit run` st.cache_data avisa que no hay runtime y cada hilo
+    # que no tiene ScriptRunContext
+    for nombre in ("caching.cache_data_api", "scriptrunner_utils.script_run_context"):
+        logging.getLogger(f"streamlit.runtime.{nombre}").setLevel(logging.ERROR)
+
+    inicio = time.perf_counter()
+    if args.almacen:
+        datos = Datos(*almacen.load_almacen())
+    else:
+        datos = datos_sinteticos(args.filas, args.semilla)
+    print(
+        f"Datos: {len(datos.df):,} filas, {len(datos.celdas):,} celdas "
+        f"({time.perf_counter() - inicio:.1f} s); RSS {rss_mb():.1f} MB",
+        file=sys.stderr,
+    )
+
+    resultados = []
+    for n_sesiones in args.sesiones:
+        print(f"{n_sesiones} sesiones durante {args.duracion:g} s...", file=sys.stderr)
+        resultados.append(medir(datos, n_sesiones, args.duracion, args.pausa, args.semilla))
+
+    imprimir_tabla(resultados)
+    for r in resultados:
+        if "primer_error" in r:
+            print(f"{r['sesiones']} sesiones: {r['errores']} errores, p. ej. {r['primer_error']}")
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=1), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# ---------------------------------------------------
+# Benchmark del camino de datos del tablero (sin Streamlit)
+# ---------------------------------------------------
+# Para cada tamaño genera datos sintéticos (bench/sinteticos.py) y mide:
+#   - ingesta: preparar cada libro, armar su cubo y escribir las partes Arrow
+#   - carga:   leer las partes (memory map), unirlas y construir el índice
+#              y el mapa de opciones de filtro
+#              (lo que hace load_data al arrancar con el almacén al día)
+#   - interacción: un rerun de la vista con filtros al azar, sin memoizar
+#              (opciones de filtro + consultas.query + una página de detalle)
+#   - memoria pico del proceso (ru_maxrss)
+# Cada tamaño corre en su propio proceso para que la memoria pico no se
+# mezcle entre tamaños.
+#
+#   python bench/bench_datos.py                      # 10 mil y 1 millón
+#   python bench/bench_datos.py --filas 10000000     # 10 millones
+#   python bench/bench_datos.py --json bench_output.json
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import almacen  # noqa: E402
+import consultas  # noqa: E402
+import filtros  # noqa: E402
+import ingesta  # noqa: E402
+from sinteticos import generate_libros  # noqa: E402
+
+TAMANOS = [10_000, 1_000_000]
+INTERACCIONES = 200
+TAM_PAGINA = 50
+
+
+# ---------------------------------------------------
+# Un rerun de la vista (lo que hace show_tab_for_fuente, sin graficar)
+# ---------------------------------------------------
+def elegir(rng, opciones, todos):
+    # La mitad de las veces se deja el filtro en "Todos"
+    if rng.random() < 0.5 or not opciones:
+        return todos
+    return opciones[rng.integers(len(opciones))]
+
+
+def interaccion(indice, mapa, celdas, tabla_cuantiles, rng):
+    fuente = ["Cognitivas", "HSE"][rng.integers(2)]
+    opciones = consultas.opciones(mapa, fuente)
+
+    ano = elegir(rng, opciones["ANHO"], None)
+    sede = elegir(rng, opciones["SEDE"], None)
+    areas = opciones["COD_AREA"]
+    area = areas[rng.integers(len(areas))] if fuente == "HSE" else elegir(rng, areas, None)
+    grado = elegir(rng, consultas.grados(mapa, fuente, ano, sede, area), None)
+
+    filas_f = consultas.filas(indice, fuente, ano, sede, area, grado)
+    consultas.query(celdas, fuente, ano, sede, area, grado, tabla_cuantiles)
+    indice.df.take(filas_f[:TAM_PAGINA])
+    return len(filas_f)
+
+
+# ---------------------------------------------------
+# Medición de un tamaño (en el proceso actual)
+# ---------------------------------------------------
+def percentiles_ms(tiempos):
+    p50, p95, p99 = np.percentile(np.asarray(tiempos) * 1000, [50, 95, 99])
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": max(tiempos) * 1000}
+
+
+def medir(n_filas, interacciones, semilla):
+    resultado = {"filas": n_filas}
+
+    inicio = time.perf_counter()
+    libros = generate_libros(n_filas, semilla)
+    resultado["generacion_s"] = time.perf_counter() - inicio
+
+    with tempfile.TemporaryDirectory() as tmp:
+        partes_dir = Path(tmp)
+
+        inicio = time.perf_counter()
+        claves = []
+        for i, (fuente, raw) in enumerate(libros):
+            clave = f"{i:02d}_{fuente}"
+            almacen.write_parte(ingesta.prepare_resultados(raw, fuente), partes_dir, clave)
+            claves.append(clave)
+        resultado["ingesta_s"] = time.perf_counter() - inicio
+        del libros, raw
+
+        inicio = time.perf_counter()
+        df_local, celdas, tabla_cuantiles = almacen.load_partes(partes_dir, claves)
+        indice = filtros.IndiceFiltros(df_local)
+        mapa = filtros.MapaOpciones(celdas)
+        resultado["carga_s"] = time.perf_counter() - inicio
+
+    _, total = ingesta.memory_report(df_local)
+    resultado["memoria_frame_mb"] = total / 1e6
+    resultado["celdas_cubo"] = len(celdas)
+
+    rng = np.random.default_rng(semilla)
+    interaccion(indice, mapa, celdas, tabla_cuantiles, rng)  # calentamiento (códigos perezosos, etc.)
+    tiempos = []
+    for _ in range(interacciones):
+        inicio = time.perf_counter()
+        interaccion(indice, mapa, celdas, tabla_cuantiles, rng)
+        tiempos.append(time.perf_counter() - inicio)
+    resultado.update(percentiles_ms(tiempos))
+
+    # En Linux ru_maxrss viene en KB
+    resultado["rss_pico_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return resultado
+
+
+# ---------------------------------------------------
+# CLI
+# ---------------------------------------------------
+def medir_en_subproceso(n_filas, interacciones, semilla):
+    salida = subprocess.run(
+        [
+            sys.executable, __file__,
+            "--un-tamano", str(n_filas),
+            "--interacciones", str(interacciones),
+            "--semilla", str(semilla),
+        ],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(salida.stdout)
+
+
+def imprimir_tabla(resultados):
+    columnas = [
+        ("filas", "{:>11,}"), ("celdas_cubo", "{:>8,}"),
+        ("ingesta_s", "{:>9.2f}"), ("carga_s", "{:>8.2f}"),
+        ("p50_ms", "{:>8.2f}"), ("p95_ms", "{:>8.2f}"), ("p99_ms", "{:>8.2f}"),
+        ("memoria_frame_mb", "{:>10.1f}"), ("rss_pico_mb", "{:>9.1f}"),
+    ]
+    encabezado = ["filas", "celdas", "ingesta s", "carga s", "p50 ms", "p95 ms", "p99 ms",
+                  "frame MB", "pico MB"]
+    anchos = [len(fmt.format(0)) for _, fmt in columnas]
+    print("  ".join(t.rjust(a) for t, a in zip(encabezado, anchos)))
+    for r in resultados:
+        print("  ".join(fmt.format(r[col]) for col, fmt in columnas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del camino de datos del tablero")
+    parser.add_argument("--filas", type=int, nargs="+", default=TAMANOS)
+    parser.add_argument("--interacciones", type=int, default=INTERACCIONES)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="guardar los resultados en este archivo")
+    parser.add_argument("--un-tamano", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.un_tamano is not None:
+        print(json.dumps(medir(args.un_tamano, args.interacciones, args.semilla)))
+        return
+
+    resultados = []
+    for n_filas in args.filas:
+        print(f"Midiendo {n_filas:,} filas...", file=sys.stderr)
+        resultados.append(medir_en_subproceso(n_filas, args.interacciones, args.semilla))
+
+    imprimir_tabla(resultados)
+    if args.json:
+        args.json.write_text(json.dumps(resultados, indent=1), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
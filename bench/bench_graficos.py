@@ -0,0 +1,105 @@
+# ---------------------------------------------------
+# Bytes de gráficos enviados al navegador por interacción
+# ---------------------------------------------------
+# Para cada combinación de filtros del cubo arma los gráficos de la vista
+# como lo hace el tablero y suma lo que viaja al navegador por gráfico: la
+# spec Vega-Lite (JSON) y los datos (Arrow, como los serializa Streamlit).
+# Compara tres formas de enviar lo mismo:
+#   - altair:    gráfico Altair con las tablas completas de la Consulta
+#                (st.altair_chart, como antes)
+#   - plantilla: spec en caché + solo las columnas usadas (st.vega_lite_chart)
+#   - en_linea:  plantilla con los datos como "values" JSON (reportes)
+# Mide también el tiempo de armar la spec (Altair en cada rerun vs caché).
+#
+#   python bench/bench_graficos.py
+import json
+import sys
+import time
+from pathlib import Path
+
+import altair as alt
+import numpy as np
+from streamlit import dataframe_util
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import almacen  # noqa: E402
+import consultas  # noqa: E402
+import graficos  # noqa: E402
+
+
+def _bytes_streamlit(spec, datos):
+    # Spec JSON + datos en Arrow, como los serializa Streamlit
+    return len(json.dumps(spec)) + len(dataframe_util.convert_anything_to_arrow_bytes(datos))
+
+
+def _bytes_en_linea(spec, datos):
+    return len(json.dumps(graficos.con_datos(spec, datos)))
+
+
+def graficos_vista(consulta, area, grados):
+    # (spec, tabla completa, datos del gráfico) de cada gráfico de la vista
+    vista = []
+    if not consulta.sexo.empty:
+        vista.append((
+            graficos.spec_medida_por_sexo(grados),
+            consulta.sexo,
+            graficos.datos_medida_por_sexo(consulta.sexo),
+        ))
+    if consulta.fuente == "HSE":
+        palette = graficos.paleta_hse(area, len(consulta.niveles_order))
+        vista.append((
+            graficos.spec_niveles_hse(tuple(consulta.niveles_order), tuple(palette)),
+            consulta.niveles,
+            graficos.datos_niveles(consulta.niveles),
+        ))
+    else:
+        vista.append((
+            graficos.spec_niveles_cognitivos(),
+            consulta.niveles,
+            graficos.datos_niveles(consulta.niveles),
+        ))
+        if not consulta.niveles_grado.empty:
+            vista.append((
+                graficos.spec_niveles_grado(grados),
+                consulta.niveles_grado,
+                graficos.datos_niveles_grado(consulta.niveles_grado),
+            ))
+    return vista
+
+
+def main():
+    _, celdas, _, _ = almacen.load_almacen()
+    grados = tuple(celdas["GRADO_LABEL"].cat.categories)
+
+    combinaciones = (
+        celdas[["FUENTE", "SEDE", "COD_AREA"]].drop_duplicates().itertuples(index=False)
+    )
+    totales = {"altair": [], "plantilla": [], "en_linea": []}
+    for fuente, sede, area in combinaciones:
+        consulta = consultas.query(celdas, fuente, sede=sede, area=area)
+        vista = graficos_vista(consulta, area, grados)
+        totales["altair"].append(sum(_bytes_streamlit(s, t) for s, t, _ in vista))
+        totales["plantilla"].append(sum(_bytes_streamlit(s, d) for s, _, d in vista))
+        totales["en_linea"].append(sum(_bytes_en_linea(s, d) for s, _, d in vista))
+
+    print(f"{len(totales['altair'])} combinaciones (fuente x sede x área)")
+    for nombre, valores in totales.items():
+        print(f"  {nombre:<10} {np.mean(valores):>8,.0f} bytes por interacción")
+
+    # Armar la spec: Altair (validación + to_dict) vs plantilla en caché
+    spec_medida = graficos.spec_medida_por_sexo.__wrapped__
+    inicio = time.perf_counter()
+    for _ in range(20):
+        spec_medida(grados)
+    altair_ms = (time.perf_counter() - inicio) / 20 * 1000
+    inicio = time.perf_counter()
+    for _ in range(20):
+        graficos.spec_medida_por_sexo(grados)
+    cache_ms = (time.perf_counter() - inicio) / 20 * 1000
+    print(f"Spec MEDIDA_500 por sexo: {altair_ms:.2f} ms con Altair, {cache_ms:.4f} ms en caché "
+          f"(Altair {alt.__version__})")
+
+
+if __name__ == "__main__":
+    main()
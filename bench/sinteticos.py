@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ---------------------------------------------------
+# Datos sintéticos con el esquema de los libros de resultados
+# ---------------------------------------------------
+# Mismas columnas y valores que los libros reales (las que usa
+# ingesta.prepare_resultados), pero del tamaño que se pida. Cada estudiante
+# tiene sede, grado y sexo fijos y aparece en varias áreas y periodos, así
+# que el conteo de estudiantes únicos y las uniones del cubo se ejercitan
+# como con los datos reales. Las sedes crecen con el tamaño (más colegios de
+# la red), que es lo que hace crecer el número de celdas del cubo.
+ANOS = ["2023 - 2", "2024 - 1", "2024 - 2"]
+GRADOS = ["Tercero", "Cuarto", "Quinto", "Sexto", "Séptimo", "Octavo", "Noveno"]
+
+AREAS = {
+    "Cognitivas": ["CIENCIAS", "LECTURA", "MATEMÁTICA"],
+    "HSE": ["Conciencia Social", "Relaciones Interpersonales"],
+}
+
+# Niveles (tal como vienen en los libros) por área, de menor a mayor
+NIVELES = {
+    "CIENCIAS": ["Inicio", "Básico", "Satisfactorio", "Avanzado"],
+    "LECTURA": ["Inicio", "Básico", "Satisfactorio", "Avanzado"],
+    "MATEMÁTICA": ["Inicio", "Básico", "Satisfactorio", "Avanzado"],
+    "Conciencia Social": ["Egocéntricos", "Normativos", "Empáticos", "Empáticos compasivos"],
+    "Relaciones Interpersonales": [
+        "Disruptivo", "Condicionado", "Funcional", "Constructivo", "Transformador",
+    ],
+}
+
+SEDES_BASE = ["Mosquera", "Niza", "Tunja"]
+
+# Filas por estudiante (áreas x periodos, aproximado)
+FILAS_POR_ESTUDIANTE = 6
+
+
+def n_sedes_para(n_filas):
+    # ~20 mil filas por sede, al menos las tres reales
+    return int(np.clip(n_filas // 20_000, len(SEDES_BASE), 500))
+
+
+def nombres_sedes(n_sedes):
+    extra = [f"Sede {i:03d}" for i in range(len(SEDES_BASE), n_sedes)]
+    return SEDES_BASE[:n_sedes] + extra
+
+
+def generate_resultados(n_filas, fuente, seed=0, pais="Colombia"):
+    rng = np.random.default_rng(seed)
+    areas = AREAS[fuente]
+    sedes = nombres_sedes(n_sedes_para(n_filas))
+
+    # Atributos fijos por estudiante
+    n_est = max(n_filas // FILAS_POR_ESTUDIANTE, 1)
+    est_sede = rng.integers(0, len(sedes), n_est)
+    est_grado = rng.integers(0, len(GRADOS), n_est)
+    est_sexo = rng.choice(3, n_est, p=[0.45, 0.45, 0.10])
+    est_habilidad = rng.normal(0.0, 80.0, n_est)
+
+    est = rng.integers(0, n_est, n_filas)
+    area = rng.integers(0, len(areas), n_filas)
+    ano = rng.choice(len(ANOS), n_filas, p=[0.25, 0.20, 0.55])
+
+    medida = (
+        420.0
+        + 15.0 * est_grado[est]
+        + est_habilidad[est]
+        + rng.normal(0.0, 60.0, n_filas)
+    )
+    medida[rng.random(n_filas) < 0.01] = np.nan
+
+    # Nivel por cuantiles aproximados de la medida, según la escala del área
+    nivel = np.empty(n_filas, dtype=object)
+    for i, cod in enumerate(areas):
+        en_area = area == i
+        escala = NIVELES[cod]
+        cortes = np.linspace(380.0, 620.0, len(escala) - 1)
+        codigos = np.searchsorted(cortes, np.nan_to_num(medida[en_area], nan=0.0))
+        nivel[en_area] = np.asarray(escala, dtype=object)[codigos]
+
+    # Correos construidos con pyarrow (sin un str de Python por fila)
+    correos = pc.binary_join_element_wise(
+        "est", pc.cast(pa.array(est), pa.string()), "@colegios.edu.co", ""
+    )
+
+    return pd.DataFrame({
+        "COD_AREA": pd.Categorical.from_codes(area, areas).astype(str),
+        "CORREO": pd.Series(correos.to_pandas(types_mapper=pd.ArrowDtype)).astype("str"),
+        "PAIS": pais,
+        "SEDE": pd.Categorical.from_codes(est_sede[est], sedes).astype(str),
+        "ANHO": pd.Categorical.from_codes(ano, ANOS).astype(str),
+        "GRADO": pd.Categorical.from_codes(est_grado[est], GRADOS).astype(str),
+        "SEXO": pd.Categorical.from_codes(est_sexo[est], ["F", "M", "."]).astype(str),
+        "MEDIDA_500": medida,
+        "NIVEL_LOGRO_4": nivel,
+    })
+
+
+def generate_libros(n_filas, seed=0):
+    # Reparto como en los datos reales: ~80 % cognitivas, ~20 % HSE
+    n_hse = max(n_filas // 5, 1)
+    return [
+        ("Cognitivas", generate_resultados(n_filas - n_hse, "Cognitivas", seed)),
+        ("HSE", generate_resultados(n_hse, "HSE", seed + 1)),
+    ]
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+import cubo
+from ingesta import SIN_ESTUDIANTE
+
+# ---------------------------------------------------
+# Trayectorias de estudiantes entre periodos
+# ---------------------------------------------------
+# Un tránsito une dos evaluaciones consecutivas del mismo estudiante en la
+# misma fuente, país y área. Se arman una sola vez al cargar (un lexsort
+# por estudiante y periodo) y quedan como una tabla con las columnas de
+# filtro del DESTINO (ANHO, SEDE, GRADO_LABEL: dónde está el estudiante
+# ahora) y el nivel / medida / periodo / grado de ORIGEN. Con un
+# filtros.IndiceFiltros encima, cualquier combinación de filtros es una
+# intersección de posiciones, sin cruzar el historial en cada consulta.
+# Si un estudiante tiene varias filas en el mismo periodo y área, cuenta la
+# última del libro.
+COLUMNAS_DESTINO = [
+    "FUENTE", "PAIS", "ANHO", "SEDE", "COD_AREA", "GRADO_LABEL", "NIVEL_CANON", "MEDIDA_500",
+    "ID_ESTUDIANTE",
+]
+COLUMNAS_ORIGEN = {
+    "ANHO": "ANHO_ORIGEN",
+    "GRADO_LABEL": "GRADO_ORIGEN",
+    "NIVEL_CANON": "NIVEL_ORIGEN",
+    "MEDIDA_500": "MEDIDA_ORIGEN",
+}
+CLAVE_ESTUDIANTE = ["PAIS", "FUENTE", "COD_AREA"]
+
+COLUMNAS_CRECIMIENTO = [
+    "ANHO_ORIGEN", "ANHO", "GRADO_ORIGEN", "GRADO_LABEL", "n",
+    "media_origen", "media_destino", "crecimiento", "ic_inf", "ic_sup",
+]
+
+
+def build_transitos(df):
+    ids = df["ID_ESTUDIANTE"].to_numpy()
+    con_id = np.flatnonzero(ids != SIN_ESTUDIANTE)
+    claves = [df[col].cat.codes.to_numpy()[con_id] for col in CLAVE_ESTUDIANTE]
+    # ANHO ("2023 - 2", "2024 - 1", ...) ordena cronológicamente
+    periodo = df["ANHO"].cat.codes.to_numpy()[con_id]
+    ids = ids[con_id]
+
+    # Orden estable: dentro del mismo periodo se conserva el orden del libro
+    orden = np.lexsort((periodo, ids, *reversed(claves)))
+    filas, ids, periodo = con_id[orden], ids[orden], periodo[orden]
+    claves = [c[orden] for c in claves]
+
+    mismo = ids[1:] == ids[:-1]
+    for c in claves:
+        mismo &= c[1:] == c[:-1]
+
+    # Una observación por estudiante y periodo (la última)
+    ultima = np.ones(len(filas), dtype=bool)
+    ultima[:-1] = ~(mismo & (periodo[1:] == periodo[:-1]))
+    filas, mismo = filas[ultima], np.append(mismo, False)[ultima][:-1]
+
+    origen, destino = filas[:-1][mismo], filas[1:][mismo]
+    transitos = df[COLUMNAS_DESTINO].take(destino).reset_index(drop=True)
+    for col, col_origen in COLUMNAS_ORIGEN.items():
+        transitos[col_origen] = df[col].take(origen).reset_index(drop=True)
+    return transitos
+
+
+# ---------------------------------------------------
+# Roll-ups de un subconjunto de tránsitos
+# ---------------------------------------------------
+def matriz_transiciones(sel):
+    # Conteo nivel de origen x nivel de destino (un solo bincount). Los
+    # niveles se ordenan por la media de MEDIDA_500 de quienes están en
+    # ellos, así sirve igual para escalas cognitivas y HSE.
+    niveles = sel["NIVEL_CANON"].cat.categories
+    origen = sel["NIVEL_ORIGEN"].astype(sel["NIVEL_CANON"].dtype).cat.codes.to_numpy("int64")
+    destino = sel["NIVEL_CANON"].cat.codes.to_numpy("int64")
+    validos = (origen >= 0) & (destino >= 0)
+    origen, destino = origen[validos], destino[validos]
+    n = len(niveles)
+    conteo = np.bincount(origen * n + destino, minlength=n * n).reshape(n, n)
+
+    codigos = np.concatenate([origen, destino])
+    medidas = np.concatenate([
+        sel["MEDIDA_ORIGEN"].to_numpy(dtype="float64")[validos],
+        sel["MEDIDA_500"].to_numpy(dtype="float64")[validos],
+    ])
+    con_medida = ~np.isnan(medidas)
+    suma = np.bincount(codigos[con_medida], weights=medidas[con_medida], minlength=n)
+    cuenta = np.bincount(codigos[con_medida], minlength=n)
+    presentes = np.flatnonzero((conteo.sum(axis=0) + conteo.sum(axis=1)) > 0)
+    media = np.where(cuenta > 0, suma / np.maximum(cuenta, 1), np.inf)
+    orden = presentes[np.argsort(media[presentes], kind="stable")]
+
+    conteo = conteo[np.ix_(orden, orden)]
+    niveles_order = niveles[orden].tolist()
+    por_origen = conteo.sum(axis=1, keepdims=True)
+    tabla = pd.DataFrame({
+        "NIVEL_ORIGEN": np.repeat(niveles_order, len(orden)),
+        "NIVEL_DESTINO": np.tile(niveles_order, len(orden)),
+        "conteo": conteo.ravel(),
+        "proporcion": np.divide(
+            conteo, por_origen, out=np.zeros(conteo.shape), where=por_origen > 0
+        ).ravel(),
+    })
+
+    # Sube / se mantiene / baja según la posición en ese orden
+    posicion = np.arange(len(orden))
+    cambio = np.sign(posicion[None, :] - posicion[:, None])
+    resumen = {
+        "suben": int(conteo[cambio > 0].sum()),
+        "se_mantienen": int(conteo[cambio == 0].sum()),
+        "bajan": int(conteo[cambio < 0].sum()),
+    }
+    return tabla, niveles_order, resumen
+
+
+def crecimiento(sel):
+    # Cambio medio de MEDIDA_500 por par de periodos y grados, con IC 95 %
+    origen = sel["MEDIDA_ORIGEN"].to_numpy(dtype="float64")
+    destino = sel["MEDIDA_500"].to_numpy(dtype="float64")
+    validos = ~(np.isnan(origen) | np.isnan(destino))
+    if not validos.any():
+        return pd.DataFrame(columns=COLUMNAS_CRECIMIENTO)
+
+    claves = ["ANHO_ORIGEN", "ANHO", "GRADO_ORIGEN", "GRADO_LABEL"]
+    grupos = (
+        sel.loc[validos, claves]
+        .assign(_origen=origen[validos], _destino=destino[validos])
+        .assign(_delta=lambda d: d["_destino"] - d["_origen"])
+        .groupby(claves, observed=True, sort=True)
+    )
+    tabla = grupos.agg(
+        n=("_delta", "size"),
+        media_origen=("_origen", "mean"),
+        media_destino=("_destino", "mean"),
+        crecimiento=("_delta", "mean"),
+        desviacion=("_delta", "std"),
+    ).reset_index()
+
+    error = tabla["desviacion"] / np.sqrt(tabla["n"])
+    tabla["ic_inf"] = tabla["crecimiento"] - cubo.Z_95 * error
+    tabla["ic_sup"] = tabla["crecimiento"] + cubo.Z_95 * error
+    return tabla[COLUMNAS_CRECIMIENTO]
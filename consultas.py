@@ -0,0 +1,348 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import cohortes
+import cubo
+import cuantiles
+import ingesta
+
+# ---------------------------------------------------
+# Capa de consultas (sin Streamlit)
+# ---------------------------------------------------
+# Todo lo que el tablero calcula para una combinación de filtros: opciones
+# de cada filtro, filas seleccionadas y tablas de resultados. La usan el
+# tablero, los reportes y el benchmark. Un filtro en None = sin filtrar
+# ("Todos" / "Todas" en la interfaz).
+
+# Orden fijo de niveles cognitivos, escritos como en los libros
+NIVELES_COGNITIVOS = ["Inicio", "Básico", "Satisfactorio", "Avanzado"]
+
+COLUMNAS_RANKING = [
+    "posicion", "SEDE", "registros", "estudiantes", "media", "desviacion",
+    "n_F", "n_M", "media_F", "media_M", "brecha", "ic_inf", "ic_sup",
+]
+
+COLUMNAS_NIVELES_GRADO = [
+    "GRADO_LABEL", "NIVEL_LOGRO_4", "conteo", "n_grado", "proporcion", "porcentaje",
+]
+
+
+@dataclass
+class Consulta:
+    fuente: str
+    kpis: dict
+    # Media de MEDIDA_500 por grado y sexo (F/M)
+    sexo: pd.DataFrame
+    # Conteo / proporción por nivel, en el orden de `niveles_order`
+    niveles: pd.DataFrame
+    niveles_order: list
+    # Solo Cognitivas: proporción por grado y nivel
+    niveles_grado: pd.DataFrame | None = None
+    # Brecha F − M de la media por grado con IC 95 % (cubo.brechas_por_sexo)
+    brecha_sexo: pd.DataFrame | None = None
+    # Histograma de MEDIDA_500 por grado y sexo y puntos de corte de los
+    # niveles por área y grado (distribucion_medida)
+    distribucion: pd.DataFrame | None = None
+    cortes_nivel: pd.DataFrame | None = None
+
+
+@dataclass
+class Cohorte:
+    # Tránsitos (mismo estudiante, evaluación anterior en la misma área)
+    # que llegan a la selección: conteos de estudiantes y de cambio de nivel
+    kpis: dict
+    # Conteo / proporción nivel de origen x nivel actual
+    matriz: pd.DataFrame
+    niveles_order: list
+    # Cambio medio de MEDIDA_500 por par de periodos y grados
+    crecimiento: pd.DataFrame
+
+
+@dataclass
+class ComparacionSedes:
+    # Una fila por sede, ordenadas por media de MEDIDA_500 (posicion 1 = la
+    # más alta): registros, estudiantes, media, desviación y brecha F − M
+    # con IC 95 %
+    ranking: pd.DataFrame
+    # Conteo / proporción por sede y nivel, en el orden de `niveles_order`
+    niveles: pd.DataFrame
+    niveles_order: list
+
+
+@dataclass
+class Vista:
+    # Lo que un rerun de una vista del tablero muestra para los filtros
+    # elegidos: las filas (tabla de detalle) y, si hay filas, los agregados
+    # más la comparación entre sedes o las trayectorias
+    filas: np.ndarray
+    resultado: Consulta | None = None
+    comparacion: ComparacionSedes | None = None
+    cohorte: Cohorte | None = None
+
+
+# ---------------------------------------------------
+# Filtros sobre el índice de filas
+# ---------------------------------------------------
+def seleccion(fuente, ano=None, sede=None, area=None, grado=None):
+    # {columna: valor} con solo los filtros activos
+    filtros_activos = {"FUENTE": fuente}
+    for col, valor in (("ANHO", ano), ("SEDE", sede), ("COD_AREA", area), ("GRADO_LABEL", grado)):
+        if valor is not None:
+            filtros_activos[col] = valor
+    return filtros_activos
+
+
+def opciones(mapa, fuente):
+    # Valores de año, sede y área presentes en la fuente
+    # (filtros.MapaOpciones, armado al cargar)
+    return mapa.opciones(fuente)
+
+
+def grados(mapa, fuente, ano=None, sede=None, area=None):
+    # Grados presentes con los demás filtros, en orden de grado
+    return mapa.grados(fuente, ano, sede, area)
+
+
+def filas(indice, fuente, ano=None, sede=None, area=None, grado=None):
+    return indice.filas(seleccion(fuente, ano, sede, area, grado))
+
+
+# ---------------------------------------------------
+# Tablas de resultados (roll-ups del cubo)
+# ---------------------------------------------------
+def tabla_medida_por_sexo(sel):
+    resumen = cubo.medias_por_sexo(sel)
+    resumen["Sexo"] = resumen["SEXO"].map({"F": "Femenino", "M": "Masculino"})
+    return resumen
+
+
+def _tabla_niveles(counts, niveles_order):
+    # Conteo por nivel respetando el orden deseado
+    counts = counts.reindex(niveles_order, fill_value=0)
+    total = counts.sum()
+
+    niveles = pd.DataFrame({"NIVEL_LOGRO_4": niveles_order, "conteo": counts.values})
+    if total > 0:
+        niveles["proporcion"] = niveles["conteo"] / total
+    else:
+        niveles["proporcion"] = 0.0
+    niveles["porcentaje"] = niveles["proporcion"] * 100
+    return niveles
+
+
+def tablas_niveles_cognitivos(sel, niveles_order, grado_categories):
+    # Dona y proporciones por grado desde una sola matriz grado x nivel
+    conteo, grados, niveles = cubo.matriz_grado_nivel(sel)
+
+    # Columnas en el orden fijo de niveles (un nivel sin datos queda en 0)
+    posiciones = niveles.get_indexer(niveles_order)
+    por_nivel = np.zeros((conteo.shape[0], len(niveles_order)), dtype="int64")
+    por_nivel[:, posiciones >= 0] = conteo[:, posiciones[posiciones >= 0]]
+
+    # Dona: todas las filas, con o sin grado
+    niveles_tabla = _tabla_niveles(
+        pd.Series(por_nivel.sum(axis=0), index=niveles_order), niveles_order
+    )
+
+    # Por grado: sin la fila "sin grado"; el total del grado incluye todos
+    # sus niveles (también los que no están en el orden fijo)
+    if conteo[:-1, :-1].sum() == 0:
+        return niveles_tabla, pd.DataFrame(columns=COLUMNAS_NIVELES_GRADO)
+
+    n_grado = conteo[:-1].sum(axis=1)
+    presentes = [i for i, g in enumerate(grados) if n_grado[i] > 0]
+    orden = {g: k for k, g in enumerate(grado_categories)}
+    presentes.sort(key=lambda i: orden.get(grados[i], len(orden)))
+
+    tabla_ng = pd.DataFrame({
+        "GRADO_LABEL": np.repeat(np.asarray(grados[presentes], dtype=object), len(niveles_order)),
+        "NIVEL_LOGRO_4": np.tile(np.asarray(niveles_order, dtype=object), len(presentes)),
+        "conteo": por_nivel[presentes].ravel().astype("float64"),
+        "n_grado": np.repeat(n_grado[presentes], len(niveles_order)),
+    })
+
+    # Proporción y porcentaje
+    tabla_ng["proporcion"] = np.where(
+        tabla_ng["n_grado"] > 0,
+        tabla_ng["conteo"] / tabla_ng["n_grado"],
+        0.0,
+    )
+    tabla_ng["porcentaje"] = tabla_ng["proporcion"] * 100
+
+    return niveles_tabla, tabla_ng
+
+
+# Bins del histograma de distribucion_medida: a lo sumo grados x 2 sexos x
+# TRAMOS_DISTRIBUCION filas, sin importar cuántos estudiantes haya
+TRAMOS_DISTRIBUCION = 30
+
+
+def distribucion_medida(sel):
+    # Histograma por grado y sexo (F/M) desde los bins del cubo; cada bin
+    # lleva su proporción dentro del grado y sexo y la densidad (proporción
+    # por punto de MEDIDA_500), para comparar F y M. Los cortes de nivel son
+    # por área: los umbrales de una no valen para otra.
+    sel_sexo = sel[sel["SEXO"].isin(["F", "M"]).to_numpy()]
+    tabla = cubo.histogramas(sel_sexo, ["GRADO_LABEL", "SEXO"], max_bins=TRAMOS_DISTRIBUCION)
+    tabla["Sexo"] = tabla["SEXO"].map({"F": "Femenino", "M": "Masculino"})
+    total = tabla.groupby(["GRADO_LABEL", "SEXO"], observed=True)["conteo"].transform("sum")
+    tabla["proporcion"] = (tabla["conteo"] / total).astype("float64")
+    tabla["densidad"] = tabla["proporcion"] / (tabla["hasta"] - tabla["desde"])
+    return tabla, cubo.cortes_por_nivel(sel, ["COD_AREA", "GRADO_LABEL"])
+
+
+def niveles_hse(sel, area):
+    # Los niveles ya vienen canonizados desde la carga (NIVEL_CANON)
+    area_norm = ingesta.norm_texto(area)
+    if area_norm in ingesta.ESCALAS_HSE:
+        return cubo.conteos_por_nivel(sel, "NIVEL_CANON"), ingesta.ESCALAS_HSE[area_norm]
+    # fallback si llegara otra prueba
+    counts = cubo.conteos_por_nivel(sel)
+    return counts, sorted(counts.index.tolist())
+
+
+# ---------------------------------------------------
+# Consulta completa de una combinación de filtros
+# ---------------------------------------------------
+def query(
+    celdas, fuente, ano=None, sede=None, area=None, grado=None, tabla_cuantiles=None, pais=None,
+):
+    filtros_activos = dict(ano=ano, sede=sede, area=area, grado=grado, pais=pais)
+    sel = cubo.select_celdas(celdas, fuente, **filtros_activos)
+    sel_cuantiles = None
+    if tabla_cuantiles is not None:
+        # La tabla de cuantiles tiene las mismas dimensiones de filtro
+        sel_cuantiles = cubo.select_celdas(tabla_cuantiles, fuente, **filtros_activos)
+    return resumen(sel, fuente, area, celdas["GRADO_LABEL"].cat.categories.tolist(), sel_cuantiles)
+
+
+def resumen(sel, fuente, area, grado_categories, sel_cuantiles=None):
+    # Tablas de resultados de celdas ya seleccionadas (query() o, en los
+    # reportes, cada grupo de un único groupby sobre el cubo). Con
+    # `sel_cuantiles` los KPIs suman mediana y percentiles de MEDIDA_500.
+    kpis = cubo.kpis(sel)
+    if sel_cuantiles is not None:
+        kpis.update(cuantiles.percentiles(sel_cuantiles))
+    sexo = tabla_medida_por_sexo(sel)
+    brecha_sexo = cubo.brechas_por_sexo(sel)
+    distribucion, cortes_nivel = distribucion_medida(sel)
+
+    if fuente == "HSE":
+        counts, niveles_order = niveles_hse(sel, area)
+        return Consulta(
+            fuente, kpis, sexo, _tabla_niveles(counts, niveles_order), niveles_order,
+            brecha_sexo=brecha_sexo, distribucion=distribucion, cortes_nivel=cortes_nivel,
+        )
+
+    niveles_order = NIVELES_COGNITIVOS
+    niveles, niveles_grado = tablas_niveles_cognitivos(sel, niveles_order, grado_categories)
+    return Consulta(
+        fuente, kpis, sexo, niveles, niveles_order, niveles_grado, brecha_sexo,
+        distribucion, cortes_nivel,
+    )
+
+
+# ---------------------------------------------------
+# Trayectorias (índice de tránsitos, ver cohortes.py)
+# ---------------------------------------------------
+def cohorte(indice_transitos, fuente, ano=None, sede=None, area=None, grado=None):
+    # Los filtros se aplican al periodo / sede / grado actuales (destino)
+    sel = indice_transitos.df.take(filas(indice_transitos, fuente, ano, sede, area, grado))
+    matriz, niveles_order, cambios = cohortes.matriz_transiciones(sel)
+    kpis = {
+        "transitos": len(sel),
+        "estudiantes": int(pd.unique(sel["ID_ESTUDIANTE"].to_numpy()).size),
+        **cambios,
+    }
+    return Cohorte(kpis, matriz, niveles_order, cohortes.crecimiento(sel))
+
+
+# ---------------------------------------------------
+# Comparación entre sedes (un solo pase sobre el cubo)
+# ---------------------------------------------------
+def comparar_sedes(celdas, fuente, ano=None, area=None, grado=None, pais=None):
+    # Todas las sedes con el mismo año / área / grado: un arreglo
+    # sede x sexo x nivel (cubo.momentos_por_sede) del que salen el ranking
+    # y la distribución de niveles, sin una consulta por sede
+    sel = cubo.select_celdas(celdas, fuente, ano=ano, area=area, grado=grado, pais=pais)
+    col, niveles_order = "NIVEL_LOGRO_4", NIVELES_COGNITIVOS
+    if fuente == "HSE":
+        area_norm = ingesta.norm_texto(area)
+        if area_norm in ingesta.ESCALAS_HSE:
+            col, niveles_order = "NIVEL_CANON", ingesta.ESCALAS_HSE[area_norm]
+        else:
+            # fallback si llegara otra prueba
+            niveles_order = sorted(cubo.conteos_por_nivel(sel).index.tolist())
+
+    momentos, sedes, niveles = cubo.momentos_por_sede(sel, col)
+    estudiantes = cubo.estudiantes_por_sede(sel)
+    por_sede = {m: v.sum(axis=(1, 2)) for m, v in momentos.items()}
+    presentes = np.flatnonzero(por_sede["n_filas"] > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n, suma, suma_cuad = (por_sede[m] for m in ("n", "suma", "suma_cuad"))
+        media = np.where(n > 0, suma / n, np.nan)
+        desviacion = np.sqrt(np.where(
+            n > 1, np.maximum((suma_cuad - suma * suma / n) / (n - 1), 0.0), np.nan
+        ))
+    por_sexo = {m: momentos[m][:, :2].sum(axis=2) for m in ("n", "suma", "suma_cuad")}
+    media_sexo, brecha, error = cubo._welch(por_sexo["n"], por_sexo["suma"], por_sexo["suma_cuad"])
+
+    ranking = pd.DataFrame({
+        "SEDE": np.asarray(sedes, dtype=object),
+        "registros": por_sede["n_filas"].astype("int64"),
+        "estudiantes": estudiantes,
+        "media": media,
+        "desviacion": desviacion,
+        "n_F": por_sexo["n"][:, 0].astype("int64"),
+        "n_M": por_sexo["n"][:, 1].astype("int64"),
+        "media_F": media_sexo[:, 0],
+        "media_M": media_sexo[:, 1],
+        "brecha": brecha,
+        "ic_inf": brecha - cubo.Z_95 * error,
+        "ic_sup": brecha + cubo.Z_95 * error,
+    }).iloc[presentes]
+    ranking = ranking.sort_values(["media", "SEDE"], ascending=[False, True], na_position="last")
+    ranking.insert(0, "posicion", np.arange(1, len(ranking) + 1))
+    ranking = ranking.reset_index(drop=True)[COLUMNAS_RANKING]
+
+    # Niveles de cada sede en el orden fijo; la proporción es sobre todos
+    # los registros de la sede (los sin nivel también cuentan)
+    posiciones = niveles.get_indexer(niveles_order)
+    conteo = np.zeros((len(sedes), len(niveles_order)))
+    conteo[:, posiciones >= 0] = momentos["n_filas"].sum(axis=1)[:, posiciones[posiciones >= 0]]
+    orden = sedes.get_indexer(ranking["SEDE"])
+    conteo = conteo[orden]
+    total = por_sede["n_filas"][orden][:, None]
+    tabla_niveles = pd.DataFrame({
+        "posicion": np.repeat(ranking["posicion"].to_numpy(), len(niveles_order)),
+        "SEDE": np.repeat(ranking["SEDE"].to_numpy(), len(niveles_order)),
+        "NIVEL_LOGRO_4": np.tile(np.asarray(niveles_order, dtype=object), len(orden)),
+        "conteo": conteo.ravel().astype("int64"),
+        "proporcion": np.divide(conteo, total, out=np.zeros(conteo.shape), where=total > 0).ravel(),
+    })
+    tabla_niveles["porcentaje"] = tabla_niveles["proporcion"] * 100
+    return ComparacionSedes(ranking, tabla_niveles, list(niveles_order))
+
+
+# ---------------------------------------------------
+# Un rerun de una vista (show_tab_for_fuente)
+# ---------------------------------------------------
+def vista(indice, fuente, ano, sede, area, grado, comparar, agregados, comparacion, trayectorias):
+    # `agregados(fuente, ano, sede, area, grado)`, `comparacion(fuente, ano,
+    # area, grado)` y `trayectorias(fuente, ano, sede, area, grado)`:
+    # query / comparar_sedes / cohorte ya atadas a los datos y memoizadas
+    # por quien llama (el tablero y bench/bench_concurrencia.py, con
+    # st.cache_data). Comparando sedes no se filtra por sede.
+    if comparar:
+        sede = None
+    filas_f = filas(indice, fuente, ano, sede, area, grado)
+    if len(filas_f) == 0:
+        return Vista(filas_f)
+
+    resultado = agregados(fuente, ano, sede, area, grado)
+    if comparar:
+        return Vista(filas_f, resultado, comparacion=comparacion(fuente, ano, area, grado))
+    return Vista(filas_f, resultado, cohorte=trayectorias(fuente, ano, sede, area, grado))
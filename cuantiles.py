@@ -0,0 +1,108 @@
+import numpy as np
+
+from ingesta import concat_resultados
+
+# ---------------------------------------------------
+# Resúmenes de cuantiles combinables (estilo t-digest)
+# ---------------------------------------------------
+# Por cada partición de filtros (fuente, país, año, sede, área, grado) se
+# guarda la distribución de MEDIDA_500 como a lo sumo ~DELTA/2 centroides
+# (media, peso), ordenados por media. Los centroides son más finos en las colas
+# (escala k1 de t-digest), así que P10/P90 salen tan bien como la mediana.
+# Cualquier combinación de filtros es una unión de particiones: se juntan
+# sus centroides y se interpolan los cuantiles, sin volver a las filas.
+# Una partición con hasta UMBRAL_EXACTO valores no se comprime: guarda los
+# valores tal cual (peso 1) y, si todas las seleccionadas son así, los
+# percentiles coinciden con np.percentile (interpolación lineal). Solo las
+# particiones grandes pasan a centroides; ahí el error medido sobre
+# bench/sinteticos.py llega a ~3.6 puntos en P10/P90 de una sede y grado
+# (tests/test_cuantiles.py exige menos de 5).
+PARTICION = ["FUENTE", "PAIS", "ANHO", "SEDE", "COD_AREA", "GRADO_LABEL"]
+
+DELTA = 128
+UMBRAL_EXACTO = 4 * DELTA
+
+PERCENTILES = {"p10": 0.10, "p25": 0.25, "mediana": 0.50, "p75": 0.75, "p90": 0.90}
+
+
+def _comprimir(grupo, medias, pesos, delta=DELTA):
+    # `grupo` ordenado y, dentro de cada grupo, `medias` ordenadas. Cada
+    # centroide cae en un tramo de la escala k1 según su cuantil (punto
+    # medio); los del mismo grupo y tramo se funden en uno. Los grupos de
+    # hasta UMBRAL_EXACTO de peso quedan sin tocar (solo tienen valores).
+    if len(grupo) == 0:
+        return grupo, medias, pesos
+    total = np.bincount(grupo, weights=pesos)
+    acumulado = np.cumsum(pesos)
+    inicio = np.searchsorted(grupo, np.arange(len(total)))
+    antes = np.where(inicio > 0, acumulado[np.maximum(inicio - 1, 0)], 0.0)
+    q = (acumulado - pesos / 2 - antes[grupo]) / total[grupo]
+
+    tramo = np.floor(delta / (2 * np.pi) * (np.arcsin(2 * q - 1) + np.pi / 2))
+    nuevo = np.ones(len(grupo), dtype=bool)
+    nuevo[1:] = (grupo[1:] != grupo[:-1]) | (tramo[1:] != tramo[:-1])
+    nuevo |= total[grupo] <= UMBRAL_EXACTO
+    cortes = np.flatnonzero(nuevo)
+
+    peso = np.add.reduceat(pesos, cortes)
+    media = np.add.reduceat(pesos * medias, cortes) / peso
+    return grupo[cortes], media, peso
+
+
+def _por_grupo(grupo, medias, pesos, n_grupos):
+    cortes = np.searchsorted(grupo, np.arange(1, n_grupos))
+    return np.split(medias, cortes), np.split(pesos, cortes)
+
+
+def build_cuantiles(df):
+    medida = df["MEDIDA_500"].to_numpy(dtype="float64")
+    valido = ~np.isnan(medida)
+
+    grupos = df.loc[valido, PARTICION].groupby(PARTICION, observed=True, dropna=False, sort=True)
+    particiones = grupos.size().reset_index()[PARTICION]
+    grupo = grupos.ngroup().to_numpy()
+    medida = medida[valido]
+
+    orden = np.lexsort((medida, grupo))
+    grupo, medias, pesos = _comprimir(grupo[orden], medida[orden], np.ones(len(orden)))
+    particiones["medias"], particiones["pesos"] = _por_grupo(grupo, medias, pesos, len(particiones))
+    return particiones
+
+
+def merge_cuantiles(partes):
+    # Misma partición en varios libros -> se juntan y recomprimen
+    if len(partes) == 1:
+        return partes[0]
+    todas = concat_resultados(partes)
+    grupos = todas.groupby(PARTICION, observed=True, dropna=False, sort=True)
+    particiones = grupos.size().reset_index()[PARTICION]
+
+    largos = todas["medias"].map(len).to_numpy()
+    grupo = np.repeat(grupos.ngroup().to_numpy(), largos)
+    medias = np.concatenate(todas["medias"].tolist())
+    pesos = np.concatenate(todas["pesos"].tolist())
+
+    orden = np.lexsort((medias, grupo))
+    grupo, medias, pesos = _comprimir(grupo[orden], medias[orden], pesos[orden])
+    particiones["medias"], particiones["pesos"] = _por_grupo(grupo, medias, pesos, len(particiones))
+    return particiones
+
+
+def percentiles(sel):
+    # {nombre: valor} de PERCENTILES sobre la unión de las particiones
+    # seleccionadas (cubo.select_celdas sirve igual para esta tabla)
+    if sel.empty:
+        return {nombre: np.nan for nombre in PERCENTILES}
+    medias = np.concatenate(sel["medias"].tolist())
+    pesos = np.concatenate(sel["pesos"].tolist())
+    orden = np.argsort(medias, kind="stable")
+    medias, pesos = medias[orden], pesos[orden]
+
+    # Cada centroide representa su peso centrado en su media. Con valores
+    # sueltos (peso 1) el centro del i-ésimo es i + 0.5 y la posición
+    # q * (n - 1) + 0.5 da la misma interpolación lineal que np.percentile.
+    centro = np.cumsum(pesos) - pesos / 2
+    total = pesos.sum()
+    posiciones = [q * (total - 1) + 0.5 for q in PERCENTILES.values()]
+    valores = np.interp(posiciones, centro, medias)
+    return dict(zip(PERCENTILES, valores.tolist()))
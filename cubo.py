@@ -0,0 +1,405 @@
+import numpy as np
+import pandas as pd
+
+from ingesta import SIN_ESTUDIANTE, concat_resultados
+
+# ---------------------------------------------------
+# Cubo de agregados pre-calculados
+# ---------------------------------------------------
+# Una celda por combinación observada de las dimensiones de filtro. Cada
+# celda guarda conteo de filas, conteo/suma/suma de cuadrados de MEDIDA_500
+# y un boceto de sus estudiantes para contar únicos (ver más abajo). El
+# nivel de logro es una
+# dimensión más, así que los conteos por nivel son el n_filas de la celda.
+# NIVEL_CANON depende solo de NIVEL_LOGRO_4: no agrega celdas.
+# Para la distribución de MEDIDA_500 cada celda guarda además su
+# histograma en tramos fijos de BIN_ANCHO puntos (solo el tramo de bins
+# desde el primero hasta el último con datos: `hist_desde` + `histograma`)
+# y su mínimo, del que salen los puntos de corte entre niveles.
+DIMENSIONES = [
+    "FUENTE", "PAIS", "ANHO", "SEDE", "COD_AREA", "GRADO_LABEL", "SEXO", "NIVEL_LOGRO_4",
+    "NIVEL_CANON",
+]
+
+# Estudiantes únicos con un boceto KMV (k valores mínimos): ID_ESTUDIANTE
+# ya es un hash uniforme de 64 bits, así que cada celda guarda a lo sumo sus
+# ESTUDIANTES_K ID distintos más chicos, ordenados, sin importar cuántas
+# filas tenga. Los k mínimos de una unión salen de los k mínimos de cada
+# parte, así que los bocetos se unen entre libros y entre celdas. Al contar
+# una selección, theta = el menor k-ésimo ID de sus celdas llenas: los ID
+# por debajo de theta están todos, y el conteo es (distintos < theta) /
+# theta (ID llevados a [0, 1)), con error relativo típico 1 / sqrt(k)
+# (~3 %). Si ninguna celda llegó a ESTUDIANTES_K el conteo es exacto, que
+# es lo que pasa con celdas del tamaño de los datos reales.
+ESTUDIANTES_K = 1024
+
+# Bins de MEDIDA_500: [BIN_DESDE + i * BIN_ANCHO, ... + BIN_ANCHO); lo que
+# cae fuera del rango va al primer / último bin
+BIN_DESDE = -200.0
+BIN_ANCHO = 10.0
+N_BINS = 140
+
+
+def build_cubo(df):
+    medida = df["MEDIDA_500"].to_numpy(dtype="float64")
+    valido = ~np.isnan(medida)
+    medida_cero = np.where(valido, medida, 0.0)
+
+    grupos = (
+        df[DIMENSIONES]
+        .assign(_n=valido, _suma=medida_cero, _suma_cuad=medida_cero * medida_cero, _minimo=medida)
+        .groupby(DIMENSIONES, observed=True, dropna=False, sort=True)
+    )
+    celdas = grupos.agg(
+        n_filas=("_n", "size"),
+        n=("_n", "sum"),
+        suma=("_suma", "sum"),
+        suma_cuad=("_suma_cuad", "sum"),
+        minimo=("_minimo", "min"),
+    ).reset_index()
+
+    ids = df["ID_ESTUDIANTE"].to_numpy()
+    con_id = ids != SIN_ESTUDIANTE
+    celda = grupos.ngroup().to_numpy()
+    celdas["estudiantes"] = _estudiantes_por_celda(celda[con_id], ids[con_id], len(celdas))
+    celdas["hist_desde"], celdas["histograma"] = _histogramas(
+        celda[valido], bin_medida(medida[valido]), np.ones(int(valido.sum())), len(celdas)
+    )
+
+    return celdas
+
+
+def _distintos(grupo, ids):
+    # Pares (grupo, id) únicos, ordenados por grupo y por ID
+    orden = np.lexsort((ids, grupo))
+    grupo, ids = grupo[orden], ids[orden]
+    nuevo = np.ones(len(ids), dtype=bool)
+    nuevo[1:] = (grupo[1:] != grupo[:-1]) | (ids[1:] != ids[:-1])
+    return grupo[nuevo], ids[nuevo]
+
+
+def _estudiantes_por_celda(celda, ids, n_celdas):
+    # Boceto KMV de cada celda: sus ESTUDIANTES_K ID distintos más chicos
+    celda, ids = _distintos(celda, ids.astype("uint64"))
+    entran = np.arange(len(ids)) - np.searchsorted(celda, celda) < ESTUDIANTES_K
+    celda, ids = celda[entran], ids[entran]
+    cortes = np.searchsorted(celda, np.arange(1, n_celdas))
+    return np.split(ids, cortes)
+
+
+def contar_estudiantes(grupo, bocetos, n_grupos):
+    # Estudiantes únicos por grupo, uniendo los bocetos de sus celdas
+    # (`grupo`: el de cada celda, -1 = ninguno)
+    largos = np.array([len(b) for b in bocetos], dtype="int64")
+    if largos.sum() == 0:
+        return np.zeros(n_grupos, dtype="int64")
+    celda_grupo = np.asarray(grupo, dtype="int64")
+    grupo = np.repeat(celda_grupo, largos)
+    ids = np.concatenate(bocetos)
+    validos = grupo >= 0
+
+    # theta de cada grupo: el menor k-ésimo ID de sus celdas llenas (sin
+    # celdas llenas, todo entra y el conteo es exacto)
+    sin_tope = np.iinfo("uint64").max
+    theta = np.full(n_grupos, sin_tope, dtype="uint64")
+    llenas = np.flatnonzero((largos >= ESTUDIANTES_K) & (celda_grupo >= 0))
+    if len(llenas):
+        np.minimum.at(theta, celda_grupo[llenas], ids[np.cumsum(largos)[llenas] - 1])
+        validos[validos] &= ids[validos] < theta[grupo[validos]]
+
+    grupo, _ = _distintos(grupo[validos], ids[validos])
+    conteo = np.bincount(grupo, minlength=n_grupos).astype("float64")
+    topados = theta < sin_tope
+    conteo[topados] /= theta[topados].astype("float64") / 2.0**64
+    return np.rint(conteo).astype("int64")
+
+
+def bin_medida(medida):
+    return np.clip(np.floor((medida - BIN_DESDE) / BIN_ANCHO), 0, N_BINS - 1).astype("int64")
+
+
+def _histogramas(celda, bins, conteos, n_celdas):
+    # Conteos por (celda, bin) -> por celda, su primer bin con datos y los
+    # conteos desde ahí hasta el último (con los ceros intermedios)
+    claves, inversa = np.unique(celda * N_BINS + bins, return_inverse=True)
+    conteos = np.bincount(inversa, weights=conteos).astype("uint32")
+    celda, bins = np.divmod(claves, N_BINS)
+
+    posiciones = np.arange(n_celdas)
+    inicio = np.searchsorted(celda, posiciones)
+    fin = np.searchsorted(celda, posiciones, side="right")
+    con_datos = fin > inicio
+    desde = np.zeros(n_celdas, dtype="int64")
+    largos = np.zeros(n_celdas, dtype="int64")
+    desde[con_datos] = bins[inicio[con_datos]]
+    largos[con_datos] = bins[fin[con_datos] - 1] - desde[con_datos] + 1
+
+    cortes = np.cumsum(largos)
+    plano = np.zeros(cortes[-1] if n_celdas else 0, dtype="uint32")
+    plano[cortes[celda] - largos[celda] + bins - desde[celda]] = conteos
+    return desde.astype("int16"), np.split(plano, cortes[:-1])
+
+
+def _bins_planos(celdas):
+    # (posición de la celda, bin, conteo) de cada bin guardado
+    largos = celdas["histograma"].map(len).to_numpy()
+    if largos.sum() == 0:
+        vacio = np.empty(0, dtype="int64")
+        return vacio, vacio, vacio
+    posicion = np.repeat(np.arange(len(celdas)), largos)
+    inicio = np.cumsum(largos) - largos
+    bins = (
+        celdas["hist_desde"].to_numpy().astype("int64")[posicion]
+        + np.arange(largos.sum()) - inicio[posicion]
+    )
+    return posicion, bins, np.concatenate(celdas["histograma"].tolist()).astype("int64")
+
+
+def merge_cubos(partes):
+    # Cubos de varios libros -> uno solo: las sumas e histogramas se suman,
+    # los mínimos se comparan y los bocetos de estudiantes se unen celda a
+    # celda
+    if len(partes) == 1:
+        return partes[0]
+    todas = concat_resultados(partes)
+    grupos = todas.groupby(DIMENSIONES, observed=True, dropna=False, sort=True)
+    celdas = grupos.agg(
+        n_filas=("n_filas", "sum"),
+        n=("n", "sum"),
+        suma=("suma", "sum"),
+        suma_cuad=("suma_cuad", "sum"),
+        minimo=("minimo", "min"),
+    ).reset_index()
+    celda = grupos.ngroup().to_numpy()
+
+    largos = todas["estudiantes"].map(len).to_numpy()
+    ids = np.concatenate(todas["estudiantes"].tolist())
+    celdas["estudiantes"] = _estudiantes_por_celda(np.repeat(celda, largos), ids, len(celdas))
+
+    posicion, bins, conteos = _bins_planos(todas)
+    celdas["hist_desde"], celdas["histograma"] = _histogramas(
+        celda[posicion], bins, conteos, len(celdas)
+    )
+
+    return celdas
+
+
+def select_celdas(celdas, fuente, ano=None, sede=None, area=None, grado=None, pais=None):
+    mask = celdas["FUENTE"].to_numpy() == fuente
+    filtros_activos = (
+        ("PAIS", pais), ("ANHO", ano), ("SEDE", sede), ("COD_AREA", area), ("GRADO_LABEL", grado),
+    )
+    for col, valor in filtros_activos:
+        if valor is not None:
+            mask &= celdas[col].to_numpy() == valor
+    return celdas[mask]
+
+
+# ---------------------------------------------------
+# Roll-ups sobre las celdas seleccionadas
+# ---------------------------------------------------
+def _media_desv(n, suma, suma_cuad):
+    media = suma / n if n > 0 else np.nan
+    if n > 1:
+        var = max((suma_cuad - suma * suma / n) / (n - 1), 0.0)
+        desv = np.sqrt(var)
+    else:
+        desv = np.nan
+    return media, desv
+
+
+def kpis(sel):
+    n = sel["n"].sum()
+    media, desv = _media_desv(n, sel["suma"].sum(), sel["suma_cuad"].sum())
+    n_est = contar_estudiantes(np.zeros(len(sel), dtype="int64"), sel["estudiantes"].tolist(), 1)
+    return {
+        "registros": int(sel["n_filas"].sum()),
+        "estudiantes": int(n_est[0]),
+        "sedes": sel["SEDE"].dropna().nunique(),
+        "media": media,
+        "desviacion": desv,
+    }
+
+
+def momentos_por_sexo(sel):
+    # n / suma / suma de cuadrados por grado y sexo (F/M)
+    sel = sel[sel["SEXO"].isin(["F", "M"])]
+    resumen = sel.groupby(["GRADO_LABEL", "SEXO"], observed=True)[["n", "suma", "suma_cuad"]].sum()
+    return resumen[resumen.index.get_level_values("GRADO_LABEL").notna()]
+
+
+def medias_por_sexo(sel):
+    resumen = momentos_por_sexo(sel)
+    resumen["MEDIDA_500_MEDIA"] = resumen["suma"] / resumen["n"].where(resumen["n"] > 0)
+    return resumen[["MEDIDA_500_MEDIA"]].reset_index()
+
+
+# IC 95 % (aproximación normal)
+Z_95 = 1.96
+COLUMNAS_BRECHA = ["GRADO_LABEL", "n_F", "n_M", "media_F", "media_M", "brecha", "ic_inf", "ic_sup"]
+
+
+def brechas_por_sexo(sel):
+    # Brecha de la media F − M por grado con su IC 95 % (Welch: varianzas
+    # distintas), todo desde n / suma / suma de cuadrados del cubo
+    momentos = momentos_por_sexo(sel)
+    if momentos.empty:
+        return pd.DataFrame(columns=COLUMNAS_BRECHA)
+    por_sexo = momentos.unstack("SEXO")
+    n, suma, suma_cuad = (
+        por_sexo[m].reindex(columns=["F", "M"]).fillna(0).to_numpy(dtype="float64")
+        for m in ("n", "suma", "suma_cuad")
+    )
+    media, brecha, error = _welch(n, suma, suma_cuad)
+
+    return pd.DataFrame({
+        "GRADO_LABEL": por_sexo.index,
+        "n_F": n[:, 0].astype("int64"),
+        "n_M": n[:, 1].astype("int64"),
+        "media_F": media[:, 0],
+        "media_M": media[:, 1],
+        "brecha": brecha,
+        "ic_inf": brecha - Z_95 * error,
+        "ic_sup": brecha + Z_95 * error,
+    })
+
+
+def _welch(n, suma, suma_cuad):
+    # Columnas [F, M] -> medias, brecha F − M y su error estándar (Welch)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        media = np.where(n > 0, suma / n, np.nan)
+        var = np.where(n > 1, np.maximum((suma_cuad - suma * suma / n) / (n - 1), 0.0), np.nan)
+        error = np.sqrt(var[:, 0] / n[:, 0] + var[:, 1] / n[:, 1])
+    return media, media[:, 0] - media[:, 1], error
+
+
+def conteos_por_nivel(sel, col="NIVEL_LOGRO_4"):
+    # Conteo directo sobre los códigos de la categórica
+    niveles = sel[col].astype("category")
+    codigos = niveles.cat.codes.to_numpy()
+    validos = codigos >= 0
+    conteo = np.bincount(
+        codigos[validos],
+        weights=sel["n_filas"].to_numpy()[validos],
+        minlength=len(niveles.cat.categories),
+    ).astype("int64")
+    conteo = pd.Series(conteo, index=niveles.cat.categories.rename(col))
+    return conteo[conteo > 0]
+
+
+def matriz_grado_nivel(sel, col="NIVEL_LOGRO_4"):
+    # Conteos grado x nivel en un solo bincount sobre códigos combinados.
+    # La última fila / columna acumula las celdas sin grado / sin nivel, así
+    # que los totales por nivel y por grado salen de la misma matriz.
+    grados = sel["GRADO_LABEL"].cat
+    niveles = sel[col].cat
+    n_grados = len(grados.categories) + 1
+    n_niveles = len(niveles.categories) + 1
+
+    codigo_grado = grados.codes.to_numpy()
+    codigo_grado = np.where(codigo_grado < 0, n_grados - 1, codigo_grado).astype("int64")
+    codigo_nivel = niveles.codes.to_numpy()
+    codigo_nivel = np.where(codigo_nivel < 0, n_niveles - 1, codigo_nivel)
+
+    conteo = np.bincount(
+        codigo_grado * n_niveles + codigo_nivel,
+        weights=sel["n_filas"].to_numpy(),
+        minlength=n_grados * n_niveles,
+    ).astype("int64").reshape(n_grados, n_niveles)
+    return conteo, grados.categories, niveles.categories
+
+
+# ---------------------------------------------------
+# Comparación entre sedes: un solo pase sobre las celdas
+# ---------------------------------------------------
+MOMENTOS = ["n_filas", "n", "suma", "suma_cuad"]
+
+
+def momentos_por_sede(sel, col="NIVEL_LOGRO_4"):
+    # {momento: arreglo sede x sexo (F, M, otro) x nivel (+ sin nivel)} con
+    # un código combinado por celda: media, brecha por sexo y distribución
+    # de niveles de cada sede salen de sumar ejes, sin filtrar por sede
+    sedes = sel["SEDE"].cat
+    niveles = sel[col].cat
+    n_sedes, n_niveles = len(sedes.categories), len(niveles.categories) + 1
+
+    codigo_sede = sedes.codes.to_numpy().astype("int64")
+    con_sede = codigo_sede >= 0
+    posicion_sexo = sel["SEXO"].cat.categories.get_indexer(["F", "M"])
+    codigo_sexo = np.full(len(sel), 2, dtype="int64")
+    for i, posicion in enumerate(posicion_sexo):
+        if posicion >= 0:
+            codigo_sexo[sel["SEXO"].cat.codes.to_numpy() == posicion] = i
+    codigo_nivel = niveles.codes.to_numpy().astype("int64")
+    codigo_nivel = np.where(codigo_nivel < 0, n_niveles - 1, codigo_nivel)
+
+    codigo = ((codigo_sede * 3 + codigo_sexo) * n_niveles + codigo_nivel)[con_sede]
+    momentos = {
+        m: np.bincount(
+            codigo, weights=sel[m].to_numpy(dtype="float64")[con_sede], minlength=n_sedes * 3 * n_niveles
+        ).reshape(n_sedes, 3, n_niveles)
+        for m in MOMENTOS
+    }
+    return momentos, sedes.categories, niveles.categories
+
+
+def estudiantes_por_sede(sel):
+    # Estudiantes únicos de cada sede (categorías de SEDE), uniendo los
+    # bocetos de todas sus celdas de una vez
+    return contar_estudiantes(
+        sel["SEDE"].cat.codes.to_numpy(), sel["estudiantes"].tolist(), len(sel["SEDE"].cat.categories)
+    )
+
+
+# ---------------------------------------------------
+# Distribución de MEDIDA_500 (histogramas pre-calculados)
+# ---------------------------------------------------
+COLUMNAS_HISTOGRAMA = ["desde", "hasta", "conteo"]
+
+
+def histogramas(sel, por, max_bins=None):
+    # Conteo por grupo (columnas `por`) y bin, solo bins con datos: un
+    # bincount sobre los bins guardados en las celdas, sin volver a las filas.
+    # Con `max_bins`, el tramo ocupado (del primer al último bin con datos en
+    # cualquier grupo) se parte en a lo sumo tantos bins, juntando bins
+    # vecinos de BIN_ANCHO: la tabla queda acotada por grupos x max_bins.
+    grupos = sel.groupby(list(por), observed=True, sort=True)
+    claves = grupos.size().index.to_frame(index=False)
+    # Sin grupo (algún valor de `por` nulo) -> -1
+    grupo = grupos.ngroup().fillna(-1).to_numpy().astype("int64")
+    posicion, bins, conteos = _bins_planos(sel)
+    validos = grupo[posicion] >= 0
+    if not validos.any():
+        return pd.DataFrame(columns=[*por, *COLUMNAS_HISTOGRAMA])
+
+    total = np.bincount(
+        grupo[posicion][validos] * N_BINS + bins[validos],
+        weights=conteos[validos],
+        minlength=len(claves) * N_BINS,
+    ).reshape(len(claves), N_BINS)
+
+    ocupados = np.flatnonzero(total.any(axis=0))
+    primero, ultimo = ocupados[0], ocupados[-1]
+    juntar = 1 if max_bins is None else max(1, -(-(ultimo - primero + 1) // max_bins))
+    total = np.add.reduceat(total[:, primero:ultimo + 1], np.arange(0, ultimo - primero + 1, juntar), axis=1)
+
+    g, b = np.nonzero(total)
+    tabla = claves.iloc[g].reset_index(drop=True)
+    tabla["desde"] = BIN_DESDE + (primero + b * juntar) * BIN_ANCHO
+    tabla["hasta"] = tabla["desde"] + juntar * BIN_ANCHO
+    tabla["conteo"] = total[g, b].astype("int64")
+    return tabla
+
+
+def cortes_por_nivel(sel, por, col="NIVEL_CANON"):
+    # Punto de corte de cada nivel = su MEDIDA_500 mínima en la selección.
+    # Los niveles se ordenan por ese mínimo; el más bajo de cada grupo no
+    # tiene corte.
+    minimos = (
+        sel[sel["n"].to_numpy() > 0]
+        .groupby([*por, col], observed=True)["minimo"].min()
+        .reset_index()
+        .sort_values([*por, "minimo"], kind="stable")
+    )
+    cortes = minimos[minimos.duplicated(list(por), keep="first")]
+    return cortes.rename(columns={col: "NIVEL", "minimo": "corte"}).reset_index(drop=True)
@@ -0,0 +1,199 @@
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------
+# Índice de filtros por valor
+# ---------------------------------------------------
+# Para cada columna de filtro se guarda, por valor, el arreglo ordenado de
+# posiciones de fila donde aparece. Una selección es la intersección de esos
+# arreglos; el frame solo se materializa cuando alguien pide las filas.
+# Los códigos de las columnas categóricas son los del propio frame (int8 /
+# int16, sin copia) y las posiciones van en int32: el índice ocupa menos que
+# el frame compacto que indexa.
+COLUMNAS_FILTRO = ["FUENTE", "ANHO", "SEDE", "COD_AREA", "GRADO_LABEL"]
+
+
+POSICIONES_DTYPE = "int32"
+
+
+def _codificar(serie):
+    # (códigos, valores) ordenables; -1 = nulo
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Los del frame, en el orden de las categorías (p. ej. GRADO_LABEL);
+        # una categoría sin filas queda con posiciones vacías
+        return serie.cat.codes.to_numpy(), list(serie.cat.categories)
+    # sort=True: los códigos siguen el orden de los valores
+    codigos, valores = pd.factorize(serie, sort=True)
+    return codigos.astype(POSICIONES_DTYPE), list(valores)
+
+
+class IndiceFiltros:
+    def __init__(self, df, columnas=COLUMNAS_FILTRO, arreglos=None):
+        # `arreglos`: {columna: (códigos, valores, orden)} ya calculados
+        # (ver arreglos(); p. ej. leídos de una instantánea)
+        self.df = df
+        self.n_filas = len(df)
+        self._columnas = list(columnas)
+        self._codigos = {}
+        self._valores = {}
+        self._orden = {}
+        self._posiciones = {}
+        self._extremos = {}
+        for col in columnas:
+            if arreglos is not None:
+                codigos, valores, orden = arreglos[col]
+            else:
+                codigos, valores = _codificar(df[col])
+                orden = np.argsort(codigos, kind="stable").astype(POSICIONES_DTYPE)
+            cortes = np.searchsorted(codigos[orden], np.arange(len(valores) + 1))
+            self._codigos[col] = codigos
+            self._valores[col] = list(valores)
+            self._orden[col] = orden
+            self._posiciones[col] = {
+                valor: orden[cortes[i]:cortes[i + 1]] for i, valor in enumerate(valores)
+            }
+
+    # Lo necesario para reconstruir el índice sin volver a ordenar
+    def arreglos(self):
+        return {
+            col: (self._codigos[col], self._valores[col], self._orden[col])
+            for col in self._columnas
+        }
+
+    # Posiciones (ordenadas) de las filas que cumplen {columna: valor}
+    def filas(self, filtros):
+        conjuntos = []
+        for col, valor in filtros.items():
+            posiciones = self._posiciones[col].get(valor)
+            if posiciones is None:
+                return np.empty(0, dtype=POSICIONES_DTYPE)
+            conjuntos.append(posiciones)
+        if not conjuntos:
+            return np.arange(self.n_filas, dtype=POSICIONES_DTYPE)
+
+        conjuntos.sort(key=len)
+        resultado = conjuntos[0]
+        for otro in conjuntos[1:]:
+            if len(resultado) == 0:
+                break
+            idx = np.searchsorted(otro, resultado)
+            idx[idx == len(otro)] = 0
+            resultado = resultado[otro[idx] == resultado]
+        return resultado
+
+    # Códigos ordenables de cualquier columna (los de filtro ya están; el
+    # resto se calcula la primera vez que se piden)
+    def codigos(self, col):
+        if col not in self._codigos:
+            codigos, valores = _codificar(self.df[col])
+            self._codigos[col] = codigos
+            self._valores[col] = list(valores)
+        return self._codigos[col], self._valores[col]
+
+    def extremos(self, col):
+        if col not in self._extremos:
+            valores = self.df[col].to_numpy(dtype="float64")
+            self._extremos[col] = (float(np.nanmin(valores)), float(np.nanmax(valores)))
+        return self._extremos[col]
+
+    # ---------------------------------------------------
+    # Búsqueda y orden sobre posiciones (para la tabla paginada)
+    # ---------------------------------------------------
+    def buscar(self, filas, texto, columnas):
+        texto = texto.strip().lower()
+        if not texto:
+            return filas
+        coincide = np.zeros(len(filas), dtype=bool)
+        for col in columnas:
+            codigos, valores = self.codigos(col)
+            # una comparación por valor distinto; el -1 (nulo) cae en el último
+            por_valor = np.array([texto in str(v).lower() for v in valores] + [False])
+            coincide |= por_valor[codigos[filas]]
+        return filas[coincide]
+
+    def rango(self, filas, col, minimo, maximo):
+        valores = self.df[col].to_numpy()[filas]
+        return filas[(valores >= minimo) & (valores <= maximo)]
+
+    def ordenar(self, filas, col, descendente=False):
+        if pd.api.types.is_numeric_dtype(self.df[col]):
+            clave = self.df[col].to_numpy(dtype="float64")[filas]
+        else:
+            codigos, _ = self.codigos(col)
+            clave = codigos[filas].astype("float64")
+            clave[clave < 0] = np.nan
+        # los nulos quedan al final en ambos sentidos
+        orden = np.argsort(-clave if descendente else clave, kind="stable")
+        return filas[orden]
+
+    def vista(self, filas):
+        # Rango contiguo -> rebanada sin copia; si no, se toman las filas
+        if len(filas) and filas[-1] - filas[0] + 1 == len(filas):
+            return self.df.iloc[filas[0]:filas[-1] + 1]
+        return self.df.take(filas)
+
+
+# ---------------------------------------------------
+# Mapa de opciones de filtro
+# ---------------------------------------------------
+# Las opciones de cada radio (año, sede, área y, según esos tres, grado) se
+# arman una sola vez al cargar, desde las combinaciones FUENTE x ANHO x
+# SEDE x COD_AREA x GRADO_LABEL presentes en el cubo. Cada combinación se
+# registra también con cada filtro en None ("Todos" / "Todas"), así que en
+# un rerun las opciones son una búsqueda en un diccionario, sin recorrer
+# filas. Los valores quedan en el orden de las categorías.
+COLUMNAS_OPCIONES = ["ANHO", "SEDE", "COD_AREA"]
+
+
+class MapaOpciones:
+    def __init__(self, celdas):
+        columnas = ["FUENTE", *COLUMNAS_OPCIONES, "GRADO_LABEL"]
+        categorias = {col: list(celdas[col].cat.categories) for col in columnas}
+        codigos = np.column_stack([celdas[col].cat.codes.to_numpy().astype("int64") for col in columnas])
+
+        por_fuente, por_filtros = {}, {}
+        for fuente, *filtros_combinacion, grado in np.unique(codigos, axis=0).tolist():
+            if fuente < 0:
+                continue
+            presentes = por_fuente.setdefault(fuente, [set() for _ in COLUMNAS_OPCIONES])
+            for valores, codigo in zip(presentes, filtros_combinacion):
+                if codigo >= 0:
+                    valores.add(codigo)
+            # Un valor nulo solo cuenta con ese filtro en "Todos"
+            for comodines in product((False, True), repeat=len(COLUMNAS_OPCIONES)):
+                clave = tuple(
+                    None if comodin else codigo
+                    for comodin, codigo in zip(comodines, filtros_combinacion)
+                )
+                if any(codigo is not None and codigo < 0 for codigo in clave):
+                    continue
+                grados = por_filtros.setdefault((fuente, *clave), set())
+                if grado >= 0:
+                    grados.add(grado)
+
+        def nombres(col, codigos_col):
+            return [categorias[col][i] for i in sorted(codigos_col)]
+
+        self._opciones = {
+            categorias["FUENTE"][fuente]: {
+                col: nombres(col, valores) for col, valores in zip(COLUMNAS_OPCIONES, presentes)
+            }
+            for fuente, presentes in por_fuente.items()
+        }
+        self._grados = {
+            (categorias["FUENTE"][fuente], *(
+                None if codigo is None else categorias[col][codigo]
+                for col, codigo in zip(COLUMNAS_OPCIONES, clave)
+            )): nombres("GRADO_LABEL", grados)
+            for (fuente, *clave), grados in por_filtros.items()
+        }
+
+    # {columna: valores} de año, sede y área presentes en la fuente
+    def opciones(self, fuente):
+        return self._opciones.get(fuente, {col: [] for col in COLUMNAS_OPCIONES})
+
+    # Grados presentes con los demás filtros (None = sin filtrar)
+    def grados(self, fuente, ano=None, sede=None, area=None):
+        return self._grados.get((fuente, ano, sede, area), [])
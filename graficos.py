@@ -0,0 +1,451 @@
+from functools import lru_cache
+
+import altair as alt
+import pandas as pd
+import pyarrow as pa
+
+import consultas
+import ingesta
+
+# ---------------------------------------------------
+# Gráficos (sin Streamlit)
+# ---------------------------------------------------
+# Cada gráfico se separa en dos partes:
+#   - spec_*:  la especificación Vega-Lite sin datos. Se arma con Altair una
+#              sola vez por tipo de gráfico (y orden de grados / niveles /
+#              paleta) y queda en caché; no se vuelve a validar ni serializar
+#              con Altair en cada rerun.
+#   - datos_*: solo las columnas que usa el gráfico, como tabla Arrow sin
+#              metadatos pandas.
+# El tablero pasa ambas a st.vega_lite_chart; los reportes insertan los
+# datos como "values". Las etiquetas van en blanco (fondo negro del tablero).
+
+# Colores Innova
+INNOVA_BLUE = "#00539B"
+INNOVA_GREEN = "#7AB800"
+INNOVA_ORANGE = "#FF9300"
+INNOVA_PALETTE = [INNOVA_BLUE, INNOVA_GREEN, INNOVA_ORANGE]
+
+# paleta incremental de azules (Inicio → Avanzado)
+PALETA_COGNITIVA = ["#BBDEFB", "#64B5F6", "#1E88E5", "#0D47A1"]
+
+# Paletas por prueba (clave: nombre normalizado, como en ingesta.ESCALAS_HSE)
+PALETAS_HSE = {
+    "conciencia social": ["#FFF3E0", "#FFE0B2", "#FFB74D", "#FB8C00"],
+    "relaciones interpersonales": ["#E3F2FD", "#BBDEFB", "#90CAF9", "#42A5F5", "#0D47A1"],
+}
+
+
+def paleta_hse(area_sel, n_niveles):
+    area_norm = ingesta.norm_texto(area_sel)
+    if area_norm in PALETAS_HSE:
+        return PALETAS_HSE[area_norm]
+    # fallback si llegara otra prueba
+    return ["#E0F2F1", "#80CBC4", "#26A69A", "#00897B", "#004D40"][:n_niveles]
+
+
+# ---------------------------------------------------
+# Plantillas y datos
+# ---------------------------------------------------
+def _plantilla(chart):
+    # Spec de Altair sin datos (Altair pone un conjunto vacío de relleno)
+    spec = chart.to_dict()
+    for clave in ("$schema", "data", "datasets"):
+        spec.pop(clave, None)
+    for capa in spec.get("layer", []):
+        capa.pop("data", None)
+    return spec
+
+
+def _datos(df_tabla, columnas):
+    table = pa.Table.from_pandas(df_tabla[columnas], preserve_index=False)
+    # Texto plano en lugar de diccionarios (categóricas) y sin el esquema
+    # pandas: en tablas de pocas filas eso es la mayor parte de los bytes
+    table = table.cast(pa.schema([
+        pa.field(f.name, pa.string() if pa.types.is_dictionary(f.type) else f.type)
+        for f in table.schema
+    ]))
+    return table.replace_schema_metadata(None)
+
+
+def con_datos(spec, datos):
+    # Spec autocontenida (datos en línea), para archivos y la API
+    return {**spec, "data": {"values": datos.to_pylist()}}
+
+
+# ---------------------------------------------------
+# MEDIDA_500 por sexo y grado
+# ---------------------------------------------------
+def datos_medida_por_sexo(resumen):
+    return _datos(resumen, ["GRADO_LABEL", "Sexo", "MEDIDA_500_MEDIA"])
+
+
+@lru_cache(maxsize=64)
+def spec_medida_por_sexo(grado_categories):
+    grado_categories = list(grado_categories)
+
+    # Base del gráfico: barras agrupadas por sexo dentro de cada grado
+    base = alt.Chart().properties(height=380)
+
+    bar = base.mark_bar().encode(
+        x=alt.X("GRADO_LABEL:N", sort=grado_categories, title="Grado"),
+        # barras agrupadas: una por sexo dentro de cada grado
+        xOffset=alt.XOffset("Sexo:N"),
+        y=alt.Y("MEDIDA_500_MEDIA:Q", title="Media MEDIDA_500"),
+        color=alt.Color(
+            "Sexo:N",
+            scale=alt.Scale(
+                domain=["Femenino", "Masculino"],
+                range=[INNOVA_ORANGE, INNOVA_BLUE],
+            ),
+            title="Sexo",
+        ),
+        tooltip=[
+            "GRADO_LABEL:N",
+            "Sexo:N",
+            alt.Tooltip("MEDIDA_500_MEDIA:Q", format=".1f"),
+        ],
+    )
+
+    # Etiquetas con la media sobre cada barra
+    text = base.mark_text(dy=-10, color="white").encode(
+        x=alt.X("GRADO_LABEL:N", sort=grado_categories),
+        xOffset=alt.XOffset("Sexo:N"),
+        y="MEDIDA_500_MEDIA:Q",
+        text=alt.Text("MEDIDA_500_MEDIA:Q", format=".1f"),
+    )
+
+    return _plantilla(alt.layer(bar, text))
+
+
+# ---------------------------------------------------
+# Cognitivas: dona de niveles y proporciones por grado
+# ---------------------------------------------------
+def datos_niveles(niveles):
+    return _datos(niveles, ["NIVEL_LOGRO_4", "conteo", "proporcion"])
+
+
+def datos_niveles_grado(tabla_ng):
+    return _datos(tabla_ng, ["GRADO_LABEL", "NIVEL_LOGRO_4", "conteo", "proporcion"])
+
+
+@lru_cache(maxsize=1)
+def spec_niveles_cognitivos():
+    niveles_order = consultas.NIVELES_COGNITIVOS
+    return _plantilla(
+        alt.Chart()
+        .mark_arc(innerRadius=60)
+        .encode(
+            theta=alt.Theta("proporcion:Q"),
+            color=alt.Color(
+                "NIVEL_LOGRO_4:N",
+                scale=alt.Scale(domain=niveles_order, range=PALETA_COGNITIVA),
+                title="Nivel de logro",
+            ),
+            tooltip=[
+                "NIVEL_LOGRO_4:N",
+                alt.Tooltip("proporcion:Q", format=".1%"),
+                "conteo:Q",
+            ],
+        )
+        .properties(height=300)
+    )
+
+
+@lru_cache(maxsize=64)
+def spec_niveles_grado(grado_categories):
+    grado_categories = list(grado_categories)
+    niveles_order = consultas.NIVELES_COGNITIVOS
+
+    # Base del gráfico (barras DESAGREGADAS, no apiladas)
+    base = alt.Chart().properties(height=320)
+
+    chart_ng = (
+        base.mark_bar()
+        .encode(
+            x=alt.X(
+                "GRADO_LABEL:N",
+                sort=grado_categories,
+                title="Grado",
+            ),
+            # barras desagregadas por nivel dentro de cada grado (en ORDEN fijo)
+            xOffset=alt.XOffset(
+                "NIVEL_LOGRO_4:N",
+                scale=alt.Scale(domain=niveles_order),
+            ),
+            y=alt.Y(
+                "proporcion:Q",
+                title="Proporción de estudiantes",
+                axis=alt.Axis(format="%", tickCount=6),
+                scale=alt.Scale(domain=[0, 1])  # SIEMPRE 0% a 100%
+            ),
+            color=alt.Color(
+                "NIVEL_LOGRO_4:N",
+                scale=alt.Scale(domain=niveles_order, range=PALETA_COGNITIVA),
+                title="Nivel de logro",
+            ),
+            tooltip=[
+                "GRADO_LABEL:N",
+                "NIVEL_LOGRO_4:N",
+                alt.Tooltip("proporcion:Q", format=".1%"),
+                "conteo:Q",
+            ],
+        )
+    )
+
+    # Etiquetas con % sobre cada barra
+    text_ng = (
+        base.mark_text(dy=-5, color="white")
+        .encode(
+            x=alt.X(
+                "GRADO_LABEL:N",
+                sort=grado_categories,
+            ),
+            xOffset=alt.XOffset(
+                "NIVEL_LOGRO_4:N",
+                scale=alt.Scale(domain=niveles_order),
+            ),
+            y="proporcion:Q",
+            text=alt.Text("proporcion:Q", format=".0%"),
+            detail="NIVEL_LOGRO_4:N",
+        )
+    )
+
+    return _plantilla(chart_ng + text_ng)
+
+
+# ---------------------------------------------------
+# HSE: niveles por prueba
+# ---------------------------------------------------
+@lru_cache(maxsize=64)
+def spec_niveles_hse(niveles_order, palette):
+    niveles_order, palette = list(niveles_order), list(palette)
+    base = alt.Chart().properties(height=320)
+
+    # Barras en orden fijo, Y de 0 a 100%
+    chart = (
+        base.mark_bar()
+        .encode(
+            x=alt.X(
+                "NIVEL_LOGRO_4:N",
+                sort=niveles_order,
+                title="Nivel",
+            ),
+            y=alt.Y(
+                "proporcion:Q",
+                title="Proporción de estudiantes",
+                axis=alt.Axis(format="%", tickCount=6),
+                scale=alt.Scale(domain=[0, 1]),  # 0% a 100%
+            ),
+            color=alt.Color(
+                "NIVEL_LOGRO_4:N",
+                scale=alt.Scale(domain=niveles_order, range=palette),
+                title="Nivel",
+            ),
+            tooltip=[
+                "NIVEL_LOGRO_4:N",
+                alt.Tooltip("proporcion:Q", format=".1%"),
+                "conteo:Q",
+            ],
+        )
+    )
+
+    # Etiquetas en %
+    text = (
+        base.mark_text(dy=-10, color="white")
+        .encode(
+            x=alt.X("NIVEL_LOGRO_4:N", sort=niveles_order),
+            y="proporcion:Q",
+            text=alt.Text("proporcion:Q", format=".0%"),
+        )
+    )
+
+    return _plantilla(chart + text)
+
+
+# ---------------------------------------------------
+# Trayectorias: matriz de transición entre niveles
+# ---------------------------------------------------
+def datos_transiciones(matriz):
+    return _datos(matriz, ["NIVEL_ORIGEN", "NIVEL_DESTINO", "conteo", "proporcion"])
+
+
+@lru_cache(maxsize=64)
+def spec_transiciones(niveles_order):
+    niveles_order = list(niveles_order)
+    base = alt.Chart().encode(
+        x=alt.X("NIVEL_DESTINO:N", sort=niveles_order, title="Nivel actual"),
+        y=alt.Y("NIVEL_ORIGEN:N", sort=niveles_order, title="Nivel en la evaluación anterior"),
+    ).properties(height=320)
+
+    # Cada fila (nivel de origen) suma 100 %
+    celdas = base.mark_rect().encode(
+        color=alt.Color(
+            "proporcion:Q",
+            scale=alt.Scale(scheme="blues", domain=[0, 1]),
+            title="Proporción",
+        ),
+        tooltip=[
+            "NIVEL_ORIGEN:N",
+            "NIVEL_DESTINO:N",
+            alt.Tooltip("proporcion:Q", format=".1%"),
+            "conteo:Q",
+        ],
+    )
+
+    # Etiquetas en %, legibles sobre celdas claras y oscuras
+    text = base.mark_text().encode(
+        text=alt.Text("proporcion:Q", format=".0%"),
+        color=alt.condition(alt.datum.proporcion > 0.5, alt.value("white"), alt.value("black")),
+    )
+
+    return _plantilla(celdas + text)
+
+
+# ---------------------------------------------------
+# Comparación entre sedes: niveles por sede (small multiples)
+# ---------------------------------------------------
+def datos_niveles_sede(niveles):
+    return _datos(niveles, ["posicion", "SEDE", "NIVEL_LOGRO_4", "conteo", "proporcion"])
+
+
+@lru_cache(maxsize=64)
+def spec_niveles_sede(niveles_order, palette, columnas=4):
+    # Un panel por sede, en el orden del ranking (campo "posicion"): la
+    # plantilla no depende de qué sedes haya
+    niveles_order, palette = list(niveles_order), list(palette)
+    return _plantilla(
+        alt.Chart()
+        .mark_bar()
+        .encode(
+            x=alt.X(
+                "NIVEL_LOGRO_4:N",
+                sort=niveles_order,
+                title=None,
+                axis=alt.Axis(labels=False, ticks=False),
+            ),
+            y=alt.Y(
+                "proporcion:Q",
+                title=None,
+                axis=alt.Axis(format="%", tickCount=3),
+                scale=alt.Scale(domain=[0, 1]),  # 0% a 100% en todos los paneles
+            ),
+            color=alt.Color(
+                "NIVEL_LOGRO_4:N",
+                scale=alt.Scale(domain=niveles_order, range=palette),
+                title="Nivel",
+            ),
+            facet=alt.Facet(
+                "SEDE:N",
+                sort=alt.EncodingSortField("posicion", op="min"),
+                columns=columnas,
+                title=None,
+                header=alt.Header(labelColor="white"),
+            ),
+            tooltip=[
+                "SEDE:N",
+                "NIVEL_LOGRO_4:N",
+                alt.Tooltip("proporcion:Q", format=".1%"),
+                "conteo:Q",
+            ],
+        )
+        .properties(width=140, height=110)
+    )
+
+
+# ---------------------------------------------------
+# Distribución de MEDIDA_500 por sexo y grado
+# ---------------------------------------------------
+def datos_distribucion(distribucion, cortes_nivel):
+    # Histograma y cortes en una sola tabla (st.vega_lite_chart recibe un
+    # solo conjunto de datos); cada capa filtra sus filas
+    tabla = pd.concat(
+        [
+            distribucion[
+                ["GRADO_LABEL", "Sexo", "desde", "hasta", "conteo", "proporcion", "densidad"]
+            ],
+            cortes_nivel[["GRADO_LABEL", "NIVEL", "corte"]],
+        ],
+        ignore_index=True,
+    )
+    return _datos(
+        tabla,
+        [
+            "GRADO_LABEL", "Sexo", "desde", "hasta", "conteo", "proporcion", "densidad",
+            "NIVEL", "corte",
+        ],
+    )
+
+
+@lru_cache(maxsize=64)
+def spec_distribucion(grado_categories, vista="conteo", columnas=3):
+    grado_categories = list(grado_categories)
+
+    # F y M superpuestos (no apilados). "conteo": histograma de estudiantes
+    # por bin. "densidad": proporción por punto de MEDIDA_500 dentro del
+    # grado y sexo, en el centro de cada bin (comparable entre grupos de
+    # distinto tamaño).
+    color = alt.Color(
+        "Sexo:N",
+        scale=alt.Scale(
+            domain=["Femenino", "Masculino"],
+            range=[INNOVA_ORANGE, INNOVA_BLUE],
+        ),
+        title="Sexo",
+    )
+    tooltip = [
+        "Sexo:N",
+        alt.Tooltip("desde:Q", format=".0f"),
+        alt.Tooltip("hasta:Q", format=".0f"),
+        "conteo:Q",
+        alt.Tooltip("proporcion:Q", format=".1%"),
+    ]
+    bins = alt.Chart().transform_filter("isValid(datum.desde)")
+    if vista == "densidad":
+        barras = (
+            bins.transform_calculate(centro="(datum.desde + datum.hasta) / 2")
+            .mark_line(interpolate="monotone", point=True, strokeWidth=2)
+            .encode(
+                x=alt.X("centro:Q", title="MEDIDA_500"),
+                y=alt.Y("densidad:Q", title="Densidad (proporción por punto)"),
+                color=color,
+                tooltip=tooltip,
+            )
+        )
+    else:
+        barras = bins.mark_bar(opacity=0.55, binSpacing=0).encode(
+            x=alt.X("desde:Q", bin="binned", title="MEDIDA_500"),
+            x2="hasta:Q",
+            y=alt.Y("conteo:Q", stack=None, title="Estudiantes"),
+            color=color,
+            tooltip=tooltip,
+        )
+
+    # Puntos de corte: MEDIDA_500 mínima de cada nivel
+    cortes = alt.Chart().transform_filter("isValid(datum.corte)")
+    reglas = cortes.mark_rule(color="white", strokeDash=[4, 3]).encode(
+        x="corte:Q",
+        tooltip=["NIVEL:N", alt.Tooltip("corte:Q", format=".1f")],
+    )
+    etiquetas = cortes.mark_text(
+        color="white", align="left", baseline="top", dx=3, fontSize=10
+    ).encode(
+        x="corte:Q",
+        y=alt.value(0),
+        text="NIVEL:N",
+    )
+
+    vista = alt.layer(barras, reglas, etiquetas, data=alt.Data(name="distribucion")).properties(
+        width=260, height=180
+    )
+    return _plantilla(
+        vista.facet(
+            facet=alt.Facet(
+                "GRADO_LABEL:N",
+                sort=grado_categories,
+                title=None,
+                header=alt.Header(labelColor="white"),
+            ),
+            columns=columnas,
+        )
+    )
@@ -0,0 +1,242 @@
+import logging
+import re
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------
+# Rutas y descubrimiento de los libros de resultados
+# ---------------------------------------------------
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# Los libros se nombran "<País>_Latam..." (p. ej. Colombia_Latam_HSE.xlsx,
+# Costa_Rica_Latam-Cognitivas.xlsx): el prefijo, con "_" por espacios, es
+# el país del libro. Solo completa la columna PAIS donde viene vacía; si
+# dice otra cosa, manda la columna (con un aviso).
+PATRON_PAIS = re.compile(r"^(.+?)_latam(?![a-z])", re.IGNORECASE)
+
+log = logging.getLogger(__name__)
+
+# Fragmento del nombre del archivo (en minúsculas) -> FUENTE
+FUENTES = {
+    "cognitiv": "Cognitivas",
+    "hse": "HSE",
+}
+
+GRADO_MAP = {
+    "3": "Tercero", 3: "Tercero",
+    "4": "Cuarto", 4: "Cuarto",
+    "5": "Quinto", 5: "Quinto",
+    "6": "Sexto", 6: "Sexto",
+    "7": "Séptimo", 7: "Séptimo",
+    "8": "Octavo", 8: "Octavo",
+    "9": "Noveno", 9: "Noveno",
+}
+GRADO_ORDER = ["Tercero", "Cuarto", "Quinto", "Sexto", "Séptimo", "Octavo", "Noveno"]
+
+# Columnas que se conservan en memoria; el resto de los libros no se usa
+COLUMNAS_RESULTADOS = [
+    "FUENTE",
+    "PAIS",
+    "ANHO",
+    "SEDE",
+    "COD_AREA",
+    "GRADO_LABEL",
+    "SEXO",
+    "MEDIDA_500",
+    "NIVEL_LOGRO_4",
+    "NIVEL_CANON",
+    "ID_ESTUDIANTE",
+]
+CATEGORICAS = ["FUENTE", "PAIS", "ANHO", "SEDE", "COD_AREA", "SEXO", "NIVEL_LOGRO_4"]
+
+# ID_ESTUDIANTE es un hash de 64 bits del correo; 0 = sin correo
+SIN_ESTUDIANTE = 0
+
+# Escalas HSE por prueba (clave: nombre normalizado de la prueba), en orden
+ESCALAS_HSE = {
+    "conciencia social": [
+        "Egocéntricos",
+        "Normativos",
+        "Empáticos",
+        "Empáticos Compasivos",
+    ],
+    "relaciones interpersonales": [
+        "Disruptivo",
+        "Condicionado",
+        "Funcional",
+        "Constructivo",
+        "Transformador",
+    ],
+}
+
+# Forma normalizada -> etiqueta canónica de cada nivel HSE
+NIVELES_HSE_CANON = {
+    "egocentricos": "Egocéntricos",
+    "normativos": "Normativos",
+    "empaticos": "Empáticos",
+    "empaticos compasivos": "Empáticos Compasivos",
+    "empaticos_compasivos": "Empáticos Compasivos",
+    "disruptivo": "Disruptivo",
+    "condicionado": "Condicionado",
+    "funcional": "Funcional",
+    "constructivo": "Constructivo",
+    "transformador": "Transformador",
+}
+
+
+# Normalización básica para evitar problemas de tildes/mayúsculas/espacios
+def norm_texto(s):
+    if pd.isna(s):
+        return None
+    s = str(s).strip()
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return s.lower()
+
+
+# Texto -> fragmento seguro para nombres de archivo ("2024 - 1" -> "2024-1")
+def slug(texto):
+    return re.sub(r"[^a-z0-9]+", "-", norm_texto(texto) or "").strip("-") or "sin-valor"
+
+
+def canon_niveles(niveles):
+    # Se canoniza una vez por valor distinto (categoría), no por fila; lo
+    # que no está en las escalas HSE se deja como viene.
+    niveles = niveles.astype("category")
+    originales = niveles.cat.categories
+    canon = [NIVELES_HSE_CANON.get(norm_texto(v), v) for v in originales]
+
+    escalas = [nivel for escala in ESCALAS_HSE.values() for nivel in escala]
+    otros = sorted(set(canon) - set(escalas))
+    categorias = escalas + otros
+
+    posicion = {nivel: i for i, nivel in enumerate(categorias)}
+    recodigo = np.array([posicion[c] for c in canon] + [-1], dtype="int16")
+    return pd.Categorical.from_codes(
+        recodigo[niveles.cat.codes.to_numpy()],
+        categories=categorias,
+        ordered=True,
+    )
+
+
+# ---------------------------------------------------
+# Lectura y preparación (lo que antes hacía load_data)
+# ---------------------------------------------------
+def discover_archivos(data_dir=DATA_DIR):
+    # Libros .xlsx de data/ cuya fuente se reconoce por el nombre, en orden
+    # de nombre (los temporales "~$" de Excel se ignoran)
+    archivos = []
+    for path in sorted(Path(data_dir).glob("*.xlsx")):
+        if path.name.startswith("~$"):
+            continue
+        nombre = path.name.lower()
+        for fragmento, fuente in FUENTES.items():
+            if fragmento in nombre:
+                archivos.append((path, fuente))
+                break
+    return archivos
+
+
+def pais_archivo(path):
+    # País del prefijo del nombre; None si el nombre no lo trae
+    coincidencia = PATRON_PAIS.match(Path(path).name)
+    return coincidencia.group(1).replace("_", " ") if coincidencia else None
+
+
+def read_archivo(path):
+    return pd.read_excel(path)
+
+
+def prepare_resultados(raw, fuente, pais=None):
+    df_local = raw.copy()
+    df_local["FUENTE"] = fuente
+
+    # País de cada fila; donde el libro no lo trae, el del nombre del archivo.
+    # Los datos no se reescriben: si la columna dice otro país, se avisa.
+    if "PAIS" not in df_local:
+        df_local["PAIS"] = pais
+    elif pais is not None:
+        df_local["PAIS"] = df_local["PAIS"].replace(".", np.nan)
+        distintos = sorted(
+            str(v) for v in df_local["PAIS"].dropna().unique() if slug(str(v)) != slug(pais)
+        )
+        if distintos:
+            log.warning(
+                "El libro de %s trae PAIS = %s; se conserva la columna",
+                pais, ", ".join(distintos),
+            )
+        df_local["PAIS"] = df_local["PAIS"].fillna(pais)
+
+    df_local["MEDIDA_500"] = pd.to_numeric(df_local["MEDIDA_500"], errors="coerce").astype("float32")
+    df_local["SEXO"] = df_local["SEXO"].replace(".", np.nan)
+
+    # Grados -> etiquetas ordenadas
+    df_local["GRADO_LABEL"] = df_local["GRADO"].map(GRADO_MAP)
+    df_local["GRADO_LABEL"] = df_local["GRADO_LABEL"].fillna(df_local["GRADO"].astype(str))
+
+    all_grados = sorted(df_local["GRADO_LABEL"].dropna().unique().tolist())
+    others = [g for g in all_grados if g not in GRADO_ORDER]
+    grado_categories = GRADO_ORDER + others
+
+    df_local["GRADO_LABEL"] = pd.Categorical(
+        df_local["GRADO_LABEL"],
+        categories=grado_categories,
+        ordered=True
+    )
+
+    df_local["ID_ESTUDIANTE"] = hash_estudiantes(df_local["CORREO"])
+
+    for col in CATEGORICAS:
+        df_local[col] = df_local[col].astype("category")
+
+    df_local["NIVEL_CANON"] = canon_niveles(df_local["NIVEL_LOGRO_4"])
+
+    return df_local[COLUMNAS_RESULTADOS]
+
+
+def hash_estudiantes(correos):
+    # Correo normalizado -> uint64 estable entre procesos y cargas (la clave
+    # de hash_pandas_object es fija). No se guarda el correo en claro.
+    correos = correos.astype("string").str.strip().str.lower()
+    ids = pd.util.hash_pandas_object(correos.fillna(""), index=False).to_numpy()
+    return np.where(correos.isna().to_numpy(), SIN_ESTUDIANTE, ids).astype("uint64")
+
+
+def memory_report(df_local):
+    por_columna = df_local.memory_usage(deep=True, index=False)
+    return por_columna.sort_values(ascending=False), int(por_columna.sum())
+
+
+# ---------------------------------------------------
+# Unión de partes (un frame por libro) con categorías comunes
+# ---------------------------------------------------
+def _categorias(col, valores):
+    if col == "GRADO_LABEL":
+        return GRADO_ORDER + sorted(valores - set(GRADO_ORDER))
+    if col == "NIVEL_CANON":
+        escalas = [nivel for escala in ESCALAS_HSE.values() for nivel in escala]
+        return escalas + sorted(valores - set(escalas))
+    return sorted(valores)
+
+
+def concat_resultados(partes):
+    # Cada parte trae sus propias categorías; se unifican antes de concatenar
+    # para que las columnas sigan siendo categóricas (y no texto)
+    partes = list(partes)
+    categoricas = [
+        col for col, dtype in partes[0].dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+    ]
+    for col in categoricas:
+        valores = set()
+        for parte in partes:
+            valores.update(parte[col].cat.categories)
+        dtype = pd.CategoricalDtype(
+            _categorias(col, valores),
+            ordered=partes[0][col].cat.ordered,
+        )
+        partes = [parte.assign(**{col: parte[col].astype(dtype)}) for parte in partes]
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+import almacen
+import cohortes
+import filtros
+import ingesta
+
+# ---------------------------------------------------
+# Instantánea compartida de solo lectura
+# ---------------------------------------------------
+# Un proceso de precarga (precarga.py) arma, por país, todo lo que el
+# tablero construye al arrancar: filas unidas, cubo y cuantiles combinados,
+# tránsitos e índices de filtro (ya ordenados). Lo escribe como archivos
+# Arrow IPC sin comprimir en una carpeta por versión de datos. Cada worker
+# del tablero los abre con memory mapping: las columnas quedan apoyadas en
+# el page cache, que el sistema comparte entre procesos, así que N réplicas
+# en el mismo nodo no multiplican la memoria ni repiten la carga.
+#
+# Un archivo de estado por país (<país>.estado.json) dice qué carpeta está
+# lista y para qué firma de data/ (almacen.firma_datos). Solo se escribe al
+# publicar, con la carpeta ya renombrada; mientras se arma otra (o si falla)
+# el avance queda en <país>.progreso.json y los workers siguen con la
+# publicada. Si no hay una lista, o data/ cambió desde que se armó, el
+# tablero carga como siempre (almacen.load_almacen). Las carpetas viejas se
+# borran al publicar una nueva: en Linux los workers que aún las tengan
+# mapeadas siguen leyendo.
+INSTANTANEAS_DIR = almacen.CACHE_DIR / "instantaneas"
+
+log = logging.getLogger(__name__)
+
+
+def _nombre(pais):
+    return ingesta.slug(pais) if pais is not None else "todos"
+
+
+def _estado_path(pais, base):
+    return base / f"{_nombre(pais)}.estado.json"
+
+
+def _progreso_path(pais, base):
+    return base / f"{_nombre(pais)}.progreso.json"
+
+
+def _firma_json(firma):
+    # Tuplas -> listas, como quedan en el archivo de estado
+    return json.loads(json.dumps(firma))
+
+
+def _leer_json(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _escribir_json(datos, path):
+    texto = json.dumps(datos, indent=1, ensure_ascii=False)
+    almacen.escribir_atomico(path, lambda tmp: tmp.write_text(texto, encoding="utf-8"))
+
+
+def leer_estado(pais=None, base=INSTANTANEAS_DIR):
+    return _leer_json(_estado_path(pais, base))
+
+
+def leer_progreso(pais=None, base=INSTANTANEAS_DIR):
+    # Preparación en curso o fallida (None si la última terminó bien)
+    return _leer_json(_progreso_path(pais, base))
+
+
+def lista(estado, firma):
+    # La instantánea del estado está publicada y sirve para los libros
+    # actuales de data/ y para esta versión del código (almacen.CACHE_VERSION)
+    return (
+        estado is not None
+        and estado.get("estado") == "listo"
+        and estado.get("carpeta") is not None
+        and estado.get("cache_version") == almacen.CACHE_VERSION
+        and estado.get("firma") == _firma_json(firma)
+    )
+
+
+# ---------------------------------------------------
+# Índices de filtro como tablas Arrow
+# ---------------------------------------------------
+def _write_indice(indice, path):
+    columnas, valores = {}, {}
+    for col, (codigos, valores_col, orden) in indice.arreglos().items():
+        columnas[f"{col}.codigos"] = pa.array(codigos)
+        columnas[f"{col}.orden"] = pa.array(orden)
+        valores[col] = valores_col
+    table = pa.table(columnas).replace_schema_metadata(
+        {"valores": json.dumps(valores, ensure_ascii=False)}
+    )
+
+    def escribir(tmp):
+        with pa.OSFile(str(tmp), "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    almacen.escribir_atomico(path, escribir)
+
+
+def _read_indice(df_local, path):
+    with pa.memory_map(str(path), "r") as source:
+        table = ipc.open_file(source).read_all()
+    valores = json.loads(table.schema.metadata[b"valores"])
+    arreglos = {
+        col: (
+            table.column(f"{col}.codigos").to_numpy(),
+            valores_col,
+            table.column(f"{col}.orden").to_numpy(),
+        )
+        for col, valores_col in valores.items()
+    }
+    return filtros.IndiceFiltros(df_local, columnas=list(valores), arreglos=arreglos)
+
+
+# ---------------------------------------------------
+# Escritura (proceso de precarga)
+# ---------------------------------------------------
+def write_carpeta(destino, df_local, celdas, tabla_cuantiles):
+    # Se arma al lado y se renombra: nadie abre una carpeta a medias.
+    # Devuelve el número de tránsitos.
+    transitos = cohortes.build_transitos(df_local)
+    tmp = destino.with_name(f"{destino.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    almacen.write_arrow(df_local, tmp / "filas.arrow")
+    almacen.write_arrow(celdas, tmp / "cubo.arrow")
+    almacen.write_arrow(tabla_cuantiles, tmp / "cuantiles.arrow")
+    almacen.write_arrow(transitos, tmp / "transitos.arrow")
+    _write_indice(filtros.IndiceFiltros(df_local), tmp / "indice_filas.arrow")
+    _write_indice(filtros.IndiceFiltros(transitos), tmp / "indice_transitos.arrow")
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(tmp, destino)
+    return len(transitos)
+
+
+def preparar(pais=None, data_dir=ingesta.DATA_DIR, cache_dir=almacen.CACHE_DIR, base=INSTANTANEAS_DIR):
+    # Sincroniza el almacén, arma la instantánea del país (None = todos) y
+    # la publica en su archivo de estado. Devuelve el estado publicado.
+    inicio = time.perf_counter()
+    firma = almacen.firma_datos(data_dir)
+    previo = leer_estado(pais, base) or {}
+    progreso = _progreso_path(pais, base)
+    _escribir_json({"estado": "preparando", "pid": os.getpid(), "desde": time.time()}, progreso)
+
+    try:
+        df_local, celdas, tabla_cuantiles, version = almacen.load_almacen(
+            data_dir, cache_dir, paises=None if pais is None else [pais]
+        )
+        # data_version ya incluye CACHE_VERSION
+        carpeta = f"{_nombre(pais)}_{version}"
+        destino = base / carpeta
+        if not (previo.get("carpeta") == carpeta and destino.exists()):
+            n_transitos = write_carpeta(destino, df_local, celdas, tabla_cuantiles)
+        else:
+            # Mismos datos (p. ej. solo cambió el mtime de un libro)
+            n_transitos = previo.get("transitos")
+    except Exception as e:
+        _escribir_json({"estado": "error", "error": str(e), "pid": os.getpid(), "hasta": time.time()}, progreso)
+        raise
+
+    estado = {
+        "estado": "listo",
+        "pais": pais,
+        "carpeta": carpeta,
+        "version": version,
+        "cache_version": almacen.CACHE_VERSION,
+        "firma": _firma_json(firma),
+        "filas": len(df_local),
+        "celdas": len(celdas),
+        "transitos": n_transitos,
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "creado": time.time(),
+        "pid": os.getpid(),
+    }
+    # write_carpeta ya renombró la carpeta: recién ahora se publica
+    _escribir_json(estado, _estado_path(pais, base))
+    progreso.unlink(missing_ok=True)
+
+    # Carpetas anteriores del mismo país
+    for vieja in base.glob(f"{_nombre(pais)}_*"):
+        if vieja.is_dir() and vieja.name != carpeta and not vieja.name.endswith(".tmp"):
+            shutil.rmtree(vieja, ignore_errors=True)
+    return estado
+
+
+# ---------------------------------------------------
+# Lectura (workers del tablero)
+# ---------------------------------------------------
+def adjuntar(pais=None, firma=None, data_dir=ingesta.DATA_DIR, base=INSTANTANEAS_DIR):
+    # (filas, cubo, cuantiles, índice de filas, índice de tránsitos,
+    # versión) apoyados en la instantánea lista, o None si no la hay
+    firma = almacen.firma_datos(data_dir) if firma is None else firma
+    estado = leer_estado(pais, base)
+    if not lista(estado, firma):
+        return None
+
+    carpeta = base / estado["carpeta"]
+    try:
+        df_local = almacen.read_arrow(carpeta / "filas.arrow")
+        celdas = almacen.read_arrow(carpeta / "cubo.arrow")
+        tabla_cuantiles = almacen.read_arrow(carpeta / "cuantiles.arrow")
+        transitos = almacen.read_arrow(carpeta / "transitos.arrow")
+        indice = _read_indice(df_local, carpeta / "indice_filas.arrow")
+        indice_transitos = _read_indice(transitos, carpeta / "indice_transitos.arrow")
+    except FileNotFoundError:
+        # Reemplazada entre leer el estado y abrirla
+        return None
+
+    log.info("Instantánea %s adjunta (%d filas)", carpeta.name, len(df_local))
+    return df_local, celdas, tabla_cuantiles, indice, indice_transitos, estado["version"]
@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+# ---------------------------------------------------
+# Perfil de tiempos por etapa (opcional)
+# ---------------------------------------------------
+# Mide tiempo de pared, filas procesadas y bytes serializados de cada etapa
+# de un rerun del tablero (carga, filtros, agregados, gráficos, tablas).
+# Apagado por defecto: etapa() devuelve entonces un contexto nulo
+# compartido, sin reloj ni serialización. Se activa para todas las sesiones
+# con LATAM_PERFIL=1, o para una sesión con ?perfil=1 en la URL (?perfil=0
+# lo apaga aunque esté la variable). Cada rerun medido se agrega a
+# PERFIL_LOG como líneas JSON, una por etapa más una con el total.
+VARIABLE_ACTIVAR = "LATAM_PERFIL"
+VARIABLE_LOG = "LATAM_PERFIL_LOG"
+VALORES_ACTIVO = {"1", "true", "si", "sí", "on"}
+
+PERFIL_LOG = Path(os.environ.get(VARIABLE_LOG, Path(__file__).resolve().parent / "perfil.jsonl"))
+
+# Varias sesiones escriben el mismo archivo
+_lock_log = threading.Lock()
+
+
+def activado(parametro=None):
+    valor = parametro if parametro is not None else os.environ.get(VARIABLE_ACTIVAR, "")
+    return str(valor).strip().lower() in VALORES_ACTIVO
+
+
+def bytes_arrow(datos):
+    # Tamaño del stream Arrow IPC (como viajan tablas y datos de gráficos
+    # al navegador), sin armar el buffer
+    if isinstance(datos, pd.DataFrame):
+        datos = pa.Table.from_pandas(datos)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, datos.schema) as writer:
+        writer.write_table(datos)
+    return sink.size()
+
+
+class _EtapaNula:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def anotar(self, **valores):
+        pass
+
+
+_ETAPA_NULA = _EtapaNula()
+
+
+class _Etapa:
+    def __init__(self, perfil, registro, datos, spec):
+        self.perfil = perfil
+        self.registro = registro
+        self.datos = datos
+        self.spec = spec
+
+    def __enter__(self):
+        # Se agrega al entrar: las etapas quedan en orden de inicio aunque
+        # estén anidadas
+        self.registro["nivel"] = self.perfil._nivel
+        self.perfil._nivel += 1
+        self.perfil.etapas.append(self)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registro["ms"] = (time.perf_counter() - self.inicio) * 1000
+        self.perfil._nivel -= 1
+        return False
+
+    def anotar(self, **valores):
+        self.registro.update(valores)
+
+    def cerrar(self):
+        # Los bytes se cuentan al final del rerun, fuera de todo tiempo medido
+        if self.datos is not None or self.spec is not None:
+            self.registro["bytes"] = (
+                (0 if self.datos is None else bytes_arrow(self.datos))
+                + (0 if self.spec is None else len(json.dumps(self.spec)))
+            )
+            self.datos = self.spec = None
+        return self.registro
+
+
+class Perfil:
+    def __init__(self, activo=False):
+        self.activo = activo
+        self.contexto = {}
+        self.etapas = []
+        self._nivel = 0
+        self._inicio = time.perf_counter()
+
+    def etapa(self, nombre, filas=None, datos=None, spec=None):
+        # `datos` (DataFrame o tabla Arrow) y `spec` (dict Vega-Lite): lo que
+        # se serializa en la etapa, para contar bytes
+        if not self.activo:
+            return _ETAPA_NULA
+        return _Etapa(self, {"etapa": nombre, "filas": filas}, datos, spec)
+
+    def anotar(self, **contexto):
+        # Vista, país, filtros...: van en cada línea del log
+        if self.activo:
+            self.contexto.update(contexto)
+
+    def registros(self):
+        return [etapa.cerrar() for etapa in self.etapas]
+
+    def tabla(self):
+        return pd.DataFrame(
+            [{**r, "etapa": "  " * r["nivel"] + r["etapa"]} for r in self.registros()],
+            columns=["etapa", "ms", "filas", "bytes"],
+        )
+
+    def total_ms(self):
+        return (time.perf_counter() - self._inicio) * 1000
+
+    def volcar(self, path=PERFIL_LOG):
+        if not self.activo:
+            return
+        base = {"ts": time.time(), "rerun": uuid.uuid4().hex[:12], **self.contexto}
+        registros = self.registros() + [{"etapa": "rerun", "nivel": 0, "ms": self.total_ms()}]
+        lineas = "".join(
+            json.dumps({**base, **registro}, ensure_ascii=False, default=str) + "\n"
+            for registro in registros
+        )
+        with _lock_log, open(path, "a", encoding="utf-8") as fh:
+            fh.write(lineas)
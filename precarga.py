@@ -0,0 +1,92 @@
+# ---------------------------------------------------
+# Proceso de precarga para despliegues con varios workers
+# ---------------------------------------------------
+# Arma la instantánea compartida de cada país (instantanea.py) para que
+# los workers del tablero la adjunten por memory mapping al arrancar, en
+# lugar de cargar y armar índices cada uno. Con --vigilar sigue corriendo
+# y la rehace cuando cambia data/. --estado y --esperar sirven como prueba
+# de disponibilidad (código de salida 0 = todas listas).
+#
+#   python precarga.py                           # una instantánea por país
+#   python precarga.py --vigilar 60              # y revisa data/ cada 60 s
+#   python precarga.py --estado                  # estado de cada país
+#   python precarga.py --esperar 300 && streamlit run app.py
+import argparse
+import json
+import logging
+import sys
+import time
+
+import almacen
+import instantanea
+
+log = logging.getLogger("precarga")
+
+
+def _paises(args):
+    # Los mismos que ofrece el tablero (uno por libro de data/)
+    return args.pais or almacen.paises_disponibles() or [None]
+
+
+def _estados(paises):
+    # {país: (estado publicado, si sirve para los libros actuales)}
+    firma = almacen.firma_datos()
+    estados = {pais: instantanea.leer_estado(pais) for pais in paises}
+    return {pais: (estado, instantanea.lista(estado, firma)) for pais, estado in estados.items()}
+
+
+def preparar_todos(paises):
+    for pais in paises:
+        estado = instantanea.preparar(pais)
+        log.info(
+            "%s: %s (%s filas, %s tránsitos) en %.1f s",
+            pais or "todos", estado["carpeta"], f"{estado['filas']:,}",
+            f"{estado['transitos']:,}", estado["segundos"],
+        )
+
+
+def vigilar(paises, intervalo):
+    firma = almacen.firma_datos()
+    while True:
+        time.sleep(intervalo)
+        actual = almacen.firma_datos()
+        if actual != firma:
+            log.info("Cambió data/: rearmando instantáneas")
+            preparar_todos(paises)
+            firma = actual
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instantánea compartida para los workers del tablero")
+    parser.add_argument("--pais", nargs="+", help="países; por defecto, los de data/")
+    parser.add_argument("--vigilar", type=float, metavar="SEGUNDOS", help="revisar data/ cada tantos segundos")
+    parser.add_argument("--estado", action="store_true", help="mostrar el estado y salir")
+    parser.add_argument("--esperar", type=float, metavar="SEGUNDOS", help="esperar a que estén listas y salir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    paises = _paises(args)
+
+    if args.estado:
+        estados = _estados(paises)
+        for pais, (estado, lista) in estados.items():
+            progreso = instantanea.leer_progreso(pais)
+            print(json.dumps(
+                {"pais": pais, "lista": lista, **(estado or {}), "progreso": progreso}, ensure_ascii=False
+            ))
+        sys.exit(0 if all(lista for _, lista in estados.values()) else 1)
+
+    if args.esperar is not None:
+        limite = time.monotonic() + args.esperar
+        while not all(lista for _, lista in _estados(paises).values()):
+            if time.monotonic() > limite:
+                sys.exit(1)
+            time.sleep(1)
+        sys.exit(0)
+
+    preparar_todos(paises)
+    if args.vigilar:
+        vigilar(paises, args.vigilar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# ---------------------------------------------------
+# Reportes estáticos por sede, área y grado
+# ---------------------------------------------------
+# Genera, sin abrir el tablero, un reporte por cada combinación
+# PAIS x FUENTE x SEDE x COD_AREA x GRADO_LABEL presente en los datos, con
+# las mismas tablas (consultas.py) y gráficos (graficos.py) que el tablero.
+# Las combinaciones salen de un único groupby sobre el cubo (no se filtra
+# el frame una vez por combinación); las tablas (consultas.resumen), el
+# dibujo y la escritura de cada una se reparten en un pool de procesos.
+# Con --pais / --ano solo se cargan esas particiones del
+# almacén. Cada periodo (o "todos-los-periodos", sin --ano) escribe en su
+# propia carpeta, con su index.html: corridas de distintos años no se pisan.
+#
+#   python reportes.py                           # HTML en reportes/todos-los-periodos/
+#   python reportes.py --pais Colombia --ano "2024 - 2" --formatos html png pdf
+#
+# PNG y PDF necesitan el paquete opcional vl-convert-python. Con él, además,
+# Vega / Vega-Lite / vega-embed se escriben una vez en vega.js dentro de la
+# carpeta del periodo y los HTML se abren sin red; sin él los HTML cargan
+# esos scripts desde jsDelivr y necesitan conexión al abrirlos.
+import argparse
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import altair as alt
+
+import almacen
+import consultas
+import graficos
+import ingesta
+
+try:
+    import vl_convert  # noqa: F401  (PNG / PDF)
+except ImportError:
+    vl_convert = None
+
+SALIDA_DIR = Path(__file__).resolve().parent / "reportes"
+FORMATOS = ["html", "png", "pdf"]
+COMBINACION = ["PAIS", "FUENTE", "SEDE", "COD_AREA", "GRADO_LABEL"]
+
+PAGINA_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{titulo}</title>
+{scripts}
+<style>
+body {{ background: #000000; color: #FFFFFF; font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin: 1em 0; }}
+th, td {{ border: 1px solid #444444; padding: 4px 10px; text-align: right; }}
+a {{ color: #7AB800; }}
+</style>
+</head>
+<body>
+<h1>{titulo}</h1>
+{cuerpo}
+</body>
+</html>
+"""
+
+
+# Mismo aspecto que el tablero: fondo negro y texto blanco
+TEMA_REPORTE = {
+    "background": "#000000",
+    "axis": {"labelColor": "white", "titleColor": "white", "gridColor": "#333333"},
+    "legend": {"labelColor": "white", "titleColor": "white"},
+    "title": {"color": "white"},
+    "view": {"stroke": None},
+}
+
+SCRIPTS_CDN = [
+    f"https://cdn.jsdelivr.net/npm/vega@{alt.VEGA_VERSION}",
+    f"https://cdn.jsdelivr.net/npm/vega-lite@{alt.VEGALITE_VERSION}",
+    f"https://cdn.jsdelivr.net/npm/vega-embed@{alt.VEGAEMBED_VERSION}",
+]
+
+
+# ---------------------------------------------------
+# Scripts de Vega: locales (vl-convert) o desde el CDN
+# ---------------------------------------------------
+def escribir_vega_js(path):
+    # Vega, Vega-Lite y vega-embed en un solo archivo (globales vegaEmbed,
+    # vega, vegaLite; requiere vl-convert), con la versión de Vega-Lite de
+    # Altair si vl-convert la trae
+    version = ".".join(alt.VEGALITE_VERSION.split(".")[:2])
+    if version not in vl_convert.get_vegalite_versions():
+        version = None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(vl_convert.javascript_bundle(vl_version=version), encoding="utf-8")
+
+
+def scripts_html(pagina, vega_js=None):
+    # <script> de `pagina`: vega.js relativo a ella o, sin él, SCRIPTS_CDN
+    if vega_js is None:
+        fuentes = SCRIPTS_CDN
+    else:
+        fuentes = [Path(os.path.relpath(vega_js, pagina.parent)).as_posix()]
+    return "\n".join(f'<script src="{html.escape(src)}"></script>' for src in fuentes)
+
+
+# ---------------------------------------------------
+# Combinaciones: un solo pase sobre el cubo
+# ---------------------------------------------------
+def _periodo(ano):
+    return ano or "Todos los periodos"
+
+
+def carpeta_periodo(salida_dir, ano=None):
+    return salida_dir / ingesta.slug(_periodo(ano))
+
+
+def tareas_reportes(
+    celdas, tabla_cuantiles, salida_dir, ano=None, fuentes=None, formatos=("html",), vega_js=None,
+):
+    # Una tarea por combinación, con sus celdas y resúmenes de cuantiles:
+    # consultas.resumen corre en el proceso del pool que la dibuja
+    if ano is not None:
+        celdas = celdas[celdas["ANHO"].to_numpy() == ano]
+        tabla_cuantiles = tabla_cuantiles[tabla_cuantiles["ANHO"].to_numpy() == ano]
+    if fuentes:
+        celdas = celdas[celdas["FUENTE"].isin(fuentes).to_numpy()]
+        tabla_cuantiles = tabla_cuantiles[tabla_cuantiles["FUENTE"].isin(fuentes).to_numpy()]
+    grado_categories = celdas["GRADO_LABEL"].cat.categories.tolist()
+    periodo = _periodo(ano)
+    periodo_dir = carpeta_periodo(salida_dir, ano)
+
+    # Resúmenes de cuantiles agrupados igual que el cubo
+    grupos_cuantiles = dict(iter(tabla_cuantiles.groupby(COMBINACION, observed=True, sort=False)))
+    sin_cuantiles = tabla_cuantiles.iloc[:0]
+
+    tareas = []
+    for combinacion, sel in celdas.groupby(COMBINACION, observed=True, sort=True):
+        pais, fuente, sede, area, grado = combinacion
+        titulo = f"{pais} · {fuente} · {sede} · {area} · {grado} · {periodo}"
+        ruta = (
+            periodo_dir / ingesta.slug(pais) / ingesta.slug(fuente) / ingesta.slug(sede)
+            / f"{ingesta.slug(area)}__{ingesta.slug(grado)}"
+        )
+        tareas.append((
+            ruta, titulo, fuente, area, sel, grupos_cuantiles.get(combinacion, sin_cuantiles),
+            grado_categories, tuple(formatos), vega_js,
+        ))
+    return tareas
+
+
+# ---------------------------------------------------
+# Dibujo y escritura de un reporte (en un proceso del pool)
+# ---------------------------------------------------
+def _tabla_html(df_tabla, columnas):
+    return df_tabla[columnas].to_html(index=False, float_format=lambda v: f"{v:,.1f}", border=0)
+
+
+def _vista(spec, datos, titulo, ancho):
+    # Las plantillas traen la config por defecto de Altair; la del reporte
+    # va una sola vez arriba
+    vista = {k: v for k, v in graficos.con_datos(spec, datos).items() if k != "config"}
+    return {**vista, "title": titulo, "width": ancho}
+
+
+def graficos_reporte(area, consulta, grado_categories):
+    # Especificación Vega-Lite del reporte (plantillas de graficos.py, sin
+    # pasar por Altair en cada reporte)
+    grados = tuple(grado_categories)
+    vistas = []
+    if not consulta.sexo.empty:
+        vistas.append(_vista(
+            graficos.spec_medida_por_sexo(grados),
+            graficos.datos_medida_por_sexo(consulta.sexo),
+            "MEDIDA_500 por sexo y grado", 500,
+        ))
+    if consulta.fuente == "HSE":
+        palette = graficos.paleta_hse(area, len(consulta.niveles_order))
+        vistas.append(_vista(
+            graficos.spec_niveles_hse(tuple(consulta.niveles_order), tuple(palette)),
+            graficos.datos_niveles(consulta.niveles),
+            "NIVEL_LOGRO_4 – Prueba HSE", 500,
+        ))
+    else:
+        vistas.append(_vista(
+            graficos.spec_niveles_cognitivos(),
+            graficos.datos_niveles(consulta.niveles),
+            "NIVEL_LOGRO_4 – Prueba Cognitiva", 300,
+        ))
+        if not consulta.niveles_grado.empty:
+            vistas.append(_vista(
+                graficos.spec_niveles_grado(grados),
+                graficos.datos_niveles_grado(consulta.niveles_grado),
+                "NIVEL_LOGRO_4 por grado", 500,
+            ))
+    return {
+        "$schema": f"https://vega.github.io/schema/vega-lite/v{alt.VEGALITE_VERSION}.json",
+        "vconcat": vistas,
+        # Cada gráfico con su paleta (sexo, niveles)
+        "resolve": {"scale": {"color": "independent"}},
+        "config": TEMA_REPORTE,
+    }
+
+
+def cuerpo_html(consulta, spec):
+    kpis = consulta.kpis
+    filas_kpi = [
+        ("Registros", f"{kpis['registros']:,}"),
+        ("Estudiantes únicos", f"{kpis['estudiantes']:,}"),
+        ("Media MEDIDA_500", f"{kpis['media']:,.1f}"),
+        ("Desviación MEDIDA_500", f"{kpis['desviacion']:,.1f}"),
+        ("Mediana MEDIDA_500", f"{kpis['mediana']:,.1f}"),
+        ("P10 / P25 MEDIDA_500", f"{kpis['p10']:,.1f} / {kpis['p25']:,.1f}"),
+        ("P75 / P90 MEDIDA_500", f"{kpis['p75']:,.1f} / {kpis['p90']:,.1f}"),
+    ]
+    partes = [
+        "<table>" + "".join(
+            f"<tr><th>{html.escape(k)}</th><td>{html.escape(v)}</td></tr>" for k, v in filas_kpi
+        ) + "</table>",
+        "<h2>Proporción por nivel</h2>",
+        _tabla_html(consulta.niveles, ["NIVEL_LOGRO_4", "conteo", "porcentaje"]),
+    ]
+    if not consulta.sexo.empty:
+        partes += [
+            "<h2>Media de MEDIDA_500 por grado y sexo</h2>",
+            _tabla_html(consulta.sexo, ["GRADO_LABEL", "Sexo", "MEDIDA_500_MEDIA"]),
+            "<h2>Brecha de la media (Femenino − Masculino) con IC 95 %</h2>",
+            _tabla_html(consulta.brecha_sexo, ["GRADO_LABEL", "n_F", "n_M", "brecha", "ic_inf", "ic_sup"]),
+        ]
+    partes += [
+        '<div id="graficos"></div>',
+        f'<script>vegaEmbed("#graficos", {json.dumps(spec, ensure_ascii=False)});</script>',
+    ]
+    return "\n".join(partes)
+
+
+def render_reporte(tarea):
+    ruta, titulo, fuente, area, sel, sel_cuantiles, grado_categories, formatos, vega_js = tarea
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    consulta = consultas.resumen(sel, fuente, area, grado_categories, sel_cuantiles)
+    spec = graficos_reporte(area, consulta, grado_categories)
+
+    escritos = []
+    if "html" in formatos:
+        path = ruta.with_suffix(".html")
+        path.write_text(
+            PAGINA_HTML.format(
+                titulo=html.escape(titulo),
+                scripts=scripts_html(path, vega_js),
+                cuerpo=cuerpo_html(consulta, spec),
+            ),
+            encoding="utf-8",
+        )
+        escritos.append(path)
+    if "png" in formatos:
+        path = ruta.with_suffix(".png")
+        path.write_bytes(vl_convert.vegalite_to_png({**spec, "title": titulo}, scale=2))
+        escritos.append(path)
+    if "pdf" in formatos:
+        path = ruta.with_suffix(".pdf")
+        path.write_bytes(vl_convert.vegalite_to_pdf({**spec, "title": titulo}))
+        escritos.append(path)
+    return escritos
+
+
+def escribir_indice(salida_dir, tareas, escritos, vega_js=None):
+    enlaces = []
+    for (_, titulo, *_), archivos in zip(tareas, escritos):
+        links = " ".join(
+            f'<a href="{p.relative_to(salida_dir).as_posix()}">{p.suffix[1:]}</a>' for p in archivos
+        )
+        enlaces.append(f"<li>{html.escape(titulo)} {links}</li>")
+    cuerpo = f"<p>{len(tareas)} reportes</p>\n<ul>\n" + "\n".join(enlaces) + "\n</ul>"
+    indice = salida_dir / "index.html"
+    indice.write_text(
+        PAGINA_HTML.format(
+            titulo="Reportes LATAM", scripts=scripts_html(indice, vega_js), cuerpo=cuerpo,
+        ),
+        encoding="utf-8",
+    )
+
+
+# ---------------------------------------------------
+# CLI
+# ---------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Reportes estáticos por sede, área y grado")
+    parser.add_argument("--salida", type=Path, default=SALIDA_DIR)
+    parser.add_argument("--pais", nargs="+", help="países; por defecto, todos")
+    parser.add_argument("--ano", help="periodo (p. ej. '2024 - 2'); por defecto, todos")
+    parser.add_argument("--fuente", nargs="+", choices=list(ingesta.FUENTES.values()))
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=["html"])
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if vl_convert is None and {"png", "pdf"} & set(args.formatos):
+        parser.error("PNG/PDF requieren vl-convert-python (pip install vl-convert-python)")
+
+    inicio = time.perf_counter()
+    try:
+        _, celdas, tabla_cuantiles, version = almacen.load_almacen(
+            paises=args.pais, anos=None if args.ano is None else [args.ano]
+        )
+    except FileNotFoundError:
+        parser.error(
+            f"No hay resultados para --pais {' '.join(args.pais or ['(todos)'])} "
+            f"--ano {args.ano or '(todos)'}; países en {ingesta.DATA_DIR}: "
+            f"{', '.join(almacen.paises_disponibles()) or 'ninguno'}"
+        )
+    periodo_dir = carpeta_periodo(args.salida, args.ano)
+    vega_js = None
+    if vl_convert is not None and "html" in args.formatos:
+        vega_js = periodo_dir / "vega.js"
+    tareas = tareas_reportes(
+        celdas, tabla_cuantiles, args.salida, args.ano, args.fuente, args.formatos, vega_js
+    )
+    if not tareas:
+        parser.error("No hay datos para los filtros indicados")
+    if vega_js is not None:
+        escribir_vega_js(vega_js)
+
+    with ProcessPoolExecutor(max_workers=args.procesos) as pool:
+        chunksize = max(1, len(tareas) // (4 * (args.procesos or 1)))
+        escritos = list(pool.map(render_reporte, tareas, chunksize=chunksize))
+    escribir_indice(periodo_dir, tareas, escritos, vega_js)
+
+    print(
+        f"{len(tareas)} reportes ({', '.join(args.formatos)}) en {periodo_dir} "
+        f"en {time.perf_counter() - inicio:.1f} s (datos {version})"
+    )
+
+
+if __name__ == "__main__":
+    main()
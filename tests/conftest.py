@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Los módulos del tablero viven en la raíz del repo y los datos sintéticos
+# en bench/ (sin paquete instalable)
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(RAIZ), str(RAIZ / "bench")]
+
+import ingesta  # noqa: E402
+import sinteticos  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def libros():
+    # [(fuente, libro crudo)] con el esquema de los libros reales
+    return sinteticos.generate_libros(20_000, seed=3)
+
+
+@pytest.fixture(scope="session")
+def df(libros):
+    return ingesta.concat_resultados(
+        ingesta.prepare_resultados(raw, fuente) for fuente, raw in libros
+    )
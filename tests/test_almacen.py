@@ -0,0 +1,24 @@
+import time
+
+import pytest
+
+import almacen
+
+
+@pytest.mark.skipif(almacen.fcntl is None, reason="flock solo en POSIX")
+def test_bloqueo_con_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen, "BLOQUEO_TIMEOUT", 0.3)
+    # Otro "proceso" con el lock de archivo tomado (flock es por descriptor)
+    with open(tmp_path / "almacen.lock", "a+b") as otro:
+        almacen.fcntl.flock(otro.fileno(), almacen.fcntl.LOCK_EX)
+        inicio = time.monotonic()
+        with pytest.raises(TimeoutError, match="almacen.lock"):
+            with almacen.bloqueo_almacen(tmp_path):
+                pass
+        assert 0.3 <= time.monotonic() - inicio < 2
+        almacen.fcntl.flock(otro.fileno(), almacen.fcntl.LOCK_UN)
+
+    # Liberado, se toma enseguida; el lock del proceso quedó libre
+    with almacen.bloqueo_almacen(tmp_path):
+        pass
+    assert not almacen._SYNC_LOCK.locked()
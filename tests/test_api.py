@@ -0,0 +1,43 @@
+import json
+
+import pyarrow as pa
+import pytest
+
+import api
+import consultas
+import cubo
+import cuantiles
+
+FILTROS = ("Cognitivas", "2024 - 2", "Tunja", None, None, None)
+
+
+@pytest.fixture(scope="module")
+def agregados(df):
+    return api.Agregados(cubo.build_cubo(df), cuantiles.build_cuantiles(df), "v-prueba")
+
+
+def test_agregados_como_el_tablero(agregados):
+    cuerpo = json.loads(agregados.cuerpo("agregados", FILTROS, api.MIME_JSON))
+    consulta = consultas.query(
+        agregados.celdas, *FILTROS[:5], tabla_cuantiles=agregados.tabla_cuantiles
+    )
+    assert cuerpo["version"] == "v-prueba"
+    assert cuerpo["kpis"]["registros"] == consulta.kpis["registros"]
+    assert cuerpo["kpis"]["estudiantes"] == consulta.kpis["estudiantes"]
+    assert cuerpo["kpis"]["mediana"] == pytest.approx(consulta.kpis["mediana"])
+    assert [n["conteo"] for n in cuerpo["niveles"]] == consulta.niveles["conteo"].tolist()
+
+
+def test_tabla_en_arrow(agregados):
+    cuerpo = agregados.cuerpo("niveles_grado", FILTROS, api.MIME_ARROW)
+    tabla = pa.ipc.open_stream(cuerpo).read_all().to_pandas()
+    registros = json.loads(agregados.cuerpo("niveles_grado", FILTROS, api.MIME_JSON))
+    assert len(tabla) == len(registros) > 0
+    assert tabla["conteo"].tolist() == [r["conteo"] for r in registros]
+
+
+def test_opciones(df, agregados):
+    cuerpo = json.loads(agregados.cuerpo("opciones", ("HSE", None, None, None, None, None), api.MIME_JSON))
+    hse = df[df["FUENTE"] == "HSE"]
+    assert cuerpo["SEDE"] == sorted(hse["SEDE"].astype(str).unique())
+    assert set(cuerpo["COD_AREA"]) == set(hse["COD_AREA"].astype(str).unique())
@@ -0,0 +1,31 @@
+import pandas as pd
+
+import cohortes
+from ingesta import SIN_ESTUDIANTE
+
+
+def _transitos_groupby(df):
+    # Referencia directa: última fila de cada estudiante por periodo y el
+    # periodo anterior del mismo estudiante, fuente, país y área
+    clave = ["ID_ESTUDIANTE", *cohortes.CLAVE_ESTUDIANTE]
+    filas = df[df["ID_ESTUDIANTE"] != SIN_ESTUDIANTE].reset_index(drop=True)
+    filas = filas.groupby([*clave, "ANHO"], observed=True, sort=True).tail(1)
+    filas = filas.sort_values([*clave, "ANHO"], kind="stable")
+    anterior = filas.groupby(clave, observed=True)[list(cohortes.COLUMNAS_ORIGEN)].shift()
+    filas = filas.assign(**{
+        origen: anterior[col] for col, origen in cohortes.COLUMNAS_ORIGEN.items()
+    })
+    return filas[filas["ANHO_ORIGEN"].notna()]
+
+
+def test_transitos_como_groupby(df):
+    columnas = ["ID_ESTUDIANTE", "COD_AREA", "ANHO", "ANHO_ORIGEN", "MEDIDA_500", "MEDIDA_ORIGEN"]
+    transitos = cohortes.build_transitos(df)
+    esperado = _transitos_groupby(df)
+    assert len(transitos) == len(esperado) > 0
+
+    def ordenar(tabla):
+        tabla = tabla[columnas].astype({col: str for col in columnas[:4]})
+        return tabla.sort_values(columnas[:3]).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(ordenar(transitos), ordenar(esperado), check_dtype=False)
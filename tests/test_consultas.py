@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import consultas
+import cubo
+import filtros
+
+
+@pytest.fixture(scope="module")
+def celdas(df):
+    return cubo.build_cubo(df)
+
+
+def test_comparar_sedes_niveles(df, celdas):
+    comparacion = consultas.comparar_sedes(celdas, "Cognitivas", area="LECTURA")
+    filas = df[(df["FUENTE"] == "Cognitivas") & (df["COD_AREA"] == "LECTURA")]
+
+    registros = filas.groupby("SEDE", observed=True).size()
+    registros.index = registros.index.astype(str)
+    ranking = comparacion.ranking.set_index("SEDE")["registros"]
+    assert ranking.to_dict() == registros.to_dict()
+
+    # Todos los niveles de los libros (incluido "Inicio") y proporción sobre
+    # los registros de la sede
+    esperado = (
+        filas.groupby(["SEDE", "NIVEL_LOGRO_4"], observed=True).size()
+        .rename("conteo").reset_index()
+        .astype({"SEDE": str, "NIVEL_LOGRO_4": str})
+    )
+    assert set(esperado["NIVEL_LOGRO_4"]) <= set(comparacion.niveles_order)
+    tabla = comparacion.niveles.merge(esperado, on=["SEDE", "NIVEL_LOGRO_4"], how="left")
+    np.testing.assert_array_equal(tabla["conteo_x"], tabla["conteo_y"].fillna(0))
+    np.testing.assert_allclose(
+        tabla["proporcion"], tabla["conteo_x"] / tabla["SEDE"].map(registros).astype(float)
+    )
+
+
+def test_vista_como_un_rerun(df, celdas):
+    indice = filtros.IndiceFiltros(df)
+    llamadas = []
+
+    def registrar(nombre):
+        def calcular(*filtros_vista):
+            llamadas.append((nombre, filtros_vista))
+            return nombre
+        return calcular
+
+    calculos = dict(
+        agregados=registrar("agregados"),
+        comparacion=registrar("comparacion"),
+        trayectorias=registrar("trayectorias"),
+    )
+
+    vista = consultas.vista(indice, "Cognitivas", "2024 - 2", "Tunja", None, None, False, **calculos)
+    esperado = (df["FUENTE"] == "Cognitivas") & (df["ANHO"] == "2024 - 2") & (df["SEDE"] == "Tunja")
+    assert len(vista.filas) == esperado.sum()
+    assert (vista.resultado, vista.comparacion, vista.cohorte) == ("agregados", None, "trayectorias")
+
+    # Comparando sedes no se filtra por sede
+    llamadas.clear()
+    vista = consultas.vista(indice, "Cognitivas", "2024 - 2", "Tunja", None, None, True, **calculos)
+    assert len(vista.filas) == ((df["FUENTE"] == "Cognitivas") & (df["ANHO"] == "2024 - 2")).sum()
+    assert llamadas == [
+        ("agregados", ("Cognitivas", "2024 - 2", None, None, None)),
+        ("comparacion", ("Cognitivas", "2024 - 2", None, None)),
+    ]
+
+    # Sin filas no se calcula nada
+    llamadas.clear()
+    vista = consultas.vista(indice, "Cognitivas", "1999 - 1", None, None, None, False, **calculos)
+    assert len(vista.filas) == 0 and vista.resultado is None and not llamadas
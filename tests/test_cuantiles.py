@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import cubo
+import cuantiles
+
+FILTROS = [
+    {},
+    {"ano": "2024 - 2"},
+    {"sede": "Tunja", "grado": "Tercero"},
+    {"ano": "2023 - 2", "sede": "Niza", "grado": "Quinto"},
+]
+
+
+def _medida(df, fuente, ano=None, sede=None, grado=None):
+    mask = df["FUENTE"] == fuente
+    for col, valor in (("ANHO", ano), ("SEDE", sede), ("GRADO_LABEL", grado)):
+        if valor is not None:
+            mask &= df[col] == valor
+    medida = df.loc[mask, "MEDIDA_500"].to_numpy(dtype="float64")
+    return medida[~np.isnan(medida)]
+
+
+def _error(df, tabla, fuente, filtros):
+    estimados = cuantiles.percentiles(cubo.select_celdas(tabla, fuente, **filtros))
+    medida = _medida(df, fuente, **filtros)
+    return max(
+        abs(estimados[nombre] - np.percentile(medida, q * 100))
+        for nombre, q in cuantiles.PERCENTILES.items()
+    )
+
+
+@pytest.mark.parametrize("filtros", FILTROS)
+@pytest.mark.parametrize("fuente", ["Cognitivas", "HSE"])
+def test_particiones_chicas_exactas(df, fuente, filtros):
+    # Con 20 000 filas ninguna partición pasa de UMBRAL_EXACTO
+    tabla = cuantiles.build_cuantiles(df)
+    assert (tabla["pesos"].map(len) == tabla["pesos"].map(np.sum)).all()
+    assert _error(df, tabla, fuente, filtros) < 1e-3
+
+
+@pytest.mark.parametrize("filtros", FILTROS)
+@pytest.mark.parametrize("fuente", ["Cognitivas", "HSE"])
+def test_centroides_dentro_de_la_cota(df, monkeypatch, fuente, filtros):
+    monkeypatch.setattr(cuantiles, "UMBRAL_EXACTO", 0)
+    tabla = cuantiles.build_cuantiles(df)
+    assert (tabla["pesos"].map(len) < tabla["pesos"].map(np.sum)).any()
+    assert _error(df, tabla, fuente, filtros) < 5
+
+
+def test_merge_conserva_valores_exactos(df):
+    mitad = len(df) // 2
+    partes = [cuantiles.build_cuantiles(df.iloc[:mitad]), cuantiles.build_cuantiles(df.iloc[mitad:])]
+    unida = cuantiles.merge_cuantiles(partes)
+    assert _error(df, unida, "Cognitivas", {}) < 1e-3
+    assert _error(df, unida, "HSE", {"sede": "Tunja", "grado": "Tercero"}) < 1e-3
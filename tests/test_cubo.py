@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import cubo
+from ingesta import SIN_ESTUDIANTE
+
+FILTROS = [
+    {},
+    {"ano": "2024 - 2"},
+    {"sede": "Tunja", "area": "LECTURA"},
+    {"ano": "2023 - 2", "sede": "Niza", "grado": "Quinto"},
+]
+
+
+@pytest.fixture(scope="module")
+def celdas(df):
+    return cubo.build_cubo(df)
+
+
+def _filas(df, fuente, ano=None, sede=None, area=None, grado=None):
+    mask = df["FUENTE"] == fuente
+    for col, valor in (("ANHO", ano), ("SEDE", sede), ("COD_AREA", area), ("GRADO_LABEL", grado)):
+        if valor is not None:
+            mask &= df[col] == valor
+    return df[mask]
+
+
+@pytest.mark.parametrize("filtros", FILTROS)
+@pytest.mark.parametrize("fuente", ["Cognitivas", "HSE"])
+def test_kpis_como_groupby(df, celdas, fuente, filtros):
+    if fuente == "HSE" and "area" in filtros:
+        filtros = {**filtros, "area": "Conciencia Social"}
+    kpis = cubo.kpis(cubo.select_celdas(celdas, fuente, **filtros))
+    filas = _filas(df, fuente, **filtros)
+
+    assert kpis["registros"] == len(filas)
+    ids = filas["ID_ESTUDIANTE"]
+    assert kpis["estudiantes"] == ids[ids != SIN_ESTUDIANTE].nunique()
+    assert kpis["sedes"] == filas["SEDE"].nunique()
+    medida = filas["MEDIDA_500"].astype("float64")
+    np.testing.assert_allclose(kpis["media"], medida.mean(), rtol=1e-9)
+    np.testing.assert_allclose(kpis["desviacion"], medida.std(), rtol=1e-6)
+
+
+def test_merge_igual_a_un_solo_cubo(df, celdas):
+    partes = [cubo.build_cubo(df.iloc[i:i + 7_000]) for i in range(0, len(df), 7_000)]
+    unido = cubo.merge_cubos(partes)
+    assert len(unido) == len(celdas)
+    for col in ("n_filas", "n", "suma", "minimo"):
+        np.testing.assert_allclose(unido[col].to_numpy(), celdas[col].to_numpy())
+    for a, b in zip(unido["estudiantes"], celdas["estudiantes"]):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_estudiantes_con_celdas_llenas():
+    # Celdas con más de ESTUDIANTES_K estudiantes (y solapadas): el boceto
+    # queda acotado y el conteo es una estimación cercana
+    rng = np.random.default_rng(5)
+    poblacion = rng.integers(1, np.iinfo("uint64").max, 60_000, dtype="uint64")
+    celda = np.repeat(np.arange(40), 4_000)
+    ids = poblacion[rng.integers(0, len(poblacion), len(celda))]
+    bocetos = cubo._estudiantes_por_celda(celda, ids, 40)
+    assert max(len(b) for b in bocetos) == cubo.ESTUDIANTES_K
+
+    grupo = np.arange(40) % 2
+    estimado = cubo.contar_estudiantes(grupo, bocetos, 2)
+    for g in range(2):
+        exacto = len(np.unique(ids[grupo[celda] == g]))
+        assert abs(estimado[g] / exacto - 1) < 0.1
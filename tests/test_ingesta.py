@@ -0,0 +1,52 @@
+import logging
+
+import pytest
+
+import almacen
+import ingesta
+import sinteticos
+
+
+@pytest.mark.parametrize(
+    "nombre, pais",
+    [
+        ("Colombia_Latam_HSE (1).xlsx", "Colombia"),
+        ("Colombia_Latam-Cognitivas (2).xlsx", "Colombia"),
+        ("Costa_Rica_Latam-Cognitivas.xlsx", "Costa Rica"),
+        ("Republica_Dominicana_Latam_HSE.xlsx", "Republica Dominicana"),
+        ("Resultados_HSE.xlsx", None),
+    ],
+)
+def test_pais_archivo(nombre, pais):
+    assert ingesta.pais_archivo(nombre) == pais
+
+
+def test_prepare_conserva_pais_de_la_columna(caplog):
+    raw = sinteticos.generate_resultados(300, "HSE", pais="Colombia")
+    raw.loc[:9, "PAIS"] = "."
+    with caplog.at_level(logging.WARNING, logger="ingesta"):
+        df = ingesta.prepare_resultados(raw, "HSE", "Peru")
+    # Solo se completan los vacíos; el resto de la columna no se toca
+    assert df["PAIS"].value_counts().to_dict() == {"Colombia": 290, "Peru": 10}
+    assert "Colombia" in caplog.text
+
+
+def test_paises_de_las_particiones(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    libros = [
+        ("Costa_Rica_Latam_HSE.xlsx", "HSE", "Costa Rica"),
+        ("El_Salvador_Latam-Cognitivas.xlsx", "Cognitivas", "El Salvador"),
+        # El nombre dice otro país que la columna: manda la columna
+        ("Peru_Latam_HSE.xlsx", "HSE", "Colombia"),
+    ]
+    for i, (nombre, fuente, pais) in enumerate(libros):
+        raw = sinteticos.generate_resultados(300, fuente, seed=i, pais=pais)
+        raw.to_excel(data_dir / nombre, index=False)
+
+    cache_dir = tmp_path / "cache"
+    paises = almacen.paises_disponibles(data_dir, cache_dir)
+    assert paises == ["Colombia", "Costa Rica", "El Salvador"]
+    for pais in paises:
+        df, *_ = almacen.load_almacen(data_dir, cache_dir, paises=[pais])
+        assert df["PAIS"].unique().tolist() == [pais]
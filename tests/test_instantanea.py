@@ -0,0 +1,62 @@
+import pytest
+
+import almacen
+import cubo
+import cuantiles
+import instantanea
+
+PAIS = "Colombia"
+
+
+@pytest.fixture
+def cargas(df, monkeypatch):
+    # load_almacen devuelve el fixture con la versión que se pida
+    celdas, tabla_cuantiles = cubo.build_cubo(df), cuantiles.build_cuantiles(df)
+    versiones = []
+
+    def load_almacen(*args, **kwargs):
+        version = versiones.pop(0)
+        if isinstance(version, Exception):
+            raise version
+        return df, celdas, tabla_cuantiles, version
+
+    monkeypatch.setattr(almacen, "load_almacen", load_almacen)
+    return versiones
+
+
+def test_estado_solo_despues_de_renombrar(tmp_path, monkeypatch, cargas):
+    base = tmp_path / "instantaneas"
+    firma = almacen.firma_datos(tmp_path)
+    cargas += ["v1", "v2"]
+    publicado = instantanea.preparar(PAIS, data_dir=tmp_path, cache_dir=tmp_path, base=base)
+    assert instantanea.lista(publicado, firma)
+    assert instantanea.leer_progreso(PAIS, base) is None
+
+    # Mientras se arma la carpeta nueva el estado sigue siendo el publicado
+    vistos = []
+    write_carpeta = instantanea.write_carpeta
+
+    def espiar(destino, *args):
+        vistos.append((instantanea.leer_estado(PAIS, base), instantanea.leer_progreso(PAIS, base)))
+        return write_carpeta(destino, *args)
+
+    monkeypatch.setattr(instantanea, "write_carpeta", espiar)
+    nuevo = instantanea.preparar(PAIS, data_dir=tmp_path, cache_dir=tmp_path, base=base)
+    [(estado, progreso)] = vistos
+    assert estado == publicado and progreso["estado"] == "preparando"
+    assert instantanea.leer_estado(PAIS, base) == nuevo
+    assert not (base / publicado["carpeta"]).exists()
+    assert instantanea.adjuntar(PAIS, firma, data_dir=tmp_path, base=base)[-1] == "v2"
+
+
+def test_error_no_toca_lo_publicado(tmp_path, cargas):
+    base = tmp_path / "instantaneas"
+    firma = almacen.firma_datos(tmp_path)
+    cargas += ["v1", OSError("disco lleno")]
+    publicado = instantanea.preparar(PAIS, data_dir=tmp_path, cache_dir=tmp_path, base=base)
+    with pytest.raises(OSError):
+        instantanea.preparar(PAIS, data_dir=tmp_path, cache_dir=tmp_path, base=base)
+    assert instantanea.leer_estado(PAIS, base) == publicado
+    assert instantanea.leer_progreso(PAIS, base)["estado"] == "error"
+    assert instantanea.lista(publicado, firma)
+    assert not instantanea.lista({**publicado, "estado": "preparando"}, firma)
@@ -0,0 +1,58 @@
+import sys
+
+import pytest
+
+import almacen
+import consultas
+import cubo
+import cuantiles
+import reportes
+
+ANO = "2024 - 2"
+
+
+@pytest.fixture(scope="module")
+def tareas(df, tmp_path_factory):
+    celdas, tabla_cuantiles = cubo.build_cubo(df), cuantiles.build_cuantiles(df)
+    salida = tmp_path_factory.mktemp("reportes")
+    return reportes.tareas_reportes(celdas, tabla_cuantiles, salida, ANO, ["Cognitivas"])
+
+
+def test_una_tarea_por_combinacion(df, tareas):
+    filas = df[(df["ANHO"] == ANO) & (df["FUENTE"] == "Cognitivas")]
+    combinaciones = filas.groupby(reportes.COMBINACION, observed=True).ngroups
+    assert len(tareas) == combinaciones
+    assert {tarea[0].parents[3].name for tarea in tareas} == {"2024-2"}
+
+
+def test_resumen_en_el_proceso_del_reporte(df, tareas):
+    ruta, titulo, fuente, area, sel, sel_cuantiles, grado_categories, _, _ = tareas[0]
+    [path] = reportes.render_reporte(tareas[0])
+    pagina = path.read_text(encoding="utf-8")
+    consulta = consultas.resumen(sel, fuente, area, grado_categories, sel_cuantiles)
+    assert f"{consulta.kpis['registros']:,}" in pagina
+    # Sin vega.js: scripts del CDN
+    assert pagina.count("cdn.jsdelivr.net") == 3
+
+
+def test_vega_local(tareas, tmp_path):
+    ruta, *resto = tareas[0]
+    vega_js = tmp_path / "vega.js"
+    tarea = (tmp_path / "a" / "b" / "reporte", *resto[:-1], vega_js)
+    [path] = reportes.render_reporte(tarea)
+    pagina = path.read_text(encoding="utf-8")
+    assert '<script src="../../vega.js"></script>' in pagina
+    assert "cdn.jsdelivr.net" not in pagina
+
+
+def test_filtros_sin_datos(monkeypatch, capsys):
+    def load_almacen(*args, **kwargs):
+        raise FileNotFoundError("sin particiones")
+
+    monkeypatch.setattr(almacen, "load_almacen", load_almacen)
+    monkeypatch.setattr(almacen, "paises_disponibles", lambda: ["Colombia"])
+    monkeypatch.setattr(sys, "argv", ["reportes.py", "--ano", "1999"])
+    with pytest.raises(SystemExit) as salida:
+        reportes.main()
+    assert salida.value.code == 2
+    assert "--ano 1999" in capsys.readouterr().err